@@ -5,6 +5,9 @@ from rest_framework import serializers
 
 from bills.apis.serializers import BillSerializers
 from forms.apis.serializers import FormSerializer
+from jobs.assignments import get_parent_transfer
+from jobs.covers import refresh_cover_images
+from jobs.models import RecentJobSearch
 from users.apis import serializers as user_serializers
 from users.models.group import Group
 from users.models.job import CloseJobBill
@@ -14,7 +17,6 @@ from users.models.job import JobImage
 from users.models.job import JobLog
 from users.models.job import JobNote
 from users.models.job import JobStatus
-from users.models.job import RecentSearchJob
 from users.models.job import ReturnJob
 from users.models.job import TransferJob
 from users.models.notification import Notification
@@ -161,9 +163,15 @@ class TransferJobSerializers(serializers.ModelSerializer):
             return JobGroupSerializers(groups, many=True, context=self.context).data
 
     def get_main_group(self, obj):
-        return TransferJob.objects.filter(job=obj.job, is_parent_group=True).values(
-            "group_id", "group__name"
-        )
+        parent_transfer = get_parent_transfer(obj.job)
+        if not parent_transfer:
+            return []
+        return [
+            {
+                "group_id": parent_transfer.group_id,
+                "group__name": parent_transfer.group.name,
+            }
+        ]
 
     def get_group_forms(self, obj):
         return FormSerializer(
@@ -399,6 +407,7 @@ class EditJobSerializer(serializers.ModelSerializer):
                     created_by=created_by,
                     updated_by=updated_by,
                 )
+            refresh_cover_images([instance.id])
 
         for attachment in attachments:
             JobAttachment.objects.create(
@@ -433,44 +442,22 @@ class JobCreationSerializers(serializers.ModelSerializer):
         fields = "__all__"
         extra_kwargs = {"id": {"error_messages": {"invalid": "נדרש מספר שלם חוקי."}}}
 
-    def create(self, validated_data):
-        created_by = validated_data["created_by"]
-        images = self.context["images"]
-        attachments = self.context["attachments"]
-        notes = self.context["notes"]
-
-        for image in images:
+    def validate(self, attrs):
+        # Images, attachments and notes are checked before anything is saved.
+        for image in self.context.get("images", []):
             job_image_serializer = JobImagesSerializer(data={"image": image})
             job_image_serializer.is_valid(raise_exception=True)
-        for attachment in attachments:
+        for attachment in self.context.get("attachments", []):
             job_image_serializer = JobAttachmentSerializer(
                 data={"attachment": attachment}
             )
             job_image_serializer.is_valid(raise_exception=True)
-        for note in notes:
+        for note in self.context.get("notes", []):
             job_note_serializer = JobNoteCreateSerializer(
                 data={"note": note}
             )
             job_note_serializer.is_valid(raise_exception=True)
-
-        job = Job.objects.create(**validated_data)
-        for form in self.context["forms"]:
-            job.form.add(form)
-            job.save()
-        for bill in self.context["bills"]:
-            job.bill.add(bill)
-            job.save()
-        for image in images:
-            JobImage.objects.create(job=job, image=image, created_by=created_by)
-        for note in notes:
-            JobNote.objects.create(job=job, note=note, created_by=created_by)
-        for attachment in attachments:
-            JobAttachment.objects.create(
-                job=job,
-                attachment=attachment,
-                created_by=created_by,
-            )
-        return job
+        return attrs
 
     def get_images(self, obj):
         job_images = JobImage.objects.filter(job=obj)
@@ -666,7 +653,7 @@ class JobRetrunSerializers(serializers.ModelSerializer):
         ).data
 
     def get_group(self, obj):
-        job_group = TransferJob.objects.filter(job=obj.id, is_parent_group=True).first()
+        job_group = get_parent_transfer(obj)
         return {"id": job_group.group.id, "name": job_group.group.name}
 
     def get_images(self, obj):
@@ -682,7 +669,7 @@ class JobRetrunSerializers(serializers.ModelSerializer):
         ).data
 
     def get_chat_id(self, obj):
-        instance = TransferJob.objects.filter(job=obj.id, is_parent_group=True).first()
+        instance = get_parent_transfer(obj)
         return (
             instance.group.chats.first().id if instance.group.chats.first().id else None
         )
@@ -715,7 +702,7 @@ class JobSerializers(serializers.ModelSerializer):
         ).data
 
     def get_group(self, obj):
-        job_group = TransferJob.objects.filter(job=obj.id, is_parent_group=True).first()
+        job_group = get_parent_transfer(obj)
         return {"id": job_group.group.id, "name": job_group.group.name}
 
     def get_images(self, obj):
@@ -731,7 +718,7 @@ class JobSerializers(serializers.ModelSerializer):
         ).data
 
     def get_chat_id(self, obj):
-        instance = TransferJob.objects.filter(job=obj.id, is_parent_group=True).first()
+        instance = get_parent_transfer(obj)
         return (
             instance.group.chats.first().id if instance.group.chats.first().id else None
         )
@@ -874,15 +861,20 @@ class RecentSearchJobSerializer(serializers.ModelSerializer):
         ).data
 
 
-class RecentSearchJobCreateSerializer(serializers.ModelSerializer):
+class RecentJobSearchSerializer(serializers.ModelSerializer):
+    job = serializers.IntegerField(source="transfer_job_id")
+    created_by = serializers.IntegerField(source="user_id")
+    created_at = serializers.DateTimeField(source="searched_at")
     jobs = serializers.SerializerMethodField()
 
     class Meta:
-        model = RecentSearchJob
-        fields = "__all__"
+        model = RecentJobSearch
+        fields = ["id", "job", "created_by", "created_at", "jobs"]
 
     def get_jobs(self, obj):
-        return RecentSearchJobSerializer(obj.job.job, context=self.context).data
+        return RecentSearchJobSerializer(
+            obj.transfer_job.job, context=self.context
+        ).data
 
 
 class GetCustomGroupSerializer(serializers.ModelSerializer):
@@ -1,14 +1,23 @@
 from django.urls import path
 
 from jobs.apis.views import AddDuplicateJobReference
+from jobs.apis.views import BatchSyncView
+from jobs.apis.views import BulkCloseJobView
+from jobs.apis.views import BulkReviewJobView
 from jobs.apis.views import CloseJobBillView
 from jobs.apis.views import DeleteJobView
 from jobs.apis.views import GroupJobView
 from jobs.apis.views import JobCreateView
+from jobs.apis.views import JobImportView
 from jobs.apis.views import JobIsReviewed
+from jobs.apis.views import JobChangesView
 from jobs.apis.views import JobNotification
+from jobs.apis.views import JobSuggestionView
 from jobs.apis.views import JobTransferView
 from jobs.apis.views import MapJobView
+from jobs.apis.views import MapMarkerView
+from jobs.apis.views import NearbyJobView
+from jobs.apis.views import RoutePlanView
 from jobs.apis.views import MultipleJobTransferView
 from jobs.apis.views import OpenJobPdfGeneratorView
 from jobs.apis.views import PdfGeneratorView
@@ -34,6 +43,11 @@ urlpatterns = [
     ),
     path("group-jobs/", GroupJobView.as_view(), name="group-jobs"),
     path("map-jobs/", MapJobView.as_view(), name="map-jobs"),
+    path("map-markers/", MapMarkerView.as_view(), name="map-markers"),
+    path("nearby-jobs/", NearbyJobView.as_view(), name="nearby-jobs"),
+    path("route-plan/", RoutePlanView.as_view(), name="route-plan"),
+    path("import/", JobImportView.as_view(), name="job-import"),
+    path("job-suggestions/", JobSuggestionView.as_view(), name="job-suggestions"),
     path(
         "return-job/",
         ReturnJobView.as_view({"get": "list", "post": "create"}),
@@ -49,6 +63,8 @@ urlpatterns = [
     path("recent-return-job/", RecentReturnJobView.as_view(), name="recent-return-job"),
     path("recent-add-job/", RecentAddJobView.as_view(), name="recent-add-jobs"),
     path("job-notification/", JobNotification.as_view(), name="job-notification"),
+    path("changes/", JobChangesView.as_view(), name="job-changes"),
+    path("batch/", BatchSyncView.as_view(), name="job-batch"),
     path(
         "recent-search-job/",
         RecentSearchJobsListCreateView.as_view(),
@@ -83,6 +99,8 @@ urlpatterns = [
         DeleteJobView.as_view(),
         name="job_delete",
     ),
+    path("bulk-close/", BulkCloseJobView.as_view(), name="bulk-close"),
+    path("bulk-review/", BulkReviewJobView.as_view(), name="bulk-review"),
     path(
         "multiple-transfer-job/",
         MultipleJobTransferView.as_view(),
@@ -6,6 +6,7 @@ import time
 from collections import defaultdict
 
 from django.contrib.sites.shortcuts import get_current_site
+from django.db import transaction
 from django.db.models import Case
 from django.db.models import Count
 from django.db.models import F
@@ -13,9 +14,11 @@ from django.db.models import FloatField
 from django.db.models import Prefetch
 from django.db.models import Q
 from django.db.models import Sum
+from django.db.models import Value
 from django.db.models import When
 from django.db.models.functions import Coalesce
 from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from drf_yasg import openapi
@@ -28,6 +31,7 @@ from rest_framework.generics import DestroyAPIView
 from rest_framework.generics import GenericAPIView
 from rest_framework.generics import ListAPIView
 from rest_framework.generics import ListCreateAPIView
+from rest_framework.parsers import JSONParser
 from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.renderers import TemplateHTMLRenderer
@@ -42,12 +46,67 @@ from jobs.apis.serializers import GroupByJobSerializer
 from jobs.apis.serializers import JobCreationSerializers
 from jobs.apis.serializers import JobTransferSerializer
 from jobs.apis.serializers import NotificationSerializer
-from jobs.apis.serializers import RecentSearchJobCreateSerializer
+from jobs.apis.serializers import RecentJobSearchSerializer
 from jobs.apis.serializers import ReturnJobListSerializer
 from jobs.apis.serializers import ReturnJobSerializer
 from jobs.apis.serializers import TransferJobSerializers
 from jobs.apis.serializers import UpdateCustomJobSerializer
+from jobs.assignments import get_parent_transfer
+from jobs.batch import apply_operations
+from jobs.batch import parse_operations
+from jobs.changes import CursorExpired
+from jobs.changes import conditional_job_view
+from jobs.changes import get_job_changes
+from jobs.changes import get_sync_heads
+from jobs.changes import group_scope_from_query
+from jobs.changes import job_list_scope
+from jobs.changes import record_job_changes
+from jobs.changes import transfer_job_scope_from_pk
+from jobs.closing import MAX_BULK_CLOSE_JOBS
+from jobs.closing import close_jobs
+from jobs.closing import get_close_job_bills
+from jobs.closing import notify_closed_jobs
+from jobs.closing import parse_bill_quantities
+from jobs.counters import get_job_group_ids
+from jobs.covers import delete_job_images
+from jobs.covers import refresh_cover_images
+from jobs.creation import create_job
+from jobs.duplicates import find_duplicate_candidates
 from jobs.enum import SortBy
+from jobs.idempotency import idempotent
+from jobs.imports import ImportFileError
+from jobs.imports import import_jobs
+from jobs.locations import get_map_data
+from jobs.locations import get_nearby_jobs
+from jobs.locations import parse_bbox
+from jobs.locations import parse_nearby_params
+from jobs.locations import parse_zoom
+from jobs.locations import refresh_job_locations
+from jobs.models import JobChange
+from jobs.pagination import KeysetPagination
+from jobs.reviews import MAX_BULK_REVIEW_JOBS
+from jobs.reviews import parse_review_state
+from jobs.reviews import parse_reviews
+from jobs.reviews import review_transfer_jobs
+from jobs.routes import plan_route
+from jobs.searches import get_recent_searches
+from jobs.searches import record_recent_search
+from jobs.suggestions import get_job_suggestions
+from jobs.suggestions import get_user_group_ids
+from jobs.suggestions import parse_suggestion_limit
+from jobs.transfers import notify_transferred_jobs
+from jobs.transfers import transfer_jobs
+from jobs.transitions import JOB_UPDATE_FIELDS
+from jobs.transitions import TRANSFER_JOB_UPDATE_FIELDS
+from jobs.transitions import InvalidTransition
+from jobs.transitions import close_transfer_jobs
+from jobs.transitions import get_update_values
+from jobs.transitions import partially_close_transfer_job
+from jobs.transitions import reopen_returned_job
+from jobs.transitions import return_transfer_job
+from jobs.transitions import set_transfer_job_status
+from jobs.transitions import transfer_to_group
+from jobs.utils import parse_job_ids
 from jobs.utils import push_notification
 from users.models.bill import TypeCounting
 from users.models.group import Group
@@ -59,7 +118,6 @@ from users.models.job import JobImage
 from users.models.job import JobLog
 from users.models.job import JobNote
 from users.models.job import JobStatus
-from users.models.job import RecentSearchJob
 from users.models.job import ReturnJob
 from users.models.job import TransferJob
 from users.models.notification import Notification
@@ -131,6 +189,7 @@ class JobCreateView(viewsets.ModelViewSet):
     )
     serializer_class = JobCreationSerializers
     parser_classes = [MultiPartParser]
+    pagination_class = KeysetPagination
     filter_backends = [filters.SearchFilter]
     search_fields = [
         "job__address",
@@ -195,8 +254,13 @@ class JobCreateView(viewsets.ModelViewSet):
             serializer_class = self.serializer_class
         return serializer_class(*args, **kwargs, context={"request": self.request})
 
+    @method_decorator(idempotent("job-create"))
     def create(self, request, *args, **kwargs):
-        """Admin and inspector can create and get job"""
+        """
+        Admin and inspector can create and get job.
+        The job is created in one transaction and notified once committed.
+        The response lists the open jobs that may be duplicates of it.
+        """
         data = request.data
         if data:
             data._mutable = True
@@ -218,64 +282,60 @@ class JobCreateView(viewsets.ModelViewSet):
             },
         )
         serializer.is_valid(raise_exception=True)
-        job = serializer.save()
-
-        # Create Transfer Job
-        request.data["job"] = job.id
-        transfer_job = JobTransferView(
-            job_status=JobStatus.OPEN.value,
-            is_parent_group=True,
-            permission=self.view_permissions["create"],
-            further_inspection=job.further_inspection,
-            further_billing=job.further_billing,
-            is_lock_closed=job.is_lock_closed,
-            is_active=True,
-        )
-        transfer_job = transfer_job.post(request)
-        if transfer_job.status_code != 200:
-            job.delete()
+        group = Group.objects.filter(
+            id=request.data.get("group"), is_archive=False
+        ).first()
+        if not group:
+            # {"group": "Group not found"}
             return Response(
-                transfer_job.data,
+                {"group": "קבוצה לא נמצאה"},
                 status=return_status.HTTP_400_BAD_REQUEST,
             )
-        if request.user.user_name == None or request.user.user_name == "":
-            user_by_email = request.user.email.partition("@")
-            user_name = user_by_email[0]
-        else:
-            user_name = request.user.user_name
-
-        
-        job_log = JobLog.objects.create(
-            job=job,
-            created_by=request.user,
-            status="Create",
-            created_at=timezone.now()
-        )
-
-        if str(request.data.get("priority")) == "true":
-            notification_job_status = JobStatus.OPEN.value
-            notification_type = "Open"
-            body = f"המשימה נפתחה על ידי @{user_name}"
-            PushNotification(
+        with transaction.atomic():
+            transfer_job = create_job(
                 request.user,
-                request.data["address"],
-                body,
-                transfer_job.data["tranferd_job_id"],
-                notification_job_status,
-                notification_type,
-                Group.objects.get(id=request.data["group"])
-                .member.filter(role_id=3)
-                .exclude(id=request.user.id),
+                serializer.validated_data,
+                group,
+                images=images,
+                attachments=attachment,
+                notes=notes,
+                forms=forms,
+                bills=bills,
             )
-        return Response(
-            GetTransferJobSerializers(
-                TransferJob.objects.get(id=transfer_job.data["tranferd_job_id"]),
-                context={"request": self.request},
-            ).data,
-            status=return_status.HTTP_201_CREATED,
+            job = transfer_job.job
+
+            if str(request.data.get("priority")) == "true":
+                if not request.user.user_name:
+                    user_name = request.user.email.partition("@")[0]
+                else:
+                    user_name = request.user.user_name
+                body = f"המשימה נפתחה על ידי @{user_name}"
+                receivers = group.member.filter(role_id=3).exclude(id=request.user.id)
+                transaction.on_commit(
+                    lambda: PushNotification(
+                        request.user,
+                        job.address,
+                        body,
+                        transfer_job.id,
+                        JobStatus.OPEN.value,
+                        "Open",
+                        receivers,
+                    )
+                )
+        response = GetTransferJobSerializers(
+            transfer_job, context={"request": self.request}
+        ).data
+        response["duplicate_candidates"] = find_duplicate_candidates(
+            request.user,
+            job.address,
+            job.latitude,
+            job.longitude,
+            exclude_job_id=job.id,
         )
+        return Response(response, status=return_status.HTTP_201_CREATED)
 
     @swagger_auto_schema(manual_parameters=[sort_by])
+    @method_decorator(conditional_job_view(job_list_scope))
     def list(self, request, *args, **kwargs):
         """Inspector can view their job history and serarch their job"""
         sort_by = self.request.query_params.get("sort_by", None)
@@ -308,13 +368,22 @@ class JobCreateView(viewsets.ModelViewSet):
         return self.get_paginated_response(serializer.data)
 
     @swagger_auto_schema(manual_parameters=[deleted_image, deleted_attachment])
+    @method_decorator(idempotent("job-update"))
     def partial_update(self, request, *args, **kwargs):
+        """
+        Update, close or partially close a transfer job.
+        The writes are planned first and applied in one transaction, with
+        notes, images, attachments and logs inserted in bulk.
+        """
         pk = kwargs.get("pk")
         deleted_image = self.request.query_params.get("deleted_image", None)
         deleted_attachment = self.request.query_params.get("deleted_attachment", None)
         main_group_name = request.data.get("main_group")
+        status = request.data.get("status")
 
-        instance = TransferJob.objects.filter(id=pk).first()
+        instance = (
+            TransferJob.objects.select_related("job", "group").filter(id=pk).first()
+        )
         duplicate_not_approved = request.data.get("duplicate_not_approved")
         if not instance:
             # {"detail": "Not found"}
@@ -324,9 +393,10 @@ class JobCreateView(viewsets.ModelViewSet):
             )
 
         job_id = request.data.get("job_id")
+        job = instance.job
+        previous_group_ids = get_job_group_ids([instance.job_id])
 
-        check_duplicate_job_id = Job.objects.filter(job_id=job_id)
-        if check_duplicate_job_id:
+        if Job.objects.filter(job_id=job_id).exists():
             return Response(
                 {"job_id": "כבר קיימת משימה עם מזהה זה"},
                 status=return_status.HTTP_404_NOT_FOUND,
@@ -342,36 +412,22 @@ class JobCreateView(viewsets.ModelViewSet):
                     {"detail": "המשימה הזו כבר סגורה"},
                     status=return_status.HTTP_400_BAD_REQUEST,
                 )
-        # else:
-        #     if str(self.request.user.role) in [
-        #         UserRoleChoices.GROUP_MANAGER.value,
-        #     ]:
-        #         # {"detail": "Only admin have permission to update the job"}
-        #         return Response(
-        #             {"detail": "Only Admin have permission to update the job"},
-        #             status=return_status.HTTP_400_BAD_REQUEST,
-        #         )
-        if not duplicate_not_approved:
-            current_user = self.request.user
-            if instance.is_parent_group:
-                instance.job.status = request.data.get("status")
-                instance.job.closed_by = current_user
-
-            if request.data.getlist("form") or request.data.getlist("bill"):
-                job_bill, created = JobBill.objects.get_or_create(job=instance)
 
-            if request.data.getlist("form"):
-                form_id_list = [int(x) for x in request.data.getlist("form")]
-                job_bill.form.add(*form_id_list)
-                instance.job.form.add(*form_id_list)
+        current_user = self.request.user
+        now = timezone.now()
+        is_closing = status in [JobStatus.CLOSE.value, JobStatus.PARTIAL.value]
+        job_logs = []
+        new_notes = []
+        updated_notes = []
+        new_images = []
+        new_attachments = []
 
-            if request.data.getlist("bill"):
-                bill_id_list = [int(x) for x in request.data.getlist("bill")]
-                job_bill.bill.add(*bill_id_list)
-                instance.job.bill.add(*bill_id_list)
+        if not duplicate_not_approved:
+            if instance.is_parent_group:
+                job.closed_by = current_user
 
             update_job = (
-                request.data["status"]
+                status
                 in [
                     JobStatus.OPEN.value,
                     JobStatus.TRANSFER.value,
@@ -384,176 +440,195 @@ class JobCreateView(viewsets.ModelViewSet):
             )
 
             if update_job:
-                if request.data.get("job_id"):
-                    instance.job.job_id = request.data.get("job_id")
-                instance.job.address = request.data.get("address")
-                instance.job.address_information = request.data.get(
-                    "address_information"
-                )
-                instance.job.description = request.data.get("description")
-                instance.job.latitude = request.data.get("latitude")
-                instance.job.longitude = request.data.get("longitude")
+                if job_id:
+                    job.job_id = job_id
+                job.address = request.data.get("address")
+                job.address_information = request.data.get("address_information")
+                job.description = request.data.get("description")
+                job.latitude = request.data.get("latitude")
+                job.longitude = request.data.get("longitude")
                 instance.group_id = request.data.get("group")
                 instance.closed_by = current_user
 
                 if request.data.get("priority"):
-                    instance.job.priority = (
-                        True if request.data.get("priority") == "true" else False
-                    )
+                    job.priority = request.data.get("priority") == "true"
                 if request.data.get("further_inspection"):
-                    instance.job.further_inspection = (
-                        True
-                        if request.data.get("further_inspection") == "true"
-                        else False
+                    job.further_inspection = (
+                        request.data.get("further_inspection") == "true"
                     )
-            if request.data.get("job_id"):
-                instance.job.job_id = request.data.get("job_id")
-            if request.data.get("address"):
-                instance.job.address = request.data.get("address")
-            if request.data.get("latitude"):
-                instance.job.latitude = request.data.get("latitude")
-            if request.data.get("longitude"):
-                instance.job.longitude = request.data.get("longitude")
-            if request.data.get("address_information"):
-                instance.job.address_information = request.data.get(
-                    "address_information"
-                )
-            if request.data.get("description"):
-                instance.job.description = request.data.get("description")
+            if job_id:
+                job.job_id = job_id
+            for field in [
+                "address",
+                "latitude",
+                "longitude",
+                "address_information",
+                "description",
+            ]:
+                if request.data.get(field):
+                    setattr(job, field, request.data.get(field))
             if request.data.get("further_inspection"):
                 instance.further_inspection, instance.further_billing = (
                     str(request.data.get("further_inspection", False)).capitalize(),
                     str(request.data.get("further_billing", False)).capitalize(),
                 )
             instance.updated_by = current_user
-            images = request.data.getlist("image")
-            attachments = request.data.getlist("attachment")
-            created_by = request.user
-            updated_by = request.user
-
-            instance.job.further_billing = str(
+            job.further_billing = str(
                 request.data.get("further_inspection", False)
             ).capitalize()
-            instance.job.updated_by = current_user
-            if (
-                request.data["status"] not in [JobStatus.CLOSE.value, JobStatus.PARTIAL.value]):
-
-                job_log = JobLog.objects.create(
-                job=instance.job,
-                updated_by=current_user,
-                status="Update",
-                created_at=timezone.now()
-                )
-            
+            job.updated_by = current_user
 
             if (
-                request.data["status"]
-                in [JobStatus.CLOSE.value, JobStatus.PARTIAL.value]
+                is_closing
                 or request.data.get("close-update") == "true"
                 or request.data.get("partial-update") == "true"
             ):
-                instance.job.closed_by = current_user
-                if request.data["status"] == JobStatus.CLOSE.value:
-                    job_log = JobLog.objects.create(
-                        job=instance.job,
-                        closed_by=current_user,
-                        status="Close",
-                        created_at=timezone.now()
+                job.closed_by = current_user
+                if not is_closing:
+                    job_logs.append(
+                        JobLog(
+                            job=job,
+                            partially_closed_by=current_user,
+                            status="Partial",
+                            created_at=now,
                         )
-                else:
-                    job_log = JobLog.objects.create(
-                        job=instance.job,
-                        partially_closed_by=current_user,
-                        status="Partial",
-                        created_at=timezone.now()
-                        )
-
-            instance.job.save()
-            instance.status = request.data.get("status")
+                    )
 
-            notes = request.data.getlist("notes")
-            for note in notes:
-                JobNote.objects.create(
-                    job=instance.job,
-                    note=note,
-                    created_by=current_user
-                )
-            
-            updated_notes  = request.data.get("updated_notes", {})
-            updated_notes_dict = json.loads(updated_notes)
-            for key, value in updated_notes_dict.items():
-                id = int(key)
-                note = value
-                job_note = JobNote.objects.filter(id=id).first()
-                job_note.note = note
+            new_notes = [
+                JobNote(job=job, note=note, created_by=current_user)
+                for note in request.data.getlist("notes")
+            ]
+            notes_by_id = {
+                int(note_id): note
+                for note_id, note in json.loads(
+                    request.data.get("updated_notes") or "{}"
+                ).items()
+            }
+            for job_note in JobNote.objects.filter(id__in=notes_by_id):
+                job_note.note = notes_by_id[job_note.id]
                 job_note.created_by = current_user
-                job_note.save()
-                
-            for image in images:
-                if (
-                    request.data["status"] == JobStatus.CLOSE.value
-                    or request.data.get("status") == JobStatus.PARTIAL.value
-                ):
-                    close_job_image = True
-                else:
-                    close_job_image = False
-                JobImage.objects.create(
-                    job=instance.job,
+                job_note.updated_at = now
+                updated_notes.append(job_note)
+
+            new_images = [
+                JobImage(
+                    job=job,
                     image=image,
-                    created_by=created_by,
-                    updated_by=updated_by,
-                    close_job_image=close_job_image,
+                    created_by=current_user,
+                    updated_by=current_user,
+                    close_job_image=is_closing,
                 )
-
-            for attachment in attachments:
-                if (
-                    request.data["status"] == JobStatus.CLOSE.value
-                    or request.data.get("status") == JobStatus.PARTIAL.value
-                ):
-                    close_job_attachment = True
-                else:
-                    close_job_attachment = False
-
-                JobAttachment.objects.create(
-                    job=instance.job,
+                for image in request.data.getlist("image")
+            ]
+            new_attachments = [
+                JobAttachment(
+                    job=job,
                     attachment=attachment,
-                    created_by=created_by,
-                    updated_by=updated_by,
-                    close_job_attachment=close_job_attachment,
+                    created_by=current_user,
+                    updated_by=current_user,
+                    close_job_attachment=is_closing,
                 )
+                for attachment in request.data.getlist("attachment")
+            ]
 
-            instance.save()
-            instance.job.save()
-        else:
-            instance.job.status = request.data.get("status")
-            instance.job.save()
-            instance.status = request.data.get("status")
-            instance.save()
+        transfers = list(
+            TransferJob.objects.select_related("group")
+            .filter(job_id=instance.job_id)
+            .exclude(id=instance.id)
+        )
+        parent_group_job = next(
+            (
+                transfer
+                for transfer in [instance] + transfers
+                if transfer.is_parent_group
+            ),
+            None,
+        )
 
-        parent_group_job = TransferJob.objects.filter(
-            job_id=instance.job_id, is_parent_group=True
-        ).first()
+        try:
+            with transaction.atomic():
+                if not duplicate_not_approved and (
+                    request.data.getlist("form") or request.data.getlist("bill")
+                ):
+                    job_bill, created = JobBill.objects.get_or_create(job=instance)
+                    if request.data.getlist("form"):
+                        form_id_list = [int(x) for x in request.data.getlist("form")]
+                        job_bill.form.add(*form_id_list)
+                        job.form.add(*form_id_list)
+                    if request.data.getlist("bill"):
+                        bill_id_list = [int(x) for x in request.data.getlist("bill")]
+                        job_bill.bill.add(*bill_id_list)
+                        job.bill.add(*bill_id_list)
+
+                # The job and transfer job changes are written by the
+                # statements of the transition, statuses included.
+                changes = {
+                    "job_values": get_update_values(job, JOB_UPDATE_FIELDS),
+                    "transfer_job_values": get_update_values(
+                        instance, TRANSFER_JOB_UPDATE_FIELDS, row_id=instance.id
+                    ),
+                }
+                if status == JobStatus.CLOSE.value:
+                    close_transfer_jobs(
+                        current_user,
+                        [instance.job_id],
+                        update=request.data.get("close-update") == "true",
+                        **changes,
+                    )
+                elif status == JobStatus.PARTIAL.value and not duplicate_not_approved:
+                    partially_close_transfer_job(current_user, instance, **changes)
+                else:
+                    set_transfer_job_status(
+                        current_user,
+                        instance,
+                        status,
+                        log_status=None if duplicate_not_approved else "Update",
+                        update_job=bool(duplicate_not_approved) or None,
+                        **changes,
+                    )
+                JobLog.objects.bulk_create(job_logs)
+                JobNote.objects.bulk_create(new_notes)
+                JobNote.objects.bulk_update(
+                    updated_notes, ["note", "created_by", "updated_at"]
+                )
+                JobImage.objects.bulk_create(new_images)
+                JobAttachment.objects.bulk_create(new_attachments)
+                if new_images:
+                    refresh_cover_images([instance.job_id])
+
+                delete_instance = ReturnJob.objects.filter(
+                    Q(job__id=pk) | Q(duplicate__id=pk)
+                ).first()
+                if delete_instance:
+                    delete_instance.delete()
+
+                if main_group_name:
+                    main_group_id = int(main_group_name)
+                    job_all_groups = [instance.group_id] + [
+                        transfer.group_id for transfer in transfers
+                    ]
+                    if main_group_id in job_all_groups:
+                        TransferJob.objects.filter(job_id=instance.job_id).filter(
+                            Q(id=parent_group_job.id) | Q(group_id=main_group_id)
+                        ).update(
+                            is_parent_group=Case(
+                                When(group_id=main_group_id, then=Value(True)),
+                                default=Value(False),
+                            )
+                        )
+                    else:
+                        TransferJob.objects.filter(id=parent_group_job.id).update(
+                            group_id=main_group_id
+                        )
 
-        if request.data.get("status") == JobStatus.CLOSE.value:
-            TransferJob.objects.filter(job_id=instance.job_id).update(
-                status=JobStatus.CLOSE.value, is_active=False
-            )
-            parent_group_job.status = JobStatus.CLOSE.value
-            parent_group_job.is_active = True
-            parent_group_job.save()
-            parent_group_job.job.status = JobStatus.CLOSE.value
-            parent_group_job.job.closed_at = timezone.now()
-            parent_group_job.job.save()            
-        else:
-            TransferJob.objects.filter(job_id=instance.job_id, is_active=False).update(
-                status=JobStatus.PARTIAL.value
+                delete_attachment(deleted_image, deleted_attachment)
+                refresh_job_locations([instance.job_id])
+                record_job_changes([instance.job_id], previous_group_ids)
+        except InvalidTransition as error:
+            return Response(
+                {"detail": error.detail}, status=return_status.HTTP_400_BAD_REQUEST
             )
-
-        delete_instance = ReturnJob.objects.filter(
-            Q(job__id=pk) | Q(duplicate__id=pk)
-        ).first()
-        if delete_instance:
-            delete_instance.delete()
+        instance.refresh_from_db(fields=["status", "is_active"])
 
         if request.user.user_name == None or request.user.user_name == "":
             user_by_email = request.user.email.partition("@")
@@ -561,46 +636,23 @@ class JobCreateView(viewsets.ModelViewSet):
         else:
             user_name = request.user.user_name
 
-        if main_group_name:
-            main_group_id = int(main_group_name)
-            main_group_job = TransferJob.objects.get(
-                job_id=instance.job_id, is_parent_group=True
-            )
-            job_all_groups = TransferJob.objects.filter(
-                job_id=instance.job_id
-            ).values_list("group_id", flat=True)
-
-            if main_group_id in job_all_groups:
-                main_group_job.is_parent_group = False
-                main_group_job.save()
-                TransferJob.objects.filter(
-                    job_id=instance.job_id, group_id=main_group_id
-                ).update(is_parent_group=True)
-            else:
-                main_group_job.group_id = int(main_group_id)
-                main_group_job.save()
-
-        delete_attachment(deleted_image, deleted_attachment)
-
         if (
             str(request.data.get("further_inspection")) == "true"
-            and request.data.get("status") == JobStatus.PARTIAL.value
-            or request.data.get("status") == JobStatus.CLOSE.value
+            and status == JobStatus.PARTIAL.value
+            or status == JobStatus.CLOSE.value
         ):
             notification_job_status = (
                 JobStatus.CLOSE.value
-                if request.data.get("status") == JobStatus.CLOSE.value
+                if status == JobStatus.CLOSE.value
                 else JobStatus.PARTIAL.value
             )
             notification_type = (
-                "Close"
-                if request.data.get("status") == JobStatus.CLOSE.value
-                else "Partial Close"
+                "Close" if status == JobStatus.CLOSE.value else "Partial Close"
             )
             body = f"משימה זו נסגרה על ידי @{user_name}"
             PushNotification(
                 request.user,
-                parent_group_job.job.address,
+                job.address,
                 body,
                 pk,
                 notification_job_status,
@@ -618,6 +670,7 @@ class JobCreateView(viewsets.ModelViewSet):
             status=return_status.HTTP_201_CREATED,
         )
 
+    @method_decorator(conditional_job_view(transfer_job_scope_from_pk))
     def retrieve(self, request, *args, **kwargs):
         lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
         transfer_job = TransferJob.objects.filter(
@@ -646,7 +699,7 @@ def delete_attachment(deleted_image, deleted_attachment):
 
     if deleted_image:
         image_id_list = [int(id) for id in deleted_image.split(",")]
-        JobImage.objects.filter(id__in=image_id_list).delete()
+        delete_job_images(image_id_list)
 
 
 class RecentTransferJob(ListAPIView):
@@ -691,6 +744,7 @@ class JobTransferView(ListCreateAPIView):
         group__is_archive=True
     )
     serializer_class = JobTransferSerializer
+    pagination_class = KeysetPagination
     filter_backends = [filters.SearchFilter]
     search_fields = [
         "job__address",
@@ -698,39 +752,13 @@ class JobTransferView(ListCreateAPIView):
         "job__duplicate_reference",
         "job__address_information",
     ]
-    permission_classes = [IsAuthenticated]
-
-    def __init__(
-        self,
-        job_status=None,
-        is_parent_group=False,
-        permission=None,
-        further_inspection=None,
-        further_billing=None,
-        is_lock_closed=None,
-        is_active=True,
-        *args,
-        **kwargs,
-    ):
-        super().__init__(*args, **kwargs)
-        if permission:
-            self.view_permissions = {
-                "get": {"group_manger": True, "admin": True},
-                "post": permission,
-            }
-        else:
-            self.view_permissions = {
-                "get": {"group_manger": True, "admin": True},
-                "post": {"admin": True, "group_manger": True},
-            }
-        self.permission_classes += [CheckPermission]
-        self.further_inspection = further_inspection
-        self.is_lock_closed = is_lock_closed
-        self.further_billing = further_billing
-        self.job_status = job_status
-        self.is_parent_group = is_parent_group
-        self.is_active = is_active
+    permission_classes = [IsAuthenticated, CheckPermission]
+    view_permissions = {
+        "get": {"group_manger": True, "admin": True},
+        "post": {"admin": True, "group_manger": True},
+    }
 
+    @method_decorator(idempotent("job-transfer"))
     def post(self, request, *args, **kwargs):
         group = request.data["group"]
         group_instance = Group.objects.filter(id=group, is_archive=False).first()
@@ -756,62 +784,40 @@ class JobTransferView(ListCreateAPIView):
 
         job = request.data["job"]
         job_detail = Job.objects.filter(id=job).first()
-        tranferd_job = TransferJob.objects.filter(group=group, job=job).first()
-        if tranferd_job:
-            job_transferred_groups = TransferJob.objects.filter(job=job)
-            bulk_updated_fields = []
-            for job_transferred in job_transferred_groups:
-                job_transferred.status = JobStatus.TRANSFER.value
-                job_transferred.is_active = False
-                bulk_updated_fields.append(job_transferred)
-
-            TransferJob.objects.bulk_update(
-                bulk_updated_fields, ["status", "is_active"]
-            )
-            TransferJob.objects.filter(group=group, job=job).update(
-                status=JobStatus.OPEN.value, is_active=True
-            )
-
-            job_log = JobLog.objects.create(
-            job=job_detail,
-            transferred_by=request.user,
-            status="Transfer",
-            created_at=timezone.now()
-             )
+        if TransferJob.objects.filter(group=group, job=job).exists():
+            try:
+                transfer_to_group(request.user, [int(job)], group)
+            except InvalidTransition as error:
+                return Response(
+                    {"detail": error.detail},
+                    status=return_status.HTTP_400_BAD_REQUEST,
+                )
+            record_job_changes([job])
             return Response(status=return_status.HTTP_200_OK)
 
-        if job_detail:
-            job_detail.status = (
-                self.job_status if self.job_status else JobStatus.TRANSFER.value
-            )
-            job_detail.save()
-
         serializer = self.serializer_class(
             data=request.data, context={"request": request}
         )
         serializer.is_valid(raise_exception=True)
-        TransferJob.objects.filter(job=job, is_active=True).update(is_active=False)
-        if self.job_status:
-            serializer.validated_data["status"] = self.job_status
-        else:
-            serializer.validated_data["status"] = JobStatus.OPEN.value
-            tranferd_job_obj = TransferJob.objects.filter(
-                is_parent_group=True, job=job
-            ).first()
-            tranferd_job_obj.save()
-        if self.is_parent_group:
-            serializer.validated_data["is_parent_group"] = True
-        if self.further_billing:
-            serializer.validated_data["further_billing"] = self.further_billing
-        if self.further_inspection:
-            serializer.validated_data["further_inspection"] = self.further_inspection
-        if self.is_lock_closed:
-            serializer.validated_data["is_lock_closed"] = self.is_lock_closed
-        if self.is_active:
-            serializer.validated_data["is_active"] = self.is_active
-        tranferd_job = serializer.save()
-        tranferd_job.further_inspection = job_detail.further_inspection
-        tranferd_job.save()
+        fields = {
+            name: value
+            for name, value in serializer.validated_data.items()
+            if name in ["further_billing", "is_lock_closed"]
+        }
+        try:
+            [tranferd_job] = transfer_to_group(
+                request.user,
+                [int(job)],
+                group,
+                further_inspection=job_detail.further_inspection,
+                **fields,
+            )
+        except InvalidTransition as error:
+            return Response(
+                {"detail": error.detail}, status=return_status.HTTP_400_BAD_REQUEST
+            )
+        serializer = self.serializer_class(tranferd_job, context={"request": request})
+        record_job_changes([job])
         if not request.user.user_name:
             user_by_email = request.user.email.partition("@")
             user_name = user_by_email[0]
@@ -870,6 +876,7 @@ class GroupJobView(GenericAPIView):
     queryset = TransferJob.objects.exclude(group__is_archive=True)
 
     serializer_class = JobCreationSerializers
+    pagination_class = KeysetPagination
     filter_backends = [filters.SearchFilter]
     search_fields = [
         "job__address",
@@ -922,6 +929,7 @@ class GroupJobView(GenericAPIView):
     )
 
     @swagger_auto_schema(manual_parameters=[status, module, id, from_date, to_date, sort_by])
+    @method_decorator(conditional_job_view(group_scope_from_query))
     def get(self, request, *args, **kwargs):
         status = self.request.query_params.get("status", None)
         module = self.request.query_params.get("module", None)
@@ -1065,6 +1073,7 @@ class MapJobView(GenericAPIView):
     )
 
     @swagger_auto_schema(manual_parameters=[id, sort_by])
+    @method_decorator(conditional_job_view(group_scope_from_query))
     def get(self, request, *args, **kwargs):
         group_id = self.request.query_params.get("id", None)
         sort_by = self.request.query_params.get("sort_by", None)
@@ -1109,6 +1118,200 @@ class MapJobView(GenericAPIView):
         return Response({"results": serializer.data})
 
 
+class JobSuggestionView(GenericAPIView):
+    """
+    Prefix suggestions over job ids and addresses of the user's groups.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    search = openapi.Parameter(
+        "search",
+        openapi.IN_QUERY,
+        required=True,
+        description="Prefix of a job id or an address",
+        type=openapi.TYPE_STRING,
+    )
+    limit = openapi.Parameter(
+        "limit",
+        openapi.IN_QUERY,
+        required=False,
+        type=openapi.TYPE_INTEGER,
+    )
+
+    @swagger_auto_schema(manual_parameters=[search, limit])
+    def get(self, request, *args, **kwargs):
+        search = self.request.query_params.get("search", "")
+        limit = parse_suggestion_limit(self.request.query_params.get("limit"))
+        suggestions = get_job_suggestions(request.user, search, limit=limit)
+        return Response({"results": suggestions})
+
+
+class MapMarkerView(GenericAPIView):
+    """
+    Compact markers of the active open/transfer jobs inside a map viewport.
+    Up to zoom 15 the jobs are returned as clusters with their counts.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    south = openapi.Parameter("south", openapi.IN_QUERY, required=True, type=openapi.TYPE_NUMBER)
+    west = openapi.Parameter("west", openapi.IN_QUERY, required=True, type=openapi.TYPE_NUMBER)
+    north = openapi.Parameter("north", openapi.IN_QUERY, required=True, type=openapi.TYPE_NUMBER)
+    east = openapi.Parameter("east", openapi.IN_QUERY, required=True, type=openapi.TYPE_NUMBER)
+    zoom = openapi.Parameter("zoom", openapi.IN_QUERY, required=False, type=openapi.TYPE_INTEGER)
+    id = openapi.Parameter(
+        "id",
+        openapi.IN_QUERY,
+        required=False,
+        description="Enter Group Id",
+        type=openapi.TYPE_STRING,
+    )
+
+    @swagger_auto_schema(manual_parameters=[south, west, north, east, zoom, id])
+    def get(self, request, *args, **kwargs):
+        params = self.request.query_params
+        try:
+            bbox = parse_bbox(
+                params.get("south"),
+                params.get("west"),
+                params.get("north"),
+                params.get("east"),
+            )
+            zoom = parse_zoom(params.get("zoom"))
+            group_id = int(params["id"]) if params.get("id") else None
+        except ValueError:
+            return Response(
+                {"error": "תיבת גבולות לא חוקית"},
+                status=return_status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(get_map_data(request.user, bbox, zoom, group_id))
+
+
+class NearbyJobView(GenericAPIView):
+    """
+    Active jobs of the user's groups within a radius in meters, closest first.
+    Status and groups take comma separated values.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    lat = openapi.Parameter("lat", openapi.IN_QUERY, required=True, type=openapi.TYPE_NUMBER)
+    lng = openapi.Parameter("lng", openapi.IN_QUERY, required=True, type=openapi.TYPE_NUMBER)
+    radius = openapi.Parameter(
+        "radius",
+        openapi.IN_QUERY,
+        required=False,
+        description="Radius in meters, 200 by default and 5000 at most",
+        type=openapi.TYPE_NUMBER,
+    )
+    status = openapi.Parameter("status", openapi.IN_QUERY, required=False, type=openapi.TYPE_STRING)
+    groups = openapi.Parameter("groups", openapi.IN_QUERY, required=False, type=openapi.TYPE_STRING)
+    limit = openapi.Parameter("limit", openapi.IN_QUERY, required=False, type=openapi.TYPE_INTEGER)
+
+    @swagger_auto_schema(manual_parameters=[lat, lng, radius, status, groups, limit])
+    def get(self, request, *args, **kwargs):
+        try:
+            nearby = parse_nearby_params(self.request.query_params)
+        except ValueError:
+            return Response(
+                {"error": "פרמטרי חיפוש לא חוקיים"},
+                status=return_status.HTTP_400_BAD_REQUEST,
+            )
+        return Response({"results": get_nearby_jobs(request.user, **nearby)})
+
+
+class RoutePlanView(GenericAPIView):
+    """
+    Shortest visit order of a set of transfer jobs, optionally starting from
+    the inspector's position (lat, lng). Distances are in meters.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=["jobs"],
+            properties={
+                "jobs": openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(type=openapi.TYPE_INTEGER),
+                ),
+                "lat": openapi.Schema(type=openapi.TYPE_NUMBER),
+                "lng": openapi.Schema(type=openapi.TYPE_NUMBER),
+            },
+        )
+    )
+    def post(self, request, *args, **kwargs):
+        jobs = request.data.get("jobs")
+        if hasattr(request.data, "getlist") and len(request.data.getlist("jobs")) > 1:
+            jobs = request.data.getlist("jobs")
+        try:
+            job_ids = parse_job_ids(jobs)
+        except (TypeError, ValueError):
+            job_ids = []
+        if not job_ids:
+            return Response(
+                {"error": "נא לבחור משימות"},
+                status=return_status.HTTP_400_BAD_REQUEST,
+            )
+        route = plan_route(
+            request.user, job_ids, request.data.get("lat"), request.data.get("lng")
+        )
+        return Response(route)
+
+
+class JobImportView(GenericAPIView):
+    """
+    Create open jobs from a CSV or XLSX file, whose first row names the
+    columns: address (required), job_id, address_information, description,
+    latitude, longitude, priority, further_inspection, further_billing,
+    is_lock_closed and group (defaults to the group field). Rows with
+    errors are skipped and listed; with dry_run nothing is created.
+    """
+
+    permission_classes = [IsAuthenticated, CheckPermission]
+    parser_classes = [MultiPartParser]
+    view_permissions = {
+        "post": {
+            "inspector": True,
+            "admin": True,
+            "group_manger": True,
+        },
+    }
+
+    file = openapi.Parameter(
+        "file", openapi.IN_FORM, required=True, type=openapi.TYPE_FILE
+    )
+    group = openapi.Parameter(
+        "group", openapi.IN_FORM, required=False, type=openapi.TYPE_INTEGER
+    )
+    dry_run = openapi.Parameter(
+        "dry_run", openapi.IN_FORM, required=False, type=openapi.TYPE_BOOLEAN
+    )
+
+    @swagger_auto_schema(manual_parameters=[file, group, dry_run])
+    def post(self, request, *args, **kwargs):
+        file = request.FILES.get("file")
+        if not file:
+            return Response(
+                {"file": "יש להעלות קובץ"}, status=return_status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            report = import_jobs(
+                request.user,
+                file,
+                group_id=request.data.get("group"),
+                dry_run=str(request.data.get("dry_run")).lower() == "true",
+            )
+        except ImportFileError as error:
+            return Response(
+                {"file": str(error)}, status=return_status.HTTP_400_BAD_REQUEST
+            )
+        return Response(report, status=return_status.HTTP_200_OK)
+
+
 class RecentAddJobView(ListAPIView):
     queryset = Job.objects.all()
     serializer_class = JobCreationSerializers
@@ -1161,21 +1364,24 @@ class ReturnJobView(viewsets.ModelViewSet):
         "create": {"admin": True, "group_manger": True},
     }
 
+    @method_decorator(idempotent("job-return"))
     def create(self, request, *args, **kwargs):
         data = request.data
 
-        job = TransferJob.objects.filter(id=data["job"], is_active=True).first()
-
-        parent_group = TransferJob.objects.filter(
-            job_id=job.job_id, is_parent_group=True
-        ).first()
-
+        job = (
+            TransferJob.objects.select_related(
+                "job__assignment__parent_transfer__group"
+            )
+            .filter(id=data["job"], is_active=True)
+            .first()
+        )
         if not job:
             # {"detail": "Job transfer required."}
             return Response(
                 {"detail": "יש להעביר את המשימה"},
                 status=return_status.HTTP_404_NOT_FOUND,
             )
+        parent_group = get_parent_transfer(job.job)
         if "duplicate" in data:
             dublicate_instance = TransferJob.objects.filter(id=data["job"]).first()
             if not dublicate_instance:
@@ -1225,7 +1431,6 @@ class ReturnJobView(viewsets.ModelViewSet):
 
         if "duplicate" in data:
             job = dublicate_instance
-            job.closed_by = request.user
             data.update(
                 {
                     "return_to": return_to,
@@ -1233,29 +1438,22 @@ class ReturnJobView(viewsets.ModelViewSet):
                     "duplicate": parent_group.id,
                 }
             )
-            TransferJob.objects.filter(job_id=parent_group.job_id).update(
-                is_active=False
-            )
-            duplicate_job = TransferJob.objects.filter(
-                job_id=parent_group.job_id
-            ).first()
-            duplicate_job.job.status = JobStatus.RETURN.value
-            duplicate_job.job.save()
-
-        if "duplicate" not in data:
-            job.job.status = JobStatus.RETURN.value
-            job.is_active = False
-            job.save()
-            job.job.save()
+        else:
             data.update({"return_to": return_to, "job": parent_group.id})
 
         serializer = self.serializer_class(data=data, context={"request": request})
         serializer.is_valid(raise_exception=True)
-        returun_job = serializer.save()
-
-        parent_group.status = JobStatus.RETURN.value
-        parent_group.is_active = True
-        parent_group.save()
+        try:
+            with transaction.atomic():
+                return_transfer_job(
+                    request.user, job, deactivate_all="duplicate" in data
+                )
+                returun_job = serializer.save()
+        except InvalidTransition as error:
+            return Response(
+                {"detail": error.detail}, status=return_status.HTTP_400_BAD_REQUEST
+            )
+        record_job_changes({job.job_id})
 
         if not request.user.user_name:
             user_by_email = request.user.email.partition("@")
@@ -1267,13 +1465,6 @@ class ReturnJobView(viewsets.ModelViewSet):
         notification_job_status = JobStatus.RETURN.value
         notification_type = "Return"
 
-        job_log = JobLog.objects.create(
-            job=job.job,
-            returned_by=request.user,
-            status="Return",
-            created_at=timezone.now()
-        )
-
         PushNotification(
             request.user,
             job.job.address,
@@ -1379,21 +1570,18 @@ class ReturnJobUpdateView(viewsets.ModelViewSet):
             context={"request": request, "images": images, "attachments": attachments},
         )
         update_serializer.is_valid(raise_exception=True)
-        update_serializer.save()
-        transfer_job.status = JobStatus.OPEN.value
-        transfer_job.is_active = False
-        transfer_job.save()
-        return_job.delete()
-        transfer_job.job.status = JobStatus.OPEN.value
-        TransferJob.objects.filter(
-            group_id=return_job.group_id, job_id=transfer_job.job_id
-        ).update(is_active=True)
-
-        TransferJob.objects.filter(
-            job_id=transfer_job.job_id,
-            is_parent_group=False,
-            group_id=return_job.group_id,
-        ).update(is_active=True)
+        try:
+            with transaction.atomic():
+                update_serializer.save()
+                refresh_job_locations([job.id])
+                reopen_returned_job(request.user, transfer_job, return_job.group_id)
+                return_job.delete()
+        except InvalidTransition as error:
+            return Response(
+                {"detail": error.detail}, status=return_status.HTTP_400_BAD_REQUEST
+            )
+        record_job_changes([transfer_job.job_id])
+        transfer_job.refresh_from_db()
 
         serializer = TransferJobSerializers(transfer_job, context={"request": request})
 
@@ -1407,12 +1595,6 @@ class ReturnJobUpdateView(viewsets.ModelViewSet):
         notification_job_status = JobStatus.OPEN.value
         notification_type = "Open"
 
-        job_log = JobLog.objects.create(
-            job=job,
-            updated_by=request.user,
-            status="Update",
-            created_at=timezone.now()
-        )
         PushNotification(
             request.user,
             transfer_job.job.address,
@@ -1420,7 +1602,7 @@ class ReturnJobUpdateView(viewsets.ModelViewSet):
             transfer_job.id,
             notification_job_status,
             notification_type,
-            TransferJob.objects.get(is_parent_group=True, job=transfer_job.job)
+            get_parent_transfer(transfer_job.job)
             .group.member.filter(role_id__in=[1, 3])
             .exclude(id=request.user.id),
         )
@@ -1467,8 +1649,12 @@ class ReturnJobUpdateView(viewsets.ModelViewSet):
                 {"detail": "עבודה לא נמצאה"}, status=return_status.HTTP_404_NOT_FOUND
             )
 
+        deleted_group_ids = get_job_group_ids([transfer_job_id])
         TransferJob.objects.filter(id=transfer_job_id).delete()
         Job.objects.filter(id=transfer_job_id).delete()
+        record_job_changes(
+            group_ids=deleted_group_ids, deleted_job_ids=[transfer_job_id]
+        )
         if not request.user.user_name:
             user_by_email = request.user.email.partition("@")
             user_name = user_by_email[0]
@@ -1532,6 +1718,7 @@ class RecentReturnJobView(ListAPIView):
 class JobNotification(ListAPIView):
     queryset = Notification.objects.exclude(job__isnull=True)
     serializer_class = NotificationSerializer
+    pagination_class = KeysetPagination
     permission_classes = [IsAuthenticated]
 
     def list(self, request, *args, **kwargs):
@@ -1544,48 +1731,169 @@ class JobNotification(ListAPIView):
         return self.get_paginated_response(serializer.data)
 
 
-class RecentSearchJobsListCreateView(ListCreateAPIView):
-    queryset = RecentSearchJob.objects.all()
-    serializer_class = RecentSearchJobCreateSerializer
+class JobChangesView(GenericAPIView):
+    """
+    Jobs and notifications changed since a cursor, for delta sync.
+    Without since, only the current cursor is returned; keep calling with
+    the returned cursor while has_more is true. A 410 means the cursor is
+    too old and the lists must be reloaded.
+    """
+
     permission_classes = [IsAuthenticated]
 
-    def list(self, request, *args, **kwargs):
-        recent_search_data = (
-            RecentSearchJob.objects.filter(
-                created_by=request.user.id,
-                job__in=TransferJob.objects.filter(group__is_archive=False).values_list(
-                    "id", flat=True
-                ),
+    since = openapi.Parameter(
+        "since",
+        openapi.IN_QUERY,
+        required=False,
+        description="Cursor returned by the previous call",
+        type=openapi.TYPE_STRING,
+    )
+
+    @swagger_auto_schema(manual_parameters=[since])
+    def get(self, request, *args, **kwargs):
+        since = self.request.query_params.get("since")
+        if not since:
+            return Response(
+                {
+                    "cursor": get_sync_heads(request.user),
+                    "has_more": False,
+                    "jobs": [],
+                    "deleted": [],
+                    "notifications": [],
+                }
+            )
+        try:
+            changes = get_job_changes(request.user, since)
+        except ValueError:
+            return Response(
+                {"detail": "סמן לא חוקי"}, status=return_status.HTTP_400_BAD_REQUEST
             )
-            .order_by("-created_at")
-            .exclude(
-                Q(job__status=JobStatus.CLOSE.value)
-                | Q(job__job__status=JobStatus.CLOSE.value)
+        except CursorExpired:
+            return Response(
+                {"detail": "סמן פג תוקף"}, status=return_status.HTTP_410_GONE
             )
+
+        changed = [
+            change for change in changes["changes"] if change["kind"] != JobChange.DELETED
+        ]
+        transfer_jobs = TransferJob.objects.filter(
+            job_id__in={change["job_id"] for change in changed},
+            group_id__in={change["group_id"] for change in changed},
+        ).select_related("job", "group")
+        kinds = {
+            (change["job_id"], change["group_id"]): change["kind"] for change in changed
+        }
+        jobs = []
+        for transfer_job in transfer_jobs:
+            kind = kinds.get((transfer_job.job_id, transfer_job.group_id))
+            if kind:
+                job = GetTransferJobSerializers(
+                    transfer_job, context={"request": request}
+                ).data
+                job["change"] = kind
+                jobs.append(job)
+
+        return Response(
+            {
+                "cursor": changes["cursor"],
+                "has_more": changes["has_more"],
+                "jobs": jobs,
+                "deleted": sorted(
+                    {
+                        change["job_id"]
+                        for change in changes["changes"]
+                        if change["kind"] == JobChange.DELETED
+                    }
+                ),
+                "notifications": NotificationSerializer(
+                    changes["notifications"], many=True, context={"request": request}
+                ).data,
+            }
         )
+
+
+class BatchSyncView(GenericAPIView):
+    """
+    Replay the operations recorded offline in one request.
+    operations is a JSON list of {"id", "type", "job", "data", "notes",
+    "images"}, applied in order: type is create, note, image or
+    partial_close, job is a transfer job id or the id of an earlier create
+    operation, and images are the names of the uploaded files. The
+    operations of a job are applied together or not at all; the response
+    has one result per operation, in the same order. Send an
+    Idempotency-Key header so that a retried batch is not applied twice.
+    """
+
+    permission_classes = [IsAuthenticated, CheckPermission]
+    parser_classes = [MultiPartParser, JSONParser]
+    view_permissions = {
+        "post": {
+            "inspector": True,
+            "admin": True,
+            "group_manger": True,
+        },
+    }
+
+    @swagger_auto_schema(
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=["operations"],
+            properties={
+                "operations": openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(type=openapi.TYPE_OBJECT),
+                ),
+            },
+        )
+    )
+    @method_decorator(idempotent("job-batch"))
+    def post(self, request, *args, **kwargs):
+        try:
+            operations = parse_operations(request.data.get("operations"))
+        except ValueError as error:
+            return Response(
+                {"detail": str(error)}, status=return_status.HTTP_400_BAD_REQUEST
+            )
+
+        results, notifications = apply_operations(request, operations, request.FILES)
+        for notification in notifications:
+            PushNotification(
+                request.user,
+                notification["address"],
+                notification["body"],
+                notification["job_id"],
+                notification["status"],
+                notification["type"],
+                notification["receivers"],
+            )
+        return Response({"results": results}, status=return_status.HTTP_200_OK)
+
+
+class RecentSearchJobsListCreateView(ListCreateAPIView):
+    serializer_class = RecentJobSearchSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return get_recent_searches(self.request.user)
+
+    def list(self, request, *args, **kwargs):
         serializer = self.serializer_class(
-            recent_search_data, many=True, context={"request": request}
+            self.get_queryset(), many=True, context={"request": request}
         )
         return Response(serializer.data)
 
     def post(self, request, *args, **kwargs):
-        current_user = self.request.user
-        data = request.data
-        duplicate_job = RecentSearchJob.objects.filter(
-            job_id=data["job"], created_by=current_user.id
+        """Record a search, moving the job to the top of the user's recent searches."""
+        job_id = str(request.data.get("job", ""))
+        # {"job": "Job not found"}
+        not_found = Response(
+            {"job": "משימה לא נמצאה"}, status=return_status.HTTP_400_BAD_REQUEST
         )
-        duplicate_job.delete()
-        serializer = self.serializer_class(data=data, context={"request": request})
-        serializer.is_valid(raise_exception=True)
-        recent_job = serializer.save()
-        recent_job.created_by = current_user
-        recent_job.save()
-        if 15 < RecentSearchJob.objects.filter(created_by=current_user.id).count():
-            RecentSearchJob.objects.filter(
-                pk__in=RecentSearchJob.objects.filter(created_by=current_user.id)
-                .order_by("-created_at")
-                .values_list("pk")[15:]
-            ).delete()
+        if not job_id.isdigit() or not TransferJob.objects.filter(id=job_id).exists():
+            return not_found
+        with transaction.atomic():
+            recent_search = record_recent_search(request.user, int(job_id))
+        serializer = self.serializer_class(recent_search, context={"request": request})
         return Response(serializer.data)
 
 
@@ -2590,8 +2898,14 @@ class AddDuplicateJobReference(CreateAPIView):
         duplicate_obj.delete()
 
         # delete transfer job
+        deleted_group_ids = get_job_group_ids([transfer_obj.job_id])
         transfer_obj.delete()
         transfer_obj.job.delete()
+        record_job_changes(
+            [original_job.job_id],
+            deleted_group_ids,
+            deleted_job_ids=[transfer_obj.job_id],
+        )
 
         return Response(
             {"detail": "Confirm duplicate successful"}, status=return_status.HTTP_200_OK
@@ -2605,11 +2919,17 @@ class JobIsReviewed(CreateAPIView):
     def post(self, request, *args, **kwargs):
         job_id = request.data.get("job_id")
         transferJob = self.queryset.filter(id=job_id).first()
-        if request.data.get("is_reviewed") == "true":
-            transferJob.is_reviewed = True
-        if request.data.get("is_reviewed") == "false":
-            transferJob.is_reviewed = False
-        transferJob.save()
+        if transferJob is None:
+            return Response(
+                {"detail": "משימה לא נמצאה"}, status=return_status.HTTP_404_NOT_FOUND
+            )
+        try:
+            is_reviewed = parse_review_state(request.data.get("is_reviewed"))
+        except ValueError as error:
+            return Response(
+                {"detail": str(error)}, status=return_status.HTTP_400_BAD_REQUEST
+            )
+        review_transfer_jobs(request.user, {transferJob.id: is_reviewed})
         return Response(
             {"detail": "Job Reviewed successful"}, status=return_status.HTTP_200_OK
         )
@@ -2619,6 +2939,201 @@ class DeleteJobView(DestroyAPIView):
     queryset = Job.objects.all()
     permission_classes = [IsSuperUser | UserPermission]
 
+    def perform_destroy(self, instance):
+        deleted_job_id = instance.id
+        deleted_group_ids = get_job_group_ids([deleted_job_id])
+        instance.delete()
+        record_job_changes(group_ids=deleted_group_ids, deleted_job_ids=[deleted_job_id])
+
+
+class BulkCloseJobView(GenericAPIView):
+    """
+    Close many transfer jobs at once, in one transaction.
+    bills are the bill quantities shared by all the jobs, job_bills the
+    quantities of single jobs by transfer job id, each a list of
+    {"bill", "measurement"}. Nothing is closed when a job cannot be.
+    """
+
+    permission_classes = [IsAuthenticated, CheckPermission]
+    parser_classes = [JSONParser]
+    view_permissions = {
+        "post": {
+            "inspector": True,
+            "admin": True,
+            "group_manger": True,
+        },
+    }
+
+    bill_quantities = openapi.Schema(
+        type=openapi.TYPE_ARRAY,
+        items=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                "bill": openapi.Schema(type=openapi.TYPE_INTEGER),
+                "measurement": openapi.Schema(type=openapi.TYPE_NUMBER),
+            },
+        ),
+    )
+
+    @swagger_auto_schema(
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=["jobs"],
+            properties={
+                "jobs": openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(type=openapi.TYPE_INTEGER),
+                ),
+                "bills": bill_quantities,
+                "job_bills": openapi.Schema(
+                    type=openapi.TYPE_OBJECT, additional_properties=bill_quantities
+                ),
+                "further_billing": openapi.Schema(type=openapi.TYPE_BOOLEAN),
+            },
+        )
+    )
+    @method_decorator(idempotent("job-bulk-close"))
+    def post(self, request, *args, **kwargs):
+        try:
+            job_ids = parse_job_ids(request.data.get("jobs"))
+            shared_bills = parse_bill_quantities(request.data.get("bills"))
+            job_bills = {
+                int(job_id): parse_bill_quantities(rows)
+                for job_id, rows in (request.data.get("job_bills") or {}).items()
+            }
+        except (AttributeError, TypeError, ValueError) as error:
+            return Response(
+                {"detail": str(error) or "נתונים לא חוקיים"},
+                status=return_status.HTTP_400_BAD_REQUEST,
+            )
+        if not job_ids or len(job_ids) > MAX_BULK_CLOSE_JOBS:
+            return Response(
+                {"detail": f"נא לבחור בין 1 ל-{MAX_BULK_CLOSE_JOBS} משימות"},
+                status=return_status.HTTP_400_BAD_REQUEST,
+            )
+        unknown = sorted(set(job_bills) - set(job_ids))
+        if unknown:
+            return Response(
+                {
+                    "detail": "סעיפים נשלחו למשימות שלא נבחרו",
+                    "job_bills": unknown,
+                },
+                status=return_status.HTTP_400_BAD_REQUEST,
+            )
+
+        transfer_jobs = TransferJob.objects.filter(id__in=job_ids)
+        group_ids = get_user_group_ids(request.user)
+        if group_ids is not None:
+            transfer_jobs = transfer_jobs.filter(group_id__in=group_ids)
+        positions = {job_id: position for position, job_id in enumerate(job_ids)}
+        transfer_jobs = sorted(
+            transfer_jobs, key=lambda transfer_job: positions[transfer_job.id]
+        )
+        found = {transfer_job.id for transfer_job in transfer_jobs}
+        closed = [
+            transfer_job.id
+            for transfer_job in transfer_jobs
+            if transfer_job.status == JobStatus.CLOSE.value
+        ]
+        if len(found) != len(job_ids) or closed:
+            return Response(
+                {
+                    "detail": "לא ניתן לסגור חלק מהמשימות",
+                    "not_found": [job_id for job_id in job_ids if job_id not in found],
+                    "closed": closed,
+                },
+                status=return_status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            close_job_bills = get_close_job_bills(
+                request.user, transfer_jobs, shared_bills, job_bills
+            )
+        except ValueError as error:
+            return Response(
+                {"detail": str(error)}, status=return_status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            close_jobs(
+                request.user,
+                transfer_jobs,
+                close_job_bills,
+                further_billing=str(request.data.get("further_billing")).lower()
+                == "true",
+            )
+        except InvalidTransition as error:
+            return Response(
+                {"detail": error.detail}, status=return_status.HTTP_400_BAD_REQUEST
+            )
+        notify_closed_jobs(request.user, transfer_jobs)
+        return Response(
+            {"closed": job_ids, "bills": len(close_job_bills)},
+            status=return_status.HTTP_200_OK,
+        )
+
+
+class BulkReviewJobView(GenericAPIView):
+    """
+    Set is_reviewed of many transfer jobs at once, in one transaction.
+    reviews is a list of {"id", "is_reviewed"}. Nothing is reviewed when a
+    job is not found.
+    """
+
+    permission_classes = [IsAuthenticated, IsInspector]
+    parser_classes = [JSONParser]
+
+    @swagger_auto_schema(
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=["reviews"],
+            properties={
+                "reviews": openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(
+                        type=openapi.TYPE_OBJECT,
+                        properties={
+                            "id": openapi.Schema(type=openapi.TYPE_INTEGER),
+                            "is_reviewed": openapi.Schema(type=openapi.TYPE_BOOLEAN),
+                        },
+                    ),
+                ),
+            },
+        )
+    )
+    def post(self, request, *args, **kwargs):
+        try:
+            reviews = parse_reviews(request.data.get("reviews"))
+        except (AttributeError, TypeError, ValueError) as error:
+            return Response(
+                {"detail": str(error) or "נתונים לא חוקיים"},
+                status=return_status.HTTP_400_BAD_REQUEST,
+            )
+        if not reviews or len(reviews) > MAX_BULK_REVIEW_JOBS:
+            return Response(
+                {"detail": f"נא לבחור בין 1 ל-{MAX_BULK_REVIEW_JOBS} משימות"},
+                status=return_status.HTTP_400_BAD_REQUEST,
+            )
+
+        transfer_jobs = TransferJob.objects.filter(id__in=reviews)
+        group_ids = get_user_group_ids(request.user)
+        if group_ids is not None:
+            transfer_jobs = transfer_jobs.filter(group_id__in=group_ids)
+        found = set(transfer_jobs.values_list("id", flat=True))
+        if len(found) != len(reviews):
+            return Response(
+                {
+                    "detail": "לא ניתן לבדוק חלק מהמשימות",
+                    "not_found": [job_id for job_id in reviews if job_id not in found],
+                },
+                status=return_status.HTTP_400_BAD_REQUEST,
+            )
+
+        changed = review_transfer_jobs(request.user, reviews)
+        return Response(
+            {"reviewed": list(reviews), "changed": changed},
+            status=return_status.HTTP_200_OK,
+        )
+
 
 class MultipleJobTransferView(CreateAPIView):
     model = TransferJob
@@ -2627,51 +3142,20 @@ class MultipleJobTransferView(CreateAPIView):
     def post(self, request, *args, **kwargs):
         jobs_list = request.data.getlist("jobs")
         transfer_group = request.data.get("group")
-        create_list = []
 
-        jobs = TransferJob.objects.filter(job__job_id__in=jobs_list, is_active=True)
+        jobs = list(
+            TransferJob.objects.filter(job__job_id__in=jobs_list, is_active=True)
+        )
 
         if jobs and len(jobs) == len(jobs_list):
-            for job in jobs:
-                if TransferJob.objects.filter(group=transfer_group, job=job.job_id):
-                    job_transferred_groups = TransferJob.objects.filter(job=job.job_id)
-                    bulk_updated_fields = []
-                    for job_transferred in job_transferred_groups:
-                        job_transferred.status = JobStatus.TRANSFER.value
-                        job_transferred.is_active = False
-                        bulk_updated_fields.append(job_transferred)
-
-                    TransferJob.objects.bulk_update(
-                        bulk_updated_fields, ["status", "is_active"]
-                    )
-
-                    TransferJob.objects.filter(
-                        group=transfer_group, job=job.job_id
-                    ).update(status=JobStatus.OPEN.value, is_active=True)
-                else:
-                    job.status = JobStatus.TRANSFER.value
-                    job.job.status = JobStatus.TRANSFER.value
-                    job.is_active = False
-                    job.save()
-                    job.job.save()
-
-                    create_list.append(
-                        TransferJob(
-                            created_by_id=self.request.user.id,
-                            group_id=transfer_group,
-                            job_id=job.job_id,
-                            status=JobStatus.TRANSFER.value,
-                            is_active=True,
-                        )
-                    )
-                job_log = JobLog.objects.create(
-                        job=job.job,
-                        transferred_by=request.user,
-                        status="Transfer",
-                        created_at=timezone.now()
-                    )
-
-            TransferJob.objects.bulk_create(create_list)
+            try:
+                transferred = transfer_jobs(request.user, jobs, transfer_group)
+            except InvalidTransition as error:
+                return Response(
+                    {"detail": error.detail},
+                    status=return_status.HTTP_400_BAD_REQUEST,
+                )
+            notify_transferred_jobs(request.user, transfer_group, transferred)
             return Response(
                 {"detail": "Job Transferd successfully"},
                 status=return_status.HTTP_200_OK,
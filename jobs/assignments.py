@@ -0,0 +1,93 @@
+from django.db import transaction
+from django.db.models import Max
+from django.db.models import Min
+
+from jobs.models import JobAssignment
+from users.models.job import Job
+from users.models.job import TransferJob
+
+
+# Lookup from a transfer job to the job of the assignments pointing at it.
+ASSIGNMENT_LOOKUPS = {
+    "active_transfer": "active_assignments__job_id",
+    "parent_transfer": "parent_assignments__job_id",
+}
+
+
+@transaction.atomic
+def refresh_job_assignments(job_ids):
+    """
+    Point the assignment of each job at its active and main group transfer jobs.
+
+    The latest active row is the active one when a job has several. Jobs
+    without transfer jobs are dropped from the table. The rows are upserted,
+    so concurrent refreshes of the same job do not collide.
+    """
+    job_ids = set(job_ids)
+    if not job_ids:
+        return
+    transfers = TransferJob.objects.filter(job_id__in=job_ids).values("job_id")
+    active = dict(
+        transfers.filter(is_active=True)
+        .annotate(transfer_id=Max("id"))
+        .order_by()
+        .values_list("job_id", "transfer_id")
+    )
+    parent = dict(
+        transfers.filter(is_parent_group=True)
+        .annotate(transfer_id=Min("id"))
+        .order_by()
+        .values_list("job_id", "transfer_id")
+    )
+    assigned = set(active) | set(parent)
+    JobAssignment.objects.filter(job_id__in=job_ids - assigned).delete()
+    JobAssignment.objects.bulk_create(
+        [
+            JobAssignment(
+                job_id=job_id,
+                active_transfer_id=active.get(job_id),
+                parent_transfer_id=parent.get(job_id),
+            )
+            for job_id in assigned
+        ],
+        update_conflicts=True,
+        unique_fields=["job"],
+        update_fields=["active_transfer", "parent_transfer"],
+    )
+
+
+def get_assigned_transfer(job, pointer):
+    """
+    Transfer job an assignment pointer of a job refers to, with its group.
+
+    Read from the assignment when it was selected with the job, otherwise
+    with one query through the assignment. None when the job has none yet.
+    """
+    if Job.assignment.is_cached(job):
+        try:
+            return getattr(job.assignment, pointer)
+        except JobAssignment.DoesNotExist:
+            return None
+    return (
+        TransferJob.objects.select_related("group")
+        .filter(**{ASSIGNMENT_LOOKUPS[pointer]: job.id})
+        .first()
+    )
+
+
+def get_active_transfer(job):
+    """Active transfer job of a job, the latest one when it has several."""
+    return get_assigned_transfer(job, "active_transfer") or (
+        TransferJob.objects.select_related("group")
+        .filter(job_id=job.id, is_active=True)
+        .last()
+    )
+
+
+def get_parent_transfer(job):
+    """Main group transfer job of a job."""
+    return get_assigned_transfer(job, "parent_transfer") or (
+        TransferJob.objects.select_related("group")
+        .filter(job_id=job.id, is_parent_group=True)
+        .first()
+    )
@@ -0,0 +1,200 @@
+import logging
+import math
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db import transaction
+from django.db.models import Max
+from django.db.models import Min
+from django.utils import timezone
+
+from jobs.models import BackfillCheckpoint
+
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_CHUNK_SIZE = 1000
+
+
+class Backfill:
+    """
+    A data backfill run over a queryset in primary key chunks.
+
+    Subclasses set name and implement get_queryset() and build(), which
+    returns the objects to insert for a chunk of rows. The objects of a
+    chunk are inserted with bulk_create in the transaction that moves its
+    checkpoint forward, so a stopped run resumes after the last committed
+    chunk without inserting anything twice.
+    """
+
+    name = None
+
+    def __init__(self, chunk_size=BACKFILL_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+
+    def get_queryset(self):
+        raise NotImplementedError
+
+    def build(self, rows):
+        raise NotImplementedError
+
+    def get_checkpoints(self, workers):
+        """
+        Checkpoints of the key ranges to process, one range per worker.
+
+        The ranges of an earlier run are kept, whatever the number of
+        workers now, so that its progress is not lost.
+        """
+        checkpoints = BackfillCheckpoint.objects.filter(name=self.name).order_by(
+            "start_id"
+        )
+        if not checkpoints.exists():
+            bounds = self.get_queryset().aggregate(start=Min("pk"), end=Max("pk"))
+            if bounds["start"] is None:
+                return []
+            step = math.ceil((bounds["end"] - bounds["start"] + 1) / workers)
+            BackfillCheckpoint.objects.bulk_create(
+                [
+                    BackfillCheckpoint(
+                        name=self.name,
+                        start_id=start_id,
+                        end_id=min(start_id + step - 1, bounds["end"]),
+                    )
+                    for start_id in range(bounds["start"], bounds["end"] + 1, step)
+                ],
+                ignore_conflicts=True,
+            )
+        return list(checkpoints.filter(completed_at__isnull=True))
+
+    def insert(self, objects):
+        """bulk_create the objects, grouped by model. Return how many were inserted."""
+        by_model = {}
+        for obj in objects:
+            by_model.setdefault(type(obj), []).append(obj)
+        for model, model_objects in by_model.items():
+            model.objects.bulk_create(model_objects, batch_size=self.chunk_size)
+        return len(objects)
+
+    def run_range(self, checkpoint_id):
+        """Process the rest of a checkpoint's range, chunk after chunk."""
+        checkpoint = BackfillCheckpoint.objects.get(id=checkpoint_id)
+        queryset = (
+            self.get_queryset()
+            .filter(pk__gte=checkpoint.start_id, pk__lte=checkpoint.end_id)
+            .order_by("pk")
+        )
+        started = time.monotonic()
+        processed = created = 0
+        while True:
+            rows = queryset
+            if checkpoint.last_id is not None:
+                rows = rows.filter(pk__gt=checkpoint.last_id)
+            rows = list(rows[: self.chunk_size])
+            with transaction.atomic():
+                if rows:
+                    chunk_created = self.insert(self.build(rows))
+                    checkpoint.last_id = rows[-1].pk
+                    checkpoint.processed += len(rows)
+                    checkpoint.created += chunk_created
+                else:
+                    checkpoint.completed_at = timezone.now()
+                checkpoint.save()
+            if not rows:
+                break
+
+            processed += len(rows)
+            created += chunk_created
+            elapsed = time.monotonic() - started
+            logger.info(
+                "%s %s-%s: %s rows at %s, %s created, %.0f rows/s",
+                self.name,
+                checkpoint.start_id,
+                checkpoint.end_id,
+                processed,
+                checkpoint.last_id,
+                created,
+                processed / elapsed if elapsed else processed,
+            )
+        return processed, created
+
+    def run(self, workers=1, restart=False):
+        """
+        Run the backfill, resuming an interrupted run unless restart is set.
+
+        With several workers the key ranges are processed by as many
+        processes in parallel. Return (rows processed, objects created).
+        """
+        if restart:
+            BackfillCheckpoint.objects.filter(name=self.name).delete()
+        checkpoint_ids = [
+            checkpoint.id for checkpoint in self.get_checkpoints(max(workers, 1))
+        ]
+        if workers > 1 and len(checkpoint_ids) > 1:
+            # Forked workers must not share the parent's database connections.
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("fork")
+            ) as executor:
+                results = list(
+                    executor.map(
+                        run_backfill_range,
+                        [self] * len(checkpoint_ids),
+                        checkpoint_ids,
+                    )
+                )
+        else:
+            results = [
+                self.run_range(checkpoint_id) for checkpoint_id in checkpoint_ids
+            ]
+        return (
+            sum(processed for processed, _ in results),
+            sum(created for _, created in results),
+        )
+
+
+def run_backfill_range(backfill, checkpoint_id):
+    try:
+        return backfill.run_range(checkpoint_id)
+    finally:
+        connections.close_all()
+
+
+class BackfillCommand(BaseCommand):
+    """Management command running the backfill_class Backfill."""
+
+    backfill_class = None
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=BACKFILL_CHUNK_SIZE)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Worker processes, each backfilling its own key range",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Forget the progress of earlier runs and start over",
+        )
+
+    def handle(self, *args, **options):
+        if options["verbosity"] > 1:
+            # Progress of every chunk, forked workers included.
+            logger.addHandler(logging.StreamHandler(self.stdout))
+            logger.setLevel(logging.INFO)
+        backfill = self.backfill_class(chunk_size=options["chunk_size"])
+        started = time.monotonic()
+        processed, created = backfill.run(
+            workers=options["workers"], restart=options["restart"]
+        )
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{backfill.name}: {processed} rows processed, {created} created "
+                f"in {elapsed:.1f}s ({processed / elapsed if elapsed else 0:.0f} rows/s)"
+            )
+        )
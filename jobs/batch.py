@@ -0,0 +1,333 @@
+import json
+import logging
+
+from django.db import transaction
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+
+from jobs.apis.serializers import JobCreationSerializers
+from jobs.apis.serializers import JobImagesSerializer
+from jobs.apis.serializers import JobNoteCreateSerializer
+from jobs.changes import record_job_changes
+from jobs.covers import refresh_cover_images
+from jobs.creation import create_job
+from jobs.idempotency import mark_committed
+from jobs.suggestions import get_user_group_ids
+from jobs.transitions import InvalidTransition
+from jobs.transitions import partially_close_transfer_job
+from users.models.group import Group
+from users.models.job import JobImage
+from users.models.job import JobNote
+from users.models.job import JobStatus
+from users.models.job import ReturnJob
+from users.models.job import TransferJob
+
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_OPERATIONS = 200
+
+CREATE = "create"
+NOTE = "note"
+IMAGE = "image"
+PARTIAL_CLOSE = "partial_close"
+OPERATION_TYPES = [CREATE, NOTE, IMAGE, PARTIAL_CLOSE]
+
+OK = "ok"
+FAILED = "error"
+
+
+class BatchError(Exception):
+    """An operation that cannot be applied; the operations of its job are rolled back."""
+
+    def __init__(self, detail):
+        super().__init__(detail)
+        self.detail = detail
+        self.operation = None
+
+
+def parse_operations(value):
+    """
+    Return the operations of a JSON list, ValueError with the reason if invalid.
+
+    Each operation is {"id", "type", "job", "data", "notes", "images"}: id is
+    the client's, job is a transfer job id or the id of a create operation
+    earlier in the batch, and images are the names of uploaded files.
+    """
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            raise ValueError("רשימת הפעולות אינה JSON חוקי")
+    if not isinstance(value, list) or not value:
+        raise ValueError("נדרשת רשימת פעולות")
+    if len(value) > MAX_BATCH_OPERATIONS:
+        raise ValueError(f"ניתן לשלוח עד {MAX_BATCH_OPERATIONS} פעולות בבקשה")
+
+    operation_ids = set()
+    for operation in value:
+        if not isinstance(operation, dict) or not operation.get("id"):
+            raise ValueError("לכל פעולה נדרש מזהה")
+        operation["id"] = str(operation["id"])
+        if operation["id"] in operation_ids:
+            raise ValueError(f"מזהה פעולה כפול {operation['id']}")
+        if operation.get("type") not in OPERATION_TYPES:
+            raise ValueError(f"סוג פעולה לא חוקי בפעולה {operation['id']}")
+        operation_ids.add(operation["id"])
+    return value
+
+
+def get_job_key(operation):
+    """Key of the job an operation applies to, create operations starting a new one."""
+    if operation["type"] == CREATE:
+        return CREATE, operation["id"]
+    job = str(operation.get("job") or "")
+    if job.isdigit():
+        return "transfer", int(job)
+    return CREATE, job
+
+
+def group_operations(operations):
+    """Split the operations per job, keeping the order of jobs and of their operations."""
+    groups = {}
+    for operation in operations:
+        groups.setdefault(get_job_key(operation), []).append(operation)
+    return groups
+
+
+def get_user_name(user):
+    return user.user_name or user.email.partition("@")[0]
+
+
+class JobBatch:
+    """
+    The operations of one job, applied in order.
+
+    Notes and images of all the operations are inserted in bulk once the
+    last one is applied, and the derived job data is refreshed once.
+    """
+
+    def __init__(self, request, files, group_ids):
+        self.request = request
+        self.user = request.user
+        self.files = files
+        self.group_ids = group_ids
+        self.transfer_job = None
+        self.notes = []
+        self.images = []
+        self.notifications = []
+
+    def get_transfer_job(self, key):
+        kind, value = key
+        if kind == CREATE:
+            return None
+        transfer_job = (
+            TransferJob.objects.select_for_update()
+            .select_related("job", "group")
+            .filter(id=value)
+            .first()
+        )
+        if not transfer_job or (
+            self.group_ids is not None and transfer_job.group_id not in self.group_ids
+        ):
+            raise BatchError({"detail": f"משימה עם מזהה {value} לא נמצאה "})
+        return transfer_job
+
+    def add_notes(self, operation):
+        for note in operation.get("notes") or []:
+            JobNoteCreateSerializer(data={"note": note}).is_valid(raise_exception=True)
+            self.notes.append(
+                JobNote(
+                    job=self.transfer_job.job,
+                    note=note,
+                    created_by=self.user,
+                    updated_by=self.user,
+                )
+            )
+
+    def add_images(self, operation, close=False):
+        for name in operation.get("images") or []:
+            image = self.files.get(name)
+            if image is None:
+                raise BatchError({"images": f"הקובץ {name} לא נשלח"})
+            JobImagesSerializer(data={"image": image}).is_valid(raise_exception=True)
+            self.images.append(
+                JobImage(
+                    job=self.transfer_job.job,
+                    image=image,
+                    created_by=self.user,
+                    updated_by=self.user,
+                    close_job_image=close,
+                )
+            )
+
+    def create(self, operation):
+        data = dict(operation.get("data") or {})
+        group_id = str(data.get("group", ""))
+        if not group_id.isdigit() or (
+            self.group_ids is not None and int(group_id) not in self.group_ids
+        ):
+            raise BatchError({"group": "קבוצה לא נמצאה"})
+        group = Group.objects.filter(id=group_id, is_archive=False).first()
+        if not group:
+            raise BatchError({"group": "קבוצה לא נמצאה"})
+
+        data["status"] = JobStatus.OPEN.value
+        serializer = JobCreationSerializers(
+            data=data,
+            context={
+                "request": self.request,
+                "images": [],
+                "attachments": [],
+                "forms": data.get("form") or [],
+                "bills": data.get("bill") or [],
+                "notes": [],
+            },
+        )
+        serializer.is_valid(raise_exception=True)
+        self.transfer_job = create_job(
+            self.user,
+            serializer.validated_data,
+            group,
+            forms=data.get("form") or [],
+            bills=data.get("bill") or [],
+        )
+        job = self.transfer_job.job
+        if str(data.get("priority")).lower() == "true":
+            self.notifications.append(
+                {
+                    "address": job.address,
+                    "body": f"המשימה נפתחה על ידי @{get_user_name(self.user)}",
+                    "job_id": self.transfer_job.id,
+                    "status": JobStatus.OPEN.value,
+                    "type": "Open",
+                    "receivers": group.member.filter(role_id=3).exclude(
+                        id=self.user.id
+                    ),
+                }
+            )
+        self.add_notes(operation)
+        self.add_images(operation)
+
+    def partial_close(self, operation):
+        """Partially close the job, as the job update with the Partial status does."""
+        transfer_job = self.transfer_job
+        job = transfer_job.job
+        data = operation.get("data") or {}
+        further_inspection = str(data.get("further_inspection")).lower() == "true"
+        if further_inspection:
+            job.further_inspection = True
+            transfer_job.further_inspection = True
+        job.updated_by = self.user
+        job.save(update_fields=["further_inspection", "updated_by", "updated_at"])
+        transfer_job.closed_by = self.user
+        transfer_job.updated_by = self.user
+        transfer_job.save(
+            update_fields=["further_inspection", "closed_by", "updated_by", "updated_at"]
+        )
+        try:
+            partially_close_transfer_job(self.user, transfer_job)
+        except InvalidTransition as error:
+            raise BatchError({"detail": error.detail})
+        ReturnJob.objects.filter(
+            Q(job__id=transfer_job.id) | Q(duplicate__id=transfer_job.id)
+        ).delete()
+
+        parent_group_job = None
+        if further_inspection:
+            parent_group_job = (
+                TransferJob.objects.select_related("group")
+                .filter(job_id=job.id, is_parent_group=True)
+                .first()
+            )
+        if parent_group_job:
+            self.notifications.append(
+                {
+                    "address": job.address,
+                    "body": f"משימה זו נסגרה על ידי @{get_user_name(self.user)}",
+                    "job_id": transfer_job.id,
+                    "status": JobStatus.PARTIAL.value,
+                    "type": "Partial Close",
+                    "receivers": parent_group_job.group.member.filter(
+                        role_id__in=[1, 2]
+                    ).exclude(id=self.user.id),
+                }
+            )
+        self.add_notes(operation)
+        self.add_images(operation, close=True)
+
+    def apply(self, key, operations):
+        """Apply the operations in one transaction, raising BatchError on the first failure."""
+        with transaction.atomic():
+            self.transfer_job = self.get_transfer_job(key)
+            for operation in operations:
+                try:
+                    if operation["type"] == CREATE:
+                        self.create(operation)
+                    elif self.transfer_job is None:
+                        raise BatchError(
+                            {"job": f"המשימה {operation.get('job')} לא נוצרה בבקשה זו"}
+                        )
+                    elif operation["type"] == PARTIAL_CLOSE:
+                        self.partial_close(operation)
+                    else:
+                        self.add_notes(operation)
+                        self.add_images(operation)
+                except BatchError as error:
+                    error.operation = operation
+                    raise
+                except ValidationError as error:
+                    batch_error = BatchError(error.detail)
+                    batch_error.operation = operation
+                    raise batch_error
+
+            job_id = self.transfer_job.job_id
+            JobNote.objects.bulk_create(self.notes)
+            JobImage.objects.bulk_create(self.images)
+            if self.images:
+                refresh_cover_images([job_id])
+            record_job_changes([job_id])
+        return self.transfer_job
+
+
+def apply_operations(request, operations, files):
+    """
+    Apply a batch of operations and return (results, notifications).
+
+    Operations of the same job share a transaction: when one fails, the
+    others of that job are rolled back and reported as failed too, while
+    the other jobs are still applied. Unexpected errors fail their job the
+    same way, so the jobs committed before are still reported. Notifications
+    are those of the committed jobs only, for the caller to send.
+    """
+    group_ids = get_user_group_ids(request.user)
+    results = {}
+    notifications = []
+    for key, job_operations in group_operations(operations).items():
+        batch = JobBatch(request, files, group_ids)
+        try:
+            transfer_job = batch.apply(key, job_operations)
+        except Exception as error:
+            if not isinstance(error, BatchError):
+                logger.exception("Batch operations of job %s failed", key[1])
+                error = BatchError({"detail": "אירעה שגיאה בביצוע הפעולה"})
+            for operation in job_operations:
+                results[operation["id"]] = {
+                    "id": operation["id"],
+                    "status": FAILED,
+                    "errors": error.detail
+                    if error.operation in (None, operation)
+                    else {"detail": "הפעולה בוטלה בגלל שגיאה בפעולה אחרת של המשימה"},
+                }
+            continue
+
+        mark_committed(request)
+        notifications += batch.notifications
+        for operation in job_operations:
+            results[operation["id"]] = {
+                "id": operation["id"],
+                "status": OK,
+                "transfer_job": transfer_job.id,
+                "job": transfer_job.job_id,
+            }
+    return [results[operation["id"]] for operation in operations], notifications
@@ -0,0 +1,274 @@
+import datetime
+import hashlib
+
+from django.db.models import Count
+from django.db.models import F
+from django.db.models import Max
+from django.db.models import Min
+from django.db.models import QuerySet
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.translation import get_language
+from django.views.decorators.http import condition
+
+from jobs.assignments import refresh_job_assignments
+from jobs.clusters import update_job_clusters
+from jobs.counters import get_job_group_ids
+from jobs.counters import update_job_counters
+from jobs.models import JobChange
+from jobs.models import JobChangeStamp
+from jobs.suggestions import get_user_group_ids
+from users.models.group import Group
+from users.models.job import JobStatus
+from users.models.job import TransferJob
+from users.models.notification import Notification
+
+
+SYNC_LIMIT = 500
+
+
+class CursorExpired(Exception):
+    pass
+
+
+def bump_change_stamps(scope, object_ids, now):
+    """
+    Add one to the version of the stamps of the objects.
+
+    Missing stamps are created at version 0 first, so concurrent first bumps
+    of an object both land on the same row and neither is lost.
+    """
+    object_ids = sorted(set(object_ids))
+    if not object_ids:
+        return
+    JobChangeStamp.objects.bulk_create(
+        [
+            JobChangeStamp(scope=scope, object_id=object_id, updated_at=now)
+            for object_id in object_ids
+        ],
+        ignore_conflicts=True,
+    )
+    JobChangeStamp.objects.filter(scope=scope, object_id__in=object_ids).update(
+        version=F("version") + 1, updated_at=now
+    )
+
+
+def append_job_changes(job_ids, group_ids, deleted_job_ids):
+    """
+    Add one feed entry per changed job and group.
+
+    A job without earlier entries is reported as created, a job closed in a
+    group as closed there. Deleted jobs are reported in every given group.
+    """
+    changes = []
+    seen_job_ids = set(
+        JobChange.objects.filter(job_id__in=job_ids).values_list("job_id", flat=True)
+    )
+    transfers = TransferJob.objects.filter(job_id__in=job_ids).values_list(
+        "job_id", "group_id", "status"
+    )
+    for job_id, group_id, status in transfers:
+        if status == JobStatus.CLOSE.value:
+            kind = JobChange.CLOSED
+        elif job_id in seen_job_ids:
+            kind = JobChange.UPDATED
+        else:
+            kind = JobChange.CREATED
+        changes.append(
+            JobChange(job_id=job_id, group_id=group_id, kind=kind, status=status)
+        )
+    for job_id in deleted_job_ids:
+        for group_id in group_ids:
+            changes.append(
+                JobChange(job_id=job_id, group_id=group_id, kind=JobChange.DELETED)
+            )
+    JobChange.objects.bulk_create(changes)
+
+
+def record_job_changes(job_ids=(), group_ids=(), deleted_job_ids=()):
+    """
+    Bring everything derived from the jobs up to date after they changed.
+
+    Refreshes the assignments and dashboard counts of the jobs and the map
+    clusters of their groups, bumps the change stamps HTTP validators
+    are computed from and appends the changes to the delta sync feed. Pass
+    the groups a job is leaving, or the groups of a deleted job, in
+    group_ids and deleted jobs in deleted_job_ids.
+    """
+    job_ids = set(job_ids)
+    group_ids = set(group_ids)
+    if job_ids:
+        refresh_job_assignments(job_ids)
+        group_ids |= get_job_group_ids(job_ids)
+    update_job_counters(job_ids | set(deleted_job_ids))
+    update_job_clusters(job_ids | set(deleted_job_ids))
+
+    now = timezone.now()
+    bump_change_stamps(JobChangeStamp.JOB, set(job_ids) | set(deleted_job_ids), now)
+    bump_change_stamps(JobChangeStamp.GROUP, group_ids, now)
+    append_job_changes(job_ids, group_ids, deleted_job_ids)
+
+
+def get_group_scope(user, group_id=None):
+    """
+    Stamp scope of a group of the user, or of all of the user's groups.
+
+    Superusers have every non archived group.
+    """
+    if group_id:
+        return JobChangeStamp.GROUP, [group_id]
+    group_ids = get_user_group_ids(user)
+    if group_ids is None:
+        group_ids = Group.objects.exclude(is_archive=True).values("id")
+    return JobChangeStamp.GROUP, group_ids
+
+
+def get_etag(request, scope, object_ids):
+    """
+    Return the ETag of a response built from stamped objects.
+
+    object_ids is a list of ids or a queryset of them. The ETag also covers
+    the user, the full path, the language and the day, since those change
+    the response without changing any stamp. There is no Last-Modified, as
+    a date cannot cover them.
+    """
+    stamps = JobChangeStamp.objects.filter(scope=scope, object_id__in=object_ids)
+    if isinstance(object_ids, QuerySet):
+        object_ids = str(object_ids.query)
+    else:
+        object_ids = sorted({int(object_id) for object_id in object_ids})
+    stamp = stamps.aggregate(
+        version=Sum("version"), count=Count("id"), updated_at=Max("updated_at")
+    )
+    seed = "|".join(
+        str(part)
+        for part in (
+            request.user.id,
+            request.get_full_path(),
+            get_language(),
+            datetime.date.today(),
+            scope,
+            object_ids,
+            stamp["version"],
+            stamp["count"],
+            stamp["updated_at"],
+        )
+    )
+    return hashlib.md5(seed.encode()).hexdigest()
+
+
+def conditional_job_view(get_scope):
+    """
+    Answer GET and HEAD with 304 Not Modified while the stamps are unchanged.
+
+    get_scope(request, *args, **kwargs) returns the (scope, object_ids) the
+    response is built from. Use it with method_decorator on view methods;
+    the validators are computed once per request, before the view runs.
+    """
+
+    def etag(request, *args, **kwargs):
+        return get_etag(request, *get_scope(request, *args, **kwargs))
+
+    return condition(etag_func=etag)
+
+
+def group_scope_from_query(request, *args, **kwargs):
+    group_id = request.GET.get("id", "")
+    return get_group_scope(request.user, int(group_id) if group_id.isdigit() else None)
+
+
+def group_scope_from_name(request, *args, **kwargs):
+    group_ids = Group.objects.filter(name=request.GET.get("group")).values_list(
+        "id", flat=True
+    )
+    return JobChangeStamp.GROUP, list(group_ids)
+
+
+def transfer_job_scope_from_pk(request, *args, **kwargs):
+    pk = str(kwargs.get("pk", ""))
+    if not pk.isdigit():
+        return JobChangeStamp.JOB, []
+    job_ids = TransferJob.objects.filter(id=pk).values_list("job_id", flat=True)
+    return JobChangeStamp.JOB, list(job_ids)
+
+
+def job_list_scope(request, *args, **kwargs):
+    """
+    Stamps of the main group jobs listed by JobCreateView.list.
+
+    Superusers list the jobs they created, everyone else the jobs of the
+    non archived groups.
+    """
+    if request.user.is_superuser:
+        job_ids = TransferJob.objects.filter(
+            is_parent_group=True, job__created_by=request.user.id
+        ).values("job_id")
+        return JobChangeStamp.JOB, job_ids
+    return JobChangeStamp.GROUP, Group.objects.exclude(is_archive=True).values("id")
+
+
+def encode_sync_cursor(change_id, notification_id):
+    return f"{change_id}-{notification_id}"
+
+
+def decode_sync_cursor(cursor):
+    """Return the (change id, notification id) of a cursor, ValueError if invalid."""
+    change_id, notification_id = cursor.split("-")
+    return int(change_id), int(notification_id)
+
+
+def get_sync_heads(user):
+    """Cursor of the latest change and notification, where a client starts syncing."""
+    change = JobChange.objects.aggregate(last=Max("id"))["last"] or 0
+    notification = (
+        Notification.objects.filter(receiver_id=user.id).aggregate(last=Max("id"))[
+            "last"
+        ]
+        or 0
+    )
+    return encode_sync_cursor(change, notification)
+
+
+def get_job_changes(user, since, limit=SYNC_LIMIT):
+    """
+    Return what changed in the user's groups after the since cursor.
+
+    Several changes of a job are collapsed into its latest one per group, so
+    the cost follows the number of changed jobs, not the size of the lists.
+    Raises CursorExpired when the feed no longer reaches back to since.
+    """
+    change_id, notification_id = decode_sync_cursor(since)
+    first = JobChange.objects.aggregate(first=Min("id"))["first"]
+    if first is not None and change_id < first - 1:
+        raise CursorExpired
+
+    changes = JobChange.objects.filter(id__gt=change_id)
+    group_ids = get_user_group_ids(user)
+    if group_ids is not None:
+        changes = changes.filter(group_id__in=group_ids)
+    changes = list(
+        changes.order_by("id").values("id", "job_id", "group_id", "kind", "status")[
+            : limit + 1
+        ]
+    )
+    notifications = list(
+        Notification.objects.filter(receiver_id=user.id, id__gt=notification_id)
+        .exclude(job__isnull=True)
+        .order_by("id")[: limit + 1]
+    )
+    has_more = len(changes) > limit or len(notifications) > limit
+    changes, notifications = changes[:limit], notifications[:limit]
+
+    latest = {}
+    for change in changes:
+        latest[(change["job_id"], change["group_id"])] = change
+    if changes:
+        change_id = changes[-1]["id"]
+    if notifications:
+        notification_id = notifications[-1].id
+    return {
+        "cursor": encode_sync_cursor(change_id, notification_id),
+        "has_more": has_more,
+        "changes": list(latest.values()),
+        "notifications": notifications,
+    }
@@ -0,0 +1,151 @@
+import decimal
+
+from django.db import transaction
+
+from jobs.changes import record_job_changes
+from jobs.transitions import close_transfer_jobs
+from jobs.utils import push_notification
+from users.models.bill import Bill
+from users.models.job import CloseJobBill
+from users.models.job import JobStatus
+from users.models.job import TransferJob
+from users.models.notification import Notification
+
+
+MAX_BULK_CLOSE_JOBS = 500
+
+
+def parse_bill_quantities(rows):
+    """
+    Return {bill id: measurement} of [{"bill", "measurement"}] rows.
+
+    Rows measuring zero are dropped, as on the close form. Raises
+    ValueError on a missing bill or an invalid or negative measurement.
+    """
+    quantities = {}
+    for row in rows or []:
+        try:
+            bill_id = int(row["bill"])
+            measurement = decimal.Decimal(str(row["measurement"]))
+        except (KeyError, TypeError, ValueError, decimal.InvalidOperation):
+            raise ValueError("כמות סעיף לא חוקית")
+        if not measurement.is_finite() or measurement < 0:
+            raise ValueError("כמות סעיף לא חוקית")
+        if measurement:
+            quantities[bill_id] = measurement
+    return quantities
+
+
+def get_close_job_bills(user, transfer_jobs, shared_bills, job_bills):
+    """
+    CloseJobBill rows of each job, copied from the bill templates.
+
+    job_bills maps a transfer job id to its own quantities, which are added
+    to the shared ones and replace them for the same bill. A job is billed
+    once, on its first transfer job, even when several of its transfer jobs
+    are closed together; the quantities of the others are added to it.
+    """
+    bill_ids = set(shared_bills)
+    for quantities in job_bills.values():
+        bill_ids |= set(quantities)
+    bills = Bill.objects.in_bulk(bill_ids)
+    missing = bill_ids - set(bills)
+    if missing:
+        raise ValueError(f"סעיפים לא נמצאו: {', '.join(map(str, sorted(missing)))}")
+
+    billed = {}
+    for transfer_job in transfer_jobs:
+        quantities = billed.setdefault(
+            transfer_job.job_id, (transfer_job.id, dict(shared_bills))
+        )[1]
+        quantities.update(job_bills.get(transfer_job.id, {}))
+
+    close_job_bills = []
+    for transfer_job_id, quantities in billed.values():
+        for bill_id, measurement in quantities.items():
+            bill = bills[bill_id]
+            close_job_bills.append(
+                CloseJobBill(
+                    name=bill.name.strip(),
+                    type_counting=bill.type_counting,
+                    jumping_ration=bill.jumping_ration,
+                    type=bill.type,
+                    job_id=transfer_job_id,
+                    created_by=user,
+                    updated_by=user,
+                    image=getattr(bill, "image", None) or None,
+                    measurement=measurement,
+                    is_created=True,
+                )
+            )
+    return close_job_bills
+
+
+def close_jobs(user, transfer_jobs, close_job_bills, further_billing=False):
+    """
+    Close the jobs of the transfer jobs in one transaction.
+
+    As the close form does for one job: the main group row stays active
+    and every other row of the job is deactivated, all closed. Raises
+    InvalidTransition, closing nothing, when all of a job is closed already.
+    """
+    job_ids = {transfer_job.job_id for transfer_job in transfer_jobs}
+    with transaction.atomic():
+        close_transfer_jobs(user, job_ids, further_billing=further_billing)
+        CloseJobBill.objects.bulk_create(close_job_bills)
+        record_job_changes(job_ids)
+
+
+def notify_closed_jobs(user, transfer_jobs):
+    """
+    One notification per main group of the closed jobs, to the members a
+    single close notifies, instead of one per job.
+    """
+    user_name = user.user_name or user.email.partition("@")[0]
+    main_groups = {}
+    for transfer_job in TransferJob.objects.select_related("group").filter(
+        job_id__in={transfer_job.job_id for transfer_job in transfer_jobs},
+        is_parent_group=True,
+    ):
+        main_groups.setdefault(transfer_job.group, []).append(transfer_job)
+
+    notifications = []
+    pushes = []
+    for group, closed in main_groups.items():
+        receivers = list(
+            group.member.filter(role_id__in=[1, 2])
+            .exclude(id=user.id)
+            .values_list("id", flat=True)
+        )
+        if not receivers:
+            continue
+        if len(closed) == 1:
+            body = f"משימה זו נסגרה על ידי @{user_name}"
+        else:
+            body = f"{len(closed)} משימות נסגרו על ידי @{user_name}"
+        notification_data = {
+            "sender_id": user.id,
+            "title": group.name,
+            "body": body,
+            "created_by": user.id,
+            "job_id": closed[0].id,
+            "status": JobStatus.CLOSE.value,
+            "notification_type": "Close",
+        }
+        pushes.append((notification_data, receivers))
+        notifications += [
+            Notification(
+                sender_id=user.id,
+                receiver_id=receiver_id,
+                message=body,
+                updated_by_id=user.id,
+                created_by_id=user.id,
+                job_id=closed[0].id,
+                notification_type="Close",
+            )
+            for receiver_id in receivers
+        ]
+
+    Notification.objects.bulk_create(notifications)
+    for notification_data, receivers in pushes:
+        push_notification(notification_data=notification_data, user=receivers)
@@ -0,0 +1,305 @@
+import math
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case
+from django.db.models import F
+from django.db.models import FloatField
+from django.db.models import Q
+from django.db.models import Sum
+from django.db.models import Value
+from django.db.models import When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from jobs.models import ClusteredTransferJob
+from jobs.models import JobCluster
+from users.models.group import Group
+from users.models.job import JobStatus
+from users.models.job import TransferJob
+
+
+# Zoom of the tiles stored on JobLocation, about 40 m wide at the equator.
+BASE_ZOOM = 20
+# Map zooms above this one show the jobs themselves instead of clusters.
+MAX_CLUSTER_ZOOM = 15
+CLUSTER_ZOOMS = range(MAX_CLUSTER_ZOOM + 1)
+# Clusters use tiles this many zooms deeper than the map, 64px squares on screen.
+CLUSTER_GRID_OFFSET = 2
+CLUSTER_STATUSES = [JobStatus.OPEN.value, JobStatus.TRANSFER.value]
+MAX_LATITUDE = 85.05112878
+
+
+def get_tile(latitude, longitude, zoom=BASE_ZOOM):
+    """Return the (x, y) Web Mercator tile of a coordinate at zoom."""
+    scale = 1 << zoom
+    latitude = math.radians(max(-MAX_LATITUDE, min(MAX_LATITUDE, latitude)))
+    x = int((longitude + 180) / 360 * scale)
+    y = int((1 - math.asinh(math.tan(latitude)) / math.pi) / 2 * scale)
+    return min(max(x, 0), scale - 1), min(max(y, 0), scale - 1)
+
+
+def get_cell_size(zoom):
+    """Number of BASE_ZOOM tiles along one side of a cluster cell of zoom."""
+    return 1 << (BASE_ZOOM - zoom - CLUSTER_GRID_OFFSET)
+
+
+CLUSTERED_FIELDS = ["job_id", "group_id", "cell_x", "cell_y", "latitude", "longitude"]
+
+
+def cluster_jobs(**filters):
+    """Values of the clustered fields of the transfer jobs shown as clusters."""
+    return (
+        TransferJob.objects.filter(
+            is_active=True, status__in=CLUSTER_STATUSES, job__location__isnull=False
+        )
+        .filter(**filters)
+        .values(
+            "id",
+            "job_id",
+            "group_id",
+            cell_x=F("job__location__cell_x"),
+            cell_y=F("job__location__cell_y"),
+            latitude=F("job__location__latitude"),
+            longitude=F("job__location__longitude"),
+        )
+    )
+
+
+def get_cluster_keys(transfer):
+    """The (group, zoom, cell x, cell y) of every cluster containing a transfer job."""
+    return [
+        (
+            transfer["group_id"],
+            zoom,
+            transfer["cell_x"] // get_cell_size(zoom),
+            transfer["cell_y"] // get_cell_size(zoom),
+        )
+        for zoom in CLUSTER_ZOOMS
+    ]
+
+
+def apply_cluster_deltas(deltas):
+    """
+    Add each (count, latitude, longitude) delta to the cluster of its key.
+
+    Missing clusters are created empty first, then every cluster is updated
+    by one statement, after locking them in a fixed order so concurrent
+    writers of the same clusters cannot deadlock.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    JobCluster.objects.bulk_create(
+        [
+            JobCluster(group_id=group_id, zoom=zoom, cell_x=x, cell_y=y)
+            for (group_id, zoom, x, y), (count, _, _) in sorted(deltas.items())
+            if count > 0
+        ],
+        ignore_conflicts=True,
+    )
+
+    def when(key, value):
+        group_id, zoom, x, y = key
+        return When(group_id=group_id, zoom=zoom, cell_x=x, cell_y=y, then=Value(value))
+
+    clusters = JobCluster.objects.filter(
+        reduce(
+            or_,
+            [
+                Q(group_id=group_id, zoom=zoom, cell_x=x, cell_y=y)
+                for group_id, zoom, x, y in deltas
+            ],
+        )
+    )
+    ids = list(clusters.select_for_update().order_by("id").values_list("id", flat=True))
+    deltas = sorted(deltas.items())
+    JobCluster.objects.filter(id__in=ids).update(
+        count=Greatest(
+            F("count")
+            + Case(
+                *[when(key, count) for key, (count, _, _) in deltas],
+                default=Value(0),
+            ),
+            Value(0),
+        ),
+        latitude_sum=F("latitude_sum")
+        + Case(
+            *[when(key, latitude) for key, (_, latitude, _) in deltas],
+            default=Value(0.0),
+            output_field=FloatField(),
+        ),
+        longitude_sum=F("longitude_sum")
+        + Case(
+            *[when(key, longitude) for key, (_, _, longitude) in deltas],
+            default=Value(0.0),
+            output_field=FloatField(),
+        ),
+        updated_at=timezone.now(),
+    )
+
+
+@transaction.atomic
+def update_job_clusters(job_ids):
+    """
+    Move the jobs to the clusters they belong in now.
+
+    Only the transfer jobs whose group or location changed since they were
+    last clustered, or which started or stopped being shown, move, so a
+    write costs a constant handful of statements whatever the size of its
+    groups. Deleted jobs are taken out of their clusters.
+    """
+    job_ids = set(job_ids)
+    if not job_ids:
+        return
+    shown = {
+        transfer["id"]: transfer
+        for transfer in cluster_jobs(job_id__in=job_ids).select_for_update(of=("self",))
+    }
+    clustered = {
+        clustered["transfer_job_id"]: clustered
+        for clustered in ClusteredTransferJob.objects.select_for_update()
+        .filter(job_id__in=job_ids)
+        .values("transfer_job_id", *CLUSTERED_FIELDS)
+    }
+
+    def position(transfer):
+        if transfer is None:
+            return None
+        return tuple(transfer[field] for field in CLUSTERED_FIELDS[1:])
+
+    deltas = defaultdict(lambda: [0, 0.0, 0.0])
+    changed = []
+    for transfer_job_id in set(shown) | set(clustered):
+        before = clustered.get(transfer_job_id)
+        after = shown.get(transfer_job_id)
+        if position(before) == position(after):
+            continue
+        for transfer, sign in ((before, -1), (after, 1)):
+            if transfer is None:
+                continue
+            for key in get_cluster_keys(transfer):
+                deltas[key][0] += sign
+                deltas[key][1] += sign * transfer["latitude"]
+                deltas[key][2] += sign * transfer["longitude"]
+        if after:
+            changed.append(after)
+    apply_cluster_deltas(deltas)
+
+    removed = set(clustered) - set(shown)
+    if removed:
+        ClusteredTransferJob.objects.filter(transfer_job_id__in=removed).delete()
+    ClusteredTransferJob.objects.bulk_create(
+        [
+            ClusteredTransferJob(
+                transfer_job_id=transfer["id"],
+                **{field: transfer[field] for field in CLUSTERED_FIELDS},
+            )
+            for transfer in changed
+        ],
+        update_conflicts=True,
+        unique_fields=["transfer_job_id"],
+        update_fields=CLUSTERED_FIELDS,
+    )
+
+
+@transaction.atomic
+def rebuild_group_clusters(group_ids):
+    """
+    Recompute every cluster of the given groups from scratch.
+
+    Used to reconcile the clusters. The group rows are locked first so no
+    write of the groups is clustered twice meanwhile.
+    """
+    group_ids = list(
+        Group.objects.select_for_update()
+        .filter(id__in=set(group_ids))
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+    if not group_ids:
+        return
+    totals = defaultdict(lambda: [0, 0.0, 0.0])
+    shown = []
+    for transfer in cluster_jobs(group_id__in=group_ids).iterator(chunk_size=2000):
+        shown.append(
+            ClusteredTransferJob(
+                transfer_job_id=transfer["id"],
+                **{field: transfer[field] for field in CLUSTERED_FIELDS},
+            )
+        )
+        for key in get_cluster_keys(transfer):
+            totals[key][0] += 1
+            totals[key][1] += transfer["latitude"]
+            totals[key][2] += transfer["longitude"]
+
+    JobCluster.objects.filter(group_id__in=group_ids).delete()
+    JobCluster.objects.bulk_create(
+        [
+            JobCluster(
+                group_id=group_id,
+                zoom=zoom,
+                cell_x=x,
+                cell_y=y,
+                count=count,
+                latitude_sum=latitude_sum,
+                longitude_sum=longitude_sum,
+            )
+            for (group_id, zoom, x, y), (count, latitude_sum, longitude_sum) in (
+                totals.items()
+            )
+        ],
+        batch_size=1000,
+    )
+    ClusteredTransferJob.objects.filter(group_id__in=group_ids).delete()
+    ClusteredTransferJob.objects.bulk_create(
+        shown,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=["transfer_job_id"],
+        update_fields=CLUSTERED_FIELDS,
+    )
+
+
+def get_clusters(bbox, zoom, group_ids=None):
+    """
+    Return the clusters of a viewport at zoom, merged across groups.
+
+    group_ids=None means every non archived group.
+    """
+    south, west, north, east = bbox
+    cell_zoom = zoom + CLUSTER_GRID_OFFSET
+    west_x, north_y = get_tile(north, west, cell_zoom)
+    east_x, south_y = get_tile(south, east, cell_zoom)
+
+    clusters = JobCluster.objects.filter(
+        zoom=zoom, cell_y__range=(north_y, south_y), group__is_archive=False
+    )
+    if west <= east:
+        clusters = clusters.filter(cell_x__range=(west_x, east_x))
+    else:
+        clusters = clusters.filter(Q(cell_x__gte=west_x) | Q(cell_x__lte=east_x))
+    if group_ids is not None:
+        clusters = clusters.filter(group_id__in=group_ids)
+
+    rows = (
+        clusters.values("cell_x", "cell_y")
+        .annotate(
+            total=Sum("count"),
+            latitude_sum=Sum("latitude_sum"),
+            longitude_sum=Sum("longitude_sum"),
+        )
+        .filter(total__gt=0)
+        .order_by()
+    )
+    return [
+        {
+            "cell": f"{zoom}/{row['cell_x']}/{row['cell_y']}",
+            "count": row["total"],
+            "lat": row["latitude_sum"] / row["total"],
+            "lng": row["longitude_sum"] / row["total"],
+        }
+        for row in rows
+    ]
@@ -0,0 +1,181 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count
+from django.db.models import F
+from django.db.models import Value
+from django.db.models.functions import Greatest
+
+from jobs.models import CountedTransferJob
+from jobs.models import JobStatusCounter
+from users.models.group import Group
+from users.models.job import JobStatus
+from users.models.job import TransferJob
+
+
+COUNTED_FIELDS = ["job_id", "group_id", "status", "is_parent_group"]
+
+
+def get_job_group_ids(job_ids):
+    return set(
+        TransferJob.objects.filter(job_id__in=job_ids).values_list(
+            "group_id", flat=True
+        )
+    )
+
+
+def apply_counter_deltas(deltas):
+    """
+    Add each delta to the counter of its (group, status, parent flag) key.
+
+    Keys are updated in a fixed order so concurrent writers of the same
+    counters cannot deadlock.
+    """
+    for (group_id, status, is_parent_group), delta in sorted(deltas.items()):
+        if not delta:
+            continue
+        counters = JobStatusCounter.objects.filter(
+            group_id=group_id, status=status, is_parent_group=is_parent_group
+        )
+        values = {"count": Greatest(F("count") + delta, Value(0))}
+        if counters.update(**values) or delta < 0:
+            continue
+        JobStatusCounter.objects.bulk_create(
+            [
+                JobStatusCounter(
+                    group_id=group_id, status=status, is_parent_group=is_parent_group
+                )
+            ],
+            ignore_conflicts=True,
+        )
+        counters.update(**values)
+
+
+@transaction.atomic
+def update_job_counters(job_ids):
+    """
+    Move the counts of the jobs to the counters they belong in now.
+
+    Only the transfer jobs whose group, status or parent flag changed since
+    they were last counted move, by one, so a write costs a few single row
+    updates whatever the size of its groups. Deleted jobs are taken out of
+    their counters.
+    """
+    job_ids = set(job_ids)
+    if not job_ids:
+        return
+    active = {
+        transfer["id"]: transfer
+        for transfer in TransferJob.objects.select_for_update()
+        .filter(job_id__in=job_ids, is_active=True)
+        .values("id", *COUNTED_FIELDS)
+    }
+    counted = {
+        counted["transfer_job_id"]: counted
+        for counted in CountedTransferJob.objects.select_for_update()
+        .filter(job_id__in=job_ids)
+        .values("transfer_job_id", *COUNTED_FIELDS)
+    }
+
+    def key(transfer):
+        if transfer is None:
+            return None
+        return transfer["group_id"], transfer["status"], transfer["is_parent_group"]
+
+    deltas = Counter()
+    changed = []
+    for transfer_job_id in set(active) | set(counted):
+        before = key(counted.get(transfer_job_id))
+        after = key(active.get(transfer_job_id))
+        if before == after:
+            continue
+        if before:
+            deltas[before] -= 1
+        if after:
+            deltas[after] += 1
+            changed.append(active[transfer_job_id])
+    apply_counter_deltas(deltas)
+
+    CountedTransferJob.objects.filter(job_id__in=job_ids).exclude(
+        transfer_job_id__in=active
+    ).delete()
+    CountedTransferJob.objects.bulk_create(
+        [
+            CountedTransferJob(
+                transfer_job_id=transfer["id"],
+                **{field: transfer[field] for field in COUNTED_FIELDS},
+            )
+            for transfer in changed
+        ],
+        update_conflicts=True,
+        unique_fields=["transfer_job_id"],
+        update_fields=COUNTED_FIELDS,
+    )
+
+
+@transaction.atomic
+def refresh_group_counters(group_ids):
+    """
+    Recount the active transfer jobs of the given groups from scratch.
+
+    Used to reconcile the counters. The group rows are locked first so no
+    write of the groups is counted twice meanwhile.
+    """
+    group_ids = list(
+        Group.objects.select_for_update()
+        .filter(id__in=set(group_ids))
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+    if not group_ids:
+        return
+    active = TransferJob.objects.filter(group_id__in=group_ids, is_active=True)
+    totals = (
+        active.values("group_id", "status", "is_parent_group")
+        .annotate(total=Count("id"))
+        .order_by()
+    )
+    JobStatusCounter.objects.filter(group_id__in=group_ids).delete()
+    JobStatusCounter.objects.bulk_create(
+        [
+            JobStatusCounter(
+                group_id=total["group_id"],
+                status=total["status"],
+                is_parent_group=total["is_parent_group"],
+                count=total["total"],
+            )
+            for total in totals
+        ]
+    )
+    CountedTransferJob.objects.filter(group_id__in=group_ids).delete()
+    CountedTransferJob.objects.bulk_create(
+        [
+            CountedTransferJob(
+                transfer_job_id=transfer["id"],
+                **{field: transfer[field] for field in COUNTED_FIELDS},
+            )
+            for transfer in active.values("id", *COUNTED_FIELDS).iterator()
+        ],
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=["transfer_job_id"],
+        update_fields=COUNTED_FIELDS,
+    )
+
+
+def get_job_counts(**group_filter):
+    """Return the dashboard job counts of the groups matching group_filter."""
+    counts = {"Open": 0, "Partial": 0, "Return": 0, "Transfer": 0}
+    counters = JobStatusCounter.objects.filter(
+        **{f"group__{key}": value for key, value in group_filter.items()}
+    ).values_list("status", "is_parent_group", "count")
+    for status, is_parent_group, count in counters:
+        if status == JobStatus.OPEN.value:
+            counts["Open"] += count
+        elif status == JobStatus.PARTIAL.value:
+            counts["Partial"] += count
+        elif status == JobStatus.TRANSFER.value:
+            counts["Transfer"] += count
+        elif status == JobStatus.RETURN.value and is_parent_group:
+            counts["Return"] += count
+    return counts
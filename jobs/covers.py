@@ -0,0 +1,63 @@
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Min
+from django.db.models import Q
+
+from jobs.models import JobCoverImage
+from users.models.job import JobImage
+
+
+COVER_IMAGE_EXTENSIONS = ["jpg", "jpeg", "png"]
+
+
+def cover_image_filter():
+    return reduce(
+        or_, [Q(image__iendswith=f".{ext}") for ext in COVER_IMAGE_EXTENSIONS]
+    )
+
+
+@transaction.atomic
+def refresh_cover_images(job_ids):
+    """
+    Point the cover image of each job at its first jpg/jpeg/png image.
+
+    Covers are upserted, and only those of jobs left without such an image
+    are deleted, so concurrent refreshes of a job do not collide.
+    """
+    job_ids = set(job_ids)
+    if not job_ids:
+        return
+    first_images = (
+        JobImage.objects.filter(cover_image_filter(), job_id__in=job_ids)
+        .values("job_id")
+        .annotate(first_id=Min("id"))
+        .order_by()
+        .values_list("first_id", flat=True)
+    )
+    covers = list(
+        JobImage.objects.filter(id__in=list(first_images)).values_list(
+            "id", "job_id", "image"
+        )
+    )
+    JobCoverImage.objects.filter(job_id__in=job_ids).exclude(
+        job_id__in=[job_id for _, job_id, _ in covers]
+    ).delete()
+    JobCoverImage.objects.bulk_create(
+        [
+            JobCoverImage(job_id=job_id, job_image_id=image_id, image=image)
+            for image_id, job_id, image in covers
+        ],
+        update_conflicts=True,
+        unique_fields=["job"],
+        update_fields=["job_image", "image"],
+    )
+
+
+def delete_job_images(image_ids):
+    """Delete job images and move the cover of their jobs to the next image."""
+    images = JobImage.objects.filter(id__in=image_ids)
+    job_ids = set(images.values_list("job_id", flat=True))
+    images.delete()
+    refresh_cover_images(job_ids)
@@ -0,0 +1,79 @@
+from django.db import transaction
+from django.utils import timezone
+
+from jobs.changes import record_job_changes
+from jobs.covers import refresh_cover_images
+from jobs.locations import refresh_job_locations
+from users.models.job import Job
+from users.models.job import JobAttachment
+from users.models.job import JobImage
+from users.models.job import JobLog
+from users.models.job import JobNote
+from users.models.job import JobStatus
+from users.models.job import TransferJob
+
+
+@transaction.atomic
+def create_job(
+    user,
+    job_data,
+    group,
+    images=(),
+    attachments=(),
+    notes=(),
+    forms=(),
+    bills=(),
+):
+    """
+    Create an open job in its main group and return its transfer job.
+
+    The job, its main group transfer job, images, attachments, notes and
+    Create log are inserted in one transaction, one bulk insert per table.
+    job_data are the validated fields of the job, without its many to many
+    fields, which are given in forms and bills.
+    """
+    job = Job.objects.create(**{**job_data, "status": JobStatus.OPEN.value})
+    if forms:
+        job.form.add(*forms)
+    if bills:
+        job.bill.add(*bills)
+    transfer_job = TransferJob.objects.create(
+        job=job,
+        group=group,
+        created_by=user,
+        updated_by=user,
+        status=JobStatus.OPEN.value,
+        is_parent_group=True,
+        is_active=True,
+        further_inspection=job.further_inspection,
+        further_billing=job.further_billing,
+        is_lock_closed=job.is_lock_closed,
+    )
+    JobImage.objects.bulk_create(
+        [
+            JobImage(job=job, image=image, created_by=user, updated_by=user)
+            for image in images
+        ]
+    )
+    JobAttachment.objects.bulk_create(
+        [
+            JobAttachment(
+                job=job, attachment=attachment, created_by=user, updated_by=user
+            )
+            for attachment in attachments
+        ]
+    )
+    JobNote.objects.bulk_create(
+        [
+            JobNote(job=job, note=note, created_by=user, updated_by=user)
+            for note in notes
+        ]
+    )
+    JobLog.objects.create(
+        job=job, created_by=user, status="Create", created_at=timezone.now()
+    )
+    if images:
+        refresh_cover_images([job.id])
+    refresh_job_locations([job.id])
+    record_job_changes([job.id])
+    return transfer_job
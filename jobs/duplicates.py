@@ -0,0 +1,133 @@
+import re
+from difflib import SequenceMatcher
+
+from jobs.locations import get_nearby_jobs
+from jobs.locations import parse_coordinate
+from jobs.suggestions import get_user_group_ids
+from users.models.job import JobStatus
+from users.models.job import TransferJob
+
+
+DUPLICATE_RADIUS = 100
+DUPLICATE_LIMIT = 5
+DUPLICATE_MIN_SCORE = 0.5
+DUPLICATE_STATUSES = [
+    JobStatus.OPEN.value,
+    JobStatus.TRANSFER.value,
+    JobStatus.PARTIAL.value,
+]
+ADDRESS_WEIGHT = 0.6
+DISTANCE_WEIGHT = 0.4
+# Jobs sharing the street of an address that are scored, newest first.
+ADDRESS_CANDIDATE_LIMIT = 50
+# Words of an address that do not tell streets apart.
+ADDRESS_STOP_WORDS = {"רחוב", "רח", "שדרות", "שד", "דרך", "כיכר", "סמטת"}
+
+
+def get_address_words(address):
+    """Lower case words of an address, punctuation and stop words dropped."""
+    words = re.sub(r"[^\w\s]", " ", str(address or "").lower()).split()
+    return [word for word in words if word not in ADDRESS_STOP_WORDS]
+
+
+def normalize_address(address):
+    return " ".join(sorted(get_address_words(address)))
+
+
+def address_similarity(address, other_address):
+    address, other_address = normalize_address(address), normalize_address(other_address)
+    if not address or not other_address:
+        return 0
+    return SequenceMatcher(None, address, other_address).ratio()
+
+
+def get_address_candidates(address, group_ids=None):
+    """
+    Return the open transfer jobs whose address has the street of address.
+
+    The street is the longest word without digits, and the house number,
+    when there is one, must be in the address too. So "הרצל 12" finds
+    "רחוב הרצל 12" and "הרצל 12א".
+    """
+    words = get_address_words(address)
+    streets = [
+        word
+        for word in words
+        if len(word) > 1 and not any(char.isdigit() for char in word)
+    ]
+    if not streets:
+        return []
+    transfer_jobs = TransferJob.objects.filter(
+        is_active=True,
+        status__in=DUPLICATE_STATUSES,
+        group__is_archive=False,
+        job__address__icontains=max(streets, key=len),
+    )
+    numbers = [word for word in words if word.isdigit()]
+    if numbers:
+        transfer_jobs = transfer_jobs.filter(job__address__icontains=numbers[0])
+    if group_ids is not None:
+        transfer_jobs = transfer_jobs.filter(group_id__in=group_ids)
+    return transfer_jobs.order_by("-id").values(
+        "id", "job_id", "job__address", "status"
+    )[:ADDRESS_CANDIDATE_LIMIT]
+
+
+def find_duplicate_candidates(
+    user, address, latitude=None, longitude=None, exclude_job_id=None
+):
+    """
+    Return the open jobs most likely to be the same job, best match first.
+
+    Candidates are the jobs within DUPLICATE_RADIUS meters, read from the
+    location index, plus the jobs on the same street, read from the
+    database so jobs just created by other workers are found. Each one is
+    scored on address similarity and closeness, and only one transfer per
+    job is kept.
+    """
+    group_ids = get_user_group_ids(user)
+    latitude = parse_coordinate(latitude, 90)
+    longitude = parse_coordinate(longitude, 180)
+
+    candidates = {}
+    if latitude is not None and longitude is not None:
+        nearby = get_nearby_jobs(
+            user,
+            latitude,
+            longitude,
+            radius=DUPLICATE_RADIUS,
+            statuses=DUPLICATE_STATUSES,
+        )
+        for job in nearby:
+            closeness = 1 - job["distance"] / DUPLICATE_RADIUS
+            candidates[job["job"]] = {
+                "id": job["id"],
+                "job": job["job"],
+                "address": job["address"],
+                "status": job["status"],
+                "distance": job["distance"],
+                "score": ADDRESS_WEIGHT * address_similarity(address, job["address"])
+                + DISTANCE_WEIGHT * closeness,
+            }
+
+    for job in get_address_candidates(address, group_ids):
+        if job["job_id"] in candidates:
+            continue
+        candidates[job["job_id"]] = {
+            "id": job["id"],
+            "job": job["job_id"],
+            "address": job["job__address"],
+            "status": job["status"],
+            "distance": None,
+            "score": ADDRESS_WEIGHT
+            * address_similarity(address, job["job__address"]),
+        }
+
+    candidates.pop(exclude_job_id, None)
+    ranked = sorted(
+        (job for job in candidates.values() if job["score"] >= DUPLICATE_MIN_SCORE),
+        key=lambda job: (-job["score"], job["id"]),
+    )
+    for job in ranked:
+        job["score"] = round(job["score"], 3)
+    return ranked[:DUPLICATE_LIMIT]
@@ -0,0 +1,67 @@
+from jobs.changes import CursorExpired
+from jobs.changes import get_job_changes
+from jobs.changes import get_sync_heads
+from jobs.models import JobChange
+from users.models.job import TransferJob
+
+
+def get_job_events(changes):
+    """One event per changed transfer job, with what a row or marker shows."""
+    transfers = {
+        (transfer["job_id"], transfer["group_id"]): transfer
+        for transfer in TransferJob.objects.filter(
+            job_id__in={change["job_id"] for change in changes},
+            group_id__in={change["group_id"] for change in changes},
+        ).values("id", "job_id", "group_id", "status", "is_active", "job__address")
+    }
+    events = []
+    for change in changes:
+        transfer = transfers.get((change["job_id"], change["group_id"]), {})
+        events.append(
+            {
+                "id": transfer.get("id"),
+                "job": change["job_id"],
+                "group": change["group_id"],
+                "kind": change["kind"],
+                "status": transfer.get("status", change["status"]),
+                "is_active": transfer.get("is_active", False)
+                and change["kind"] != JobChange.DELETED,
+                "address": transfer.get("job__address"),
+            }
+        )
+    return events
+
+
+def get_job_event_batch(user, cursor=None):
+    """
+    The job change and notification events of a user after cursor.
+
+    Follows the same change feed as delta sync. Without a cursor, or with
+    one the feed no longer reaches, only the current cursor is returned and
+    the page starts following from there.
+    """
+    if cursor:
+        try:
+            changes = get_job_changes(user, cursor)
+        except (CursorExpired, ValueError):
+            cursor = None
+    if not cursor:
+        return {"cursor": get_sync_heads(user), "has_more": False, "events": []}
+
+    events = [
+        {"event": "job", "data": event}
+        for event in get_job_events(changes["changes"])
+    ]
+    events += [
+        {
+            "event": "notification",
+            "data": {
+                "id": notification.id,
+                "message": notification.message,
+                "type": notification.notification_type,
+                "job": notification.job_id,
+            },
+        }
+        for notification in changes["notifications"]
+    ]
+    return {"cursor": changes["cursor"], "has_more": changes["has_more"], "events": events}
@@ -0,0 +1,152 @@
+import datetime
+import hashlib
+import json
+from functools import wraps
+
+from django.db import IntegrityError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status as return_status
+from rest_framework.response import Response
+
+from jobs.models import IdempotencyKey
+
+
+IDEMPOTENCY_HEADER = "HTTP_IDEMPOTENCY_KEY"
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+# Keys are forgotten after this long, a retry later runs the request again.
+IDEMPOTENCY_KEY_TTL = datetime.timedelta(hours=24)
+# A first request still running after this long is assumed dead, and a
+# retry takes its key over.
+IDEMPOTENCY_LOCK_TIMEOUT = datetime.timedelta(minutes=5)
+
+
+def get_request_fingerprint(request):
+    """Hash of the method, path and body of a request, files by name and size."""
+    data = {}
+    if hasattr(request.data, "lists"):
+        for name, values in request.data.lists():
+            data[name] = [
+                [value.name, value.size] if hasattr(value, "size") else value
+                for value in values
+            ]
+    else:
+        data = request.data
+    seed = json.dumps(
+        [request.method, request.path, data], sort_keys=True, default=str
+    )
+    return hashlib.sha256(seed.encode()).hexdigest()
+
+
+def claim_idempotency_key(user, scope, key, fingerprint):
+    """
+    Return (record, claimed) for a key of the user.
+
+    claimed is True when the caller is the first to use the key, and must
+    then run the request and store its response in record.
+    """
+    now = timezone.now()
+    record = IdempotencyKey.objects.filter(user=user, scope=scope, key=key).first()
+    if record and (
+        record.created_at < now - IDEMPOTENCY_KEY_TTL
+        or record.status_code is None
+        and record.created_at < now - IDEMPOTENCY_LOCK_TIMEOUT
+    ):
+        record.delete()
+        record = None
+    if record:
+        return record, False
+
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                user=user, scope=scope, key=key, fingerprint=fingerprint
+            )
+    except IntegrityError:
+        return (
+            IdempotencyKey.objects.filter(user=user, scope=scope, key=key).first(),
+            False,
+        )
+    return record, True
+
+
+def mark_committed(request):
+    """
+    Record that the request committed part of its work.
+
+    Its idempotency key is then kept even if the request fails afterwards,
+    so a retry is answered with the failure instead of committing it again.
+    """
+    request.idempotency_committed = True
+
+
+def idempotent(scope):
+    """
+    Run a DRF view method once per Idempotency-Key header of the user.
+
+    Retries with the same key get the stored response back, marked with an
+    Idempotent-Replayed header, without running the view again. Server
+    errors are not stored, so they can be retried, unless the view marked
+    the request with mark_committed. Requests without the header run as
+    usual. Use it with method_decorator on view methods.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            key = request.META.get(IDEMPOTENCY_HEADER, "").strip()
+            # Views calling other idempotent views run them as one request.
+            if not key or getattr(request, "idempotency_key", None):
+                return view_func(request, *args, **kwargs)
+            if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+                return Response(
+                    {"detail": "מפתח הבקשה ארוך מדי"},
+                    status=return_status.HTTP_400_BAD_REQUEST,
+                )
+
+            fingerprint = get_request_fingerprint(request)
+            record, claimed = claim_idempotency_key(
+                request.user, scope, key, fingerprint
+            )
+            if record is None or not claimed and record.status_code is None:
+                return Response(
+                    {"detail": "בקשה עם מפתח זה עדיין בטיפול"},
+                    status=return_status.HTTP_409_CONFLICT,
+                )
+            if record.fingerprint != fingerprint:
+                return Response(
+                    {"detail": "מפתח זה כבר שימש לבקשה אחרת"},
+                    status=return_status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            if not claimed:
+                response = Response(record.response, status=record.status_code)
+                response["Idempotent-Replayed"] = "true"
+                return response
+
+            request.idempotency_key = key
+            try:
+                response = view_func(request, *args, **kwargs)
+            except Exception:
+                if getattr(request, "idempotency_committed", False):
+                    record.status_code = return_status.HTTP_500_INTERNAL_SERVER_ERROR
+                    # {"detail": "The request was partly applied, do not retry it"}
+                    record.response = {
+                        "detail": "הבקשה בוצעה חלקית, אין לשלוח אותה שוב"
+                    }
+                    record.save(update_fields=["status_code", "response"])
+                else:
+                    record.delete()
+                raise
+            if response.status_code >= 500 and not getattr(
+                request, "idempotency_committed", False
+            ):
+                record.delete()
+            else:
+                record.status_code = response.status_code
+                record.response = getattr(response, "data", None)
+                record.save(update_fields=["status_code", "response"])
+            return response
+
+        return wrapper
+
+    return decorator
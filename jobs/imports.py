@@ -0,0 +1,254 @@
+import csv
+import io
+import zipfile
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from jobs.changes import record_job_changes
+from jobs.locations import parse_coordinate
+from jobs.locations import refresh_job_locations
+from jobs.suggestions import get_user_group_ids
+from users.models.group import Group
+from users.models.job import Job
+from users.models.job import JobLog
+from users.models.job import JobStatus
+from users.models.job import TransferJob
+
+try:
+    import openpyxl
+    from openpyxl.utils.exceptions import InvalidFileException
+except ImportError:
+    openpyxl = None
+
+
+IMPORT_CHUNK_SIZE = 500
+# Only the first errors are listed, the count covers all of them.
+MAX_IMPORT_ERRORS = 1000
+IMPORT_TEXT_FIELDS = ["job_id", "address", "address_information", "description"]
+IMPORT_BOOLEAN_FIELDS = [
+    "priority",
+    "further_inspection",
+    "further_billing",
+    "is_lock_closed",
+]
+TRUE_VALUES = {"1", "true", "yes", "on", "כן"}
+FALSE_VALUES = {"", "0", "false", "no", "off", "לא"}
+
+
+class ImportFileError(Exception):
+    pass
+
+
+FILE_ERRORS = (UnicodeDecodeError, csv.Error, zipfile.BadZipFile, KeyError, OSError)
+if openpyxl is not None:
+    FILE_ERRORS += (InvalidFileException,)
+
+
+def cell_text(value):
+    """Text of a CSV or spreadsheet cell, whole numbers without a decimal point."""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def iter_rows(file):
+    """Yield the rows of a CSV or XLSX file as lists of cells."""
+    name = (file.name or "").lower()
+    if name.endswith(".xlsx"):
+        if openpyxl is None:
+            raise ImportFileError("ייבוא קבצי XLSX אינו זמין")
+        workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        try:
+            yield from workbook.active.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+    elif name.endswith(".csv"):
+        text = io.TextIOWrapper(
+            getattr(file, "file", file), encoding="utf-8-sig", newline=""
+        )
+        try:
+            yield from csv.reader(text)
+        finally:
+            # Leave the uploaded file open, so it can be read again.
+            text.detach()
+    else:
+        raise ImportFileError("יש להעלות קובץ CSV או XLSX")
+
+
+def read_rows(file):
+    """
+    Yield (row number, {column: text}) of a CSV or XLSX file, one at a time.
+
+    The first row holds the column names, matched case-insensitively.
+    Empty rows are skipped. Raises ImportFileError when the file cannot be
+    read, wherever the broken part is.
+    """
+    rows = iter_rows(file)
+    try:
+        header = [cell_text(column).lower() for column in next(rows, None) or []]
+        if "address" not in header:
+            raise ImportFileError("חסרה עמודת address")
+        for number, row in enumerate(rows, start=2):
+            values = [cell_text(value) for value in row]
+            if any(values):
+                yield number, dict(zip(header, values))
+    except FILE_ERRORS:
+        raise ImportFileError("לא ניתן לקרוא את הקובץ")
+
+
+def parse_boolean(value):
+    value = value.lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError
+
+
+def validate_row(row, default_group_id, group_ids):
+    """Return (job fields, group id, errors) of an imported row."""
+    errors = {}
+    fields = {}
+    for name in IMPORT_TEXT_FIELDS:
+        value = row.get(name, "")
+        max_length = Job._meta.get_field(name).max_length
+        if max_length and len(value) > max_length:
+            errors[name] = f"עד {max_length} תווים"
+        fields[name] = value
+    fields["job_id"] = fields["job_id"] or None
+    if not fields["address"]:
+        errors["address"] = "שדה חובה"
+
+    latitude, longitude = row.get("latitude", ""), row.get("longitude", "")
+    if latitude or longitude:
+        fields["latitude"] = parse_coordinate(latitude, 90)
+        fields["longitude"] = parse_coordinate(longitude, 180)
+        if fields["latitude"] is None or fields["longitude"] is None:
+            errors["location"] = "קואורדינטות לא חוקיות"
+
+    for name in IMPORT_BOOLEAN_FIELDS:
+        try:
+            fields[name] = parse_boolean(row.get(name, ""))
+        except ValueError:
+            errors[name] = "ערך לא חוקי"
+
+    group_id = row.get("group") or default_group_id
+    if not str(group_id or "").isdigit() or int(group_id) not in group_ids:
+        errors["group"] = "קבוצה לא נמצאה"
+        group_id = None
+    return fields, group_id and int(group_id), errors
+
+
+def import_chunk(user, rows, now):
+    """Create the jobs of valid rows with one bulk insert per table."""
+    with transaction.atomic():
+        jobs = Job.objects.bulk_create(
+            [
+                Job(
+                    **fields,
+                    status=JobStatus.OPEN.value,
+                    created_by=user,
+                    updated_by=user,
+                )
+                for fields, group_id in rows
+            ]
+        )
+        TransferJob.objects.bulk_create(
+            [
+                TransferJob(
+                    job_id=job.id,
+                    group_id=group_id,
+                    status=JobStatus.OPEN.value,
+                    is_active=True,
+                    is_parent_group=True,
+                    created_by=user,
+                    updated_by=user,
+                    further_inspection=job.further_inspection,
+                    further_billing=job.further_billing,
+                    is_lock_closed=job.is_lock_closed,
+                )
+                for job, (fields, group_id) in zip(jobs, rows)
+            ]
+        )
+        JobLog.objects.bulk_create(
+            [
+                JobLog(job_id=job.id, created_by=user, status="Create", created_at=now)
+                for job in jobs
+            ]
+        )
+        job_ids = [job.id for job in jobs]
+        refresh_job_locations(job_ids)
+        record_job_changes(job_ids)
+    return len(jobs)
+
+
+def import_jobs(user, file, group_id=None, dry_run=False, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Create open jobs from the rows of a CSV or XLSX file.
+
+    The file is read row by row and validated in chunks: job ids are
+    checked against the file and the database with one query per chunk,
+    and the valid rows of a chunk are created in one transaction. Rows
+    with errors are skipped and reported by row number, the header being
+    row 1. A dry run only validates. Priority jobs are created without the
+    notification a single create sends. Raises ImportFileError when the file
+    cannot be read; the file is read through once first, so that happens
+    before any job is created.
+    """
+    group_ids = Group.objects.exclude(is_archive=True)
+    allowed_group_ids = get_user_group_ids(user)
+    if allowed_group_ids is not None:
+        group_ids = group_ids.filter(id__in=allowed_group_ids)
+    group_ids = set(group_ids.values_list("id", flat=True))
+
+    if not dry_run:
+        for _ in read_rows(file):
+            pass
+        file.seek(0)
+
+    now = timezone.now()
+    rows = read_rows(file)
+    seen_job_ids = set()
+    report = {"dry_run": dry_run, "total": 0, "valid": 0, "created": 0, "errors": []}
+    error_count = 0
+
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        validated = [
+            (number, *validate_row(row, group_id, group_ids)) for number, row in chunk
+        ]
+        job_ids = {fields["job_id"] for _, fields, _, _ in validated if fields["job_id"]}
+        existing_job_ids = {
+            str(job_id)
+            for job_id in Job.objects.filter(job_id__in=job_ids).values_list(
+                "job_id", flat=True
+            )
+        }
+
+        valid_rows = []
+        for number, fields, row_group_id, errors in validated:
+            job_id = fields["job_id"]
+            if job_id and (job_id in existing_job_ids or job_id in seen_job_ids):
+                errors["job_id"] = "כבר קיימת משימה עם מזהה זה"
+            if job_id:
+                seen_job_ids.add(job_id)
+            if errors:
+                error_count += 1
+                if len(report["errors"]) < MAX_IMPORT_ERRORS:
+                    report["errors"].append({"row": number, "errors": errors})
+            else:
+                valid_rows.append((fields, row_group_id))
+
+        report["total"] += len(chunk)
+        report["valid"] += len(valid_rows)
+        if valid_rows and not dry_run:
+            report["created"] += import_chunk(user, valid_rows, now)
+
+    report["error_count"] = error_count
+    return report
@@ -0,0 +1,293 @@
+import math
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from jobs.clusters import MAX_CLUSTER_ZOOM
+from jobs.clusters import get_clusters
+from jobs.clusters import get_tile
+from jobs.models import JobLocation
+from jobs.suggestions import get_user_group_ids
+from users.models.job import Job
+from users.models.job import JobStatus
+from users.models.job import TransferJob
+
+
+MAP_MARKER_LIMIT = 2000
+MAP_STATUSES = [JobStatus.OPEN.value, JobStatus.TRANSFER.value]
+MARKER_FIELDS = [
+    "id",
+    "job_id",
+    "status",
+    "job__address",
+    "job__priority",
+    "job__location__latitude",
+    "job__location__longitude",
+    "job__cover_image__image",
+]
+EARTH_RADIUS = 6371008.8
+NEARBY_RADIUS = 200
+MAX_NEARBY_RADIUS = 5000
+NEARBY_LIMIT = 50
+
+
+def parse_coordinate(value, limit):
+    """Return value as a float within [-limit, limit], None when it is not one."""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    if math.isnan(value) or abs(value) > limit:
+        return None
+    return value
+
+
+@transaction.atomic
+def refresh_job_locations(job_ids):
+    """
+    Copy the coordinates of the jobs into the indexed location table.
+
+    Jobs without a valid latitude/longitude pair are dropped from the table,
+    so they never show up on the map.
+    """
+    job_ids = set(job_ids)
+    if not job_ids:
+        return
+    locations = []
+    for job_id, latitude, longitude in Job.objects.filter(id__in=job_ids).values_list(
+        "id", "latitude", "longitude"
+    ):
+        latitude = parse_coordinate(latitude, 90)
+        longitude = parse_coordinate(longitude, 180)
+        if latitude is not None and longitude is not None:
+            cell_x, cell_y = get_tile(latitude, longitude)
+            locations.append(
+                JobLocation(
+                    job_id=job_id,
+                    latitude=latitude,
+                    longitude=longitude,
+                    cell_x=cell_x,
+                    cell_y=cell_y,
+                )
+            )
+    JobLocation.objects.filter(job_id__in=job_ids).exclude(
+        job_id__in=[location.job_id for location in locations]
+    ).delete()
+    JobLocation.objects.bulk_create(
+        locations,
+        update_conflicts=True,
+        unique_fields=["job"],
+        update_fields=["latitude", "longitude", "cell_x", "cell_y"],
+    )
+
+
+def haversine(latitude, longitude, other_latitude, other_longitude):
+    """Great circle distance in meters between two coordinates."""
+    latitude, other_latitude = math.radians(latitude), math.radians(other_latitude)
+    half_chord = (
+        math.sin((other_latitude - latitude) / 2) ** 2
+        + math.cos(latitude)
+        * math.cos(other_latitude)
+        * math.sin(math.radians(other_longitude - longitude) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * math.asin(min(1, math.sqrt(half_chord)))
+
+
+def get_radius_bbox(latitude, longitude, radius):
+    """Return the (south, west, north, east) box enclosing a circle in meters."""
+    latitude_delta = math.degrees(radius / EARTH_RADIUS)
+    south = max(-90, latitude - latitude_delta)
+    north = min(90, latitude + latitude_delta)
+    if south == -90 or north == 90:
+        return south, -180, north, 180
+    longitude_delta = math.degrees(
+        radius / (EARTH_RADIUS * math.cos(math.radians(latitude)))
+    )
+    if longitude_delta >= 180:
+        return south, -180, north, 180
+    west = (longitude - longitude_delta + 540) % 360 - 180
+    east = (longitude + longitude_delta + 540) % 360 - 180
+    return south, west, north, east
+
+
+def parse_bbox(south, west, north, east):
+    """
+    Return the (south, west, north, east) floats of a viewport.
+
+    Raises ValueError when a side is missing or out of range. A west side
+    greater than the east one means the viewport crosses the antimeridian.
+    """
+    bbox = (
+        parse_coordinate(south, 90),
+        parse_coordinate(west, 180),
+        parse_coordinate(north, 90),
+        parse_coordinate(east, 180),
+    )
+    if None in bbox or bbox[0] > bbox[2]:
+        raise ValueError("Invalid bounding box")
+    return bbox
+
+
+def bbox_filter(south, west, north, east):
+    """
+    Transfer jobs located inside a viewport.
+
+    The BASE_ZOOM tile range of the viewport is matched on the cell index
+    first, the coordinates then drop the jobs of its border tiles that fall
+    outside.
+    """
+    west_x, north_y = get_tile(north, west)
+    east_x, south_y = get_tile(south, east)
+    condition = {
+        "job__location__cell_y__range": (north_y, south_y),
+        "job__location__latitude__range": (south, north),
+    }
+    if west <= east:
+        return TransferJob.objects.filter(
+            job__location__cell_x__range=(west_x, east_x),
+            job__location__longitude__range=(west, east),
+            **condition,
+        )
+    return TransferJob.objects.filter(
+        job__location__cell_x__gte=west_x,
+        job__location__longitude__gte=west,
+        **condition,
+    ) | TransferJob.objects.filter(
+        job__location__cell_x__lte=east_x,
+        job__location__longitude__lte=east,
+        **condition,
+    )
+
+
+def get_map_jobs(user, bbox, group_id=None, statuses=MAP_STATUSES):
+    """Active jobs of the user's groups inside the viewport."""
+    jobs = bbox_filter(*bbox).filter(
+        is_active=True, status__in=statuses, group__is_archive=False
+    )
+    if isinstance(group_id, (list, set, tuple)):
+        jobs = jobs.filter(group_id__in=group_id)
+    elif group_id:
+        jobs = jobs.filter(group_id=group_id)
+    if not user.is_superuser:
+        jobs = jobs.filter(group__member=user.id)
+    return jobs
+
+
+def get_map_markers(user, bbox, group_id=None, limit=MAP_MARKER_LIMIT):
+    """
+    Return the compact markers of a viewport and whether they were truncated.
+
+    Each marker only carries what a pin and its info window need; the full
+    job is fetched when the user opens it.
+    """
+    rows = list(
+        get_map_jobs(user, bbox, group_id)
+        .order_by("-job__priority", "-created_at")
+        .values_list(*MARKER_FIELDS)[: limit + 1]
+    )
+    return [get_marker(row) for row in rows[:limit]], len(rows) > limit
+
+
+def get_marker(row):
+    pk, job_id, status, address, priority, latitude, longitude, image = row
+    return {
+        "id": pk,
+        "job": job_id,
+        "status": status,
+        "address": address,
+        "priority": priority,
+        "lat": latitude,
+        "lng": longitude,
+        "thumbnail": default_storage.url(image) if image else None,
+    }
+
+
+def get_nearby_jobs(
+    user,
+    latitude,
+    longitude,
+    radius=NEARBY_RADIUS,
+    statuses=MAP_STATUSES,
+    group_ids=None,
+    limit=NEARBY_LIMIT,
+):
+    """
+    Return the markers of the jobs within radius meters, closest first.
+
+    The enclosing box is a range scan of the location index; only the few
+    jobs in the corners of the box are dropped by the exact distance.
+    """
+    rows = get_map_jobs(
+        user,
+        get_radius_bbox(latitude, longitude, radius),
+        group_id=group_ids,
+        statuses=statuses,
+    ).values_list(*MARKER_FIELDS)
+    nearby = []
+    for row in rows:
+        marker = get_marker(row)
+        marker["distance"] = round(
+            haversine(latitude, longitude, marker["lat"], marker["lng"]), 1
+        )
+        if marker["distance"] <= radius:
+            nearby.append(marker)
+    nearby.sort(key=lambda marker: (marker["distance"], marker["id"]))
+    return nearby[:limit]
+
+
+def get_map_data(user, bbox, zoom=None, group_id=None, limit=MAP_MARKER_LIMIT):
+    """
+    Return the clusters of a viewport up to MAX_CLUSTER_ZOOM, its markers past it.
+
+    Without a zoom the markers are returned.
+    """
+    if zoom is not None and zoom <= MAX_CLUSTER_ZOOM:
+        group_ids = get_user_group_ids(user)
+        if group_id:
+            group_ids = {group_id} if group_ids is None else group_ids & {group_id}
+        clusters = get_clusters(bbox, zoom, group_ids)
+        return {"zoom": zoom, "clusters": clusters, "results": [], "truncated": False}
+    markers, truncated = get_map_markers(user, bbox, group_id=group_id, limit=limit)
+    return {"zoom": zoom, "clusters": [], "results": markers, "truncated": truncated}
+
+
+def parse_zoom(zoom):
+    """Return zoom as an int between 0 and 22, None when it is missing."""
+    if zoom in (None, ""):
+        return None
+    zoom = int(zoom)
+    if not 0 <= zoom <= 22:
+        raise ValueError("Invalid zoom")
+    return zoom
+
+
+def parse_nearby_params(params):
+    """
+    Return the get_nearby_jobs keyword arguments from query parameters.
+
+    Raises ValueError on a missing or invalid coordinate, radius, status or
+    group.
+    """
+    latitude = parse_coordinate(params.get("lat"), 90)
+    longitude = parse_coordinate(params.get("lng"), 180)
+    if latitude is None or longitude is None:
+        raise ValueError("Invalid coordinate")
+    radius = float(params.get("radius") or NEARBY_RADIUS)
+    if not 0 < radius <= MAX_NEARBY_RADIUS:
+        raise ValueError("Invalid radius")
+    nearby = {
+        "latitude": latitude,
+        "longitude": longitude,
+        "radius": radius,
+        "limit": max(
+            1, min(int(params.get("limit") or NEARBY_LIMIT), MAP_MARKER_LIMIT)
+        ),
+    }
+    if params.get("status"):
+        statuses = params.get("status").split(",")
+        if not set(statuses) <= set(JobStatus.values):
+            raise ValueError("Invalid status")
+        nearby["statuses"] = statuses
+    if params.get("groups"):
+        nearby["group_ids"] = [int(group) for group in params.get("groups").split(",")]
+    return nearby
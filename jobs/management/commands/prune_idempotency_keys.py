@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from jobs.idempotency import IDEMPOTENCY_KEY_TTL
+from jobs.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Delete the stored responses of idempotency keys that have expired"
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - IDEMPOTENCY_KEY_TTL
+        deleted, _ = IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()
+
+        self.stdout.write(self.style.SUCCESS(f"{deleted} idempotency keys pruned"))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from jobs.clusters import rebuild_group_clusters
+from users.models.group import Group
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per group map clusters of the open and transferred jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--group",
+            type=int,
+            action="append",
+            help="Only rebuild this group id (can be repeated)",
+        )
+
+    def handle(self, *args, **options):
+        group_ids = options["group"] or list(
+            Group.objects.values_list("id", flat=True)
+        )
+        for group_id in group_ids:
+            rebuild_group_clusters([group_id])
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Job clusters rebuilt for {len(group_ids)} groups")
+        )
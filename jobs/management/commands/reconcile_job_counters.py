@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from jobs.counters import refresh_group_counters
+from users.models.group import Group
+
+
+class Command(BaseCommand):
+    help = "Recount the per group job status counters used by the dashboard"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--group",
+            type=int,
+            action="append",
+            help="Only reconcile this group id (can be repeated)",
+        )
+
+    def handle(self, *args, **options):
+        group_ids = options["group"] or list(
+            Group.objects.values_list("id", flat=True)
+        )
+        for group_id in group_ids:
+            refresh_group_counters([group_id])
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Job counters reconciled for {len(group_ids)} groups")
+        )
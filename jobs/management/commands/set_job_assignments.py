@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from jobs.assignments import refresh_job_assignments
+from users.models import Job
+
+
+class Command(BaseCommand):
+    help = "Set the active and main group transfer jobs of every job"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        job_ids = list(Job.objects.order_by("id").values_list("id", flat=True))
+
+        for start in range(0, len(job_ids), chunk_size):
+            refresh_job_assignments(job_ids[start : start + chunk_size])
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Assignments set for {len(job_ids)} jobs")
+        )
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from jobs.clusters import update_job_clusters
+from jobs.locations import refresh_job_locations
+from users.models import Job
+
+
+class Command(BaseCommand):
+    help = "Copy the coordinates of every job into the indexed location table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        job_ids = list(Job.objects.order_by("id").values_list("id", flat=True))
+
+        for start in range(0, len(job_ids), chunk_size):
+            chunk = job_ids[start : start + chunk_size]
+            refresh_job_locations(chunk)
+            update_job_clusters(chunk)
+
+        self.stdout.write(self.style.SUCCESS(f"Locations set for {len(job_ids)} jobs"))
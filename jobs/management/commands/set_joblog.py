@@ -1,25 +1,58 @@
-from django.core.management.base import BaseCommand
-from users.models import Job, JobLog
+from jobs.backfills import Backfill
+from jobs.backfills import BackfillCommand
+from users.models import Job
+from users.models import JobLog
 
-class Command(BaseCommand):
-    help = 'Create JobLog entries for jobs with specified conditions'
 
-    def handle(self, *args, **options):
-        # Fetch all jobs
-        all_jobs = Job.objects.all()
+class JobLogBackfill(Backfill):
+    """Create, Update and Close logs of jobs, from their own dates and users."""
 
-        for job in all_jobs:
-            # Check if the job has both created_at and created_by fields
-            if job.created_at and job.created_by:
-                JobLog.objects.create(job=job, created_by=job.created_by, created_at=job.created_at, status='Create')
-            
-            # Check if the job has both updated_at and updated_by fields
-            if job.updated_at and job.updated_by:
-                # if job.status == 
-                JobLog.objects.create(job=job, updated_by=job.updated_by, created_at=job.updated_at, status='Update')
-            
-            # Check if the job has both closed_at and closed_by fields
-            if job.closed_at and job.closed_by:
-                JobLog.objects.create(job=job, closed_by=job.closed_by, created_at=job.closed_at, status='Close')
+    name = "set_joblog"
 
-        self.stdout.write(self.style.SUCCESS('Job logs creation completed successfully'))
+    def get_queryset(self):
+        return Job.objects.only(
+            "id",
+            "created_at",
+            "created_by",
+            "updated_at",
+            "updated_by",
+            "closed_at",
+            "closed_by",
+        )
+
+    def build(self, jobs):
+        logs = []
+        for job in jobs:
+            if job.created_at and job.created_by_id:
+                logs.append(
+                    JobLog(
+                        job_id=job.id,
+                        created_by_id=job.created_by_id,
+                        created_at=job.created_at,
+                        status="Create",
+                    )
+                )
+            if job.updated_at and job.updated_by_id:
+                logs.append(
+                    JobLog(
+                        job_id=job.id,
+                        updated_by_id=job.updated_by_id,
+                        created_at=job.updated_at,
+                        status="Update",
+                    )
+                )
+            if job.closed_at and job.closed_by_id:
+                logs.append(
+                    JobLog(
+                        job_id=job.id,
+                        closed_by_id=job.closed_by_id,
+                        created_at=job.closed_at,
+                        status="Close",
+                    )
+                )
+        return logs
+
+
+class Command(BackfillCommand):
+    help = "Create JobLog entries for jobs with specified conditions"
+    backfill_class = JobLogBackfill
@@ -1,20 +1,33 @@
-from django.core.management.base import BaseCommand
-
+from jobs.backfills import Backfill
+from jobs.backfills import BackfillCommand
 from users.models import Job
 from users.models import JobNote
 from users.models import JobStatus
 
 
-class Command(BaseCommand):
-    help = 'Migrate job notes from Job model to JobNote model for closed jobs with notes'
+class JobNoteBackfill(Backfill):
+    """JobNote rows of the notes field of closed jobs."""
+
+    name = "set_jobnote"
+
+    def get_queryset(self):
+        return Job.objects.filter(
+            status=JobStatus.CLOSE.value, notes__isnull=False
+        ).only("id", "notes", "closed_by")
 
-    def handle(self, *args, **options):
-        # Fetch all closed jobs with notes
-        closed_jobs_with_notes = Job.objects.filter(status=JobStatus.CLOSE.value, notes__isnull=False)
+    def build(self, jobs):
+        return [
+            JobNote(
+                job_id=job.id,
+                note=job.notes,
+                created_by_id=job.closed_by_id,
+                updated_by_id=job.closed_by_id,
+            )
+            for job in jobs
+            if job.notes
+        ]
 
-        for job in closed_jobs_with_notes:
-            # Create JobNote entry for each note in the notes field of the Job model
-            if job.notes:
-                JobNote.objects.create(job=job, note=job.notes, created_by=job.closed_by, updated_by=job.closed_by)
 
-        self.stdout.write(self.style.SUCCESS('Job notes migration completed successfully'))
+class Command(BackfillCommand):
+    help = "Migrate job notes from Job model to JobNote model for closed jobs with notes"
+    backfill_class = JobNoteBackfill
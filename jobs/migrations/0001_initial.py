@@ -0,0 +1,48 @@
+import django.db.models.deletion
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("users", "__first__"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="JobStatusCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("status", models.CharField(max_length=50)),
+                ("is_parent_group", models.BooleanField(default=False)),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "group",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="job_status_counters",
+                        to="users.group",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="jobstatuscounter",
+            constraint=models.UniqueConstraint(
+                fields=("group", "status", "is_parent_group"),
+                name="unique_job_status_counter",
+            ),
+        ),
+    ]
@@ -0,0 +1,38 @@
+import django.db.models.deletion
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "__first__"),
+        ("jobs", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="JobCoverImage",
+            fields=[
+                (
+                    "job",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="cover_image",
+                        serialize=False,
+                        to="users.job",
+                    ),
+                ),
+                ("image", models.CharField(max_length=255)),
+                (
+                    "job_image",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="users.jobimage",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,37 @@
+import django.db.models.deletion
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "__first__"),
+        ("jobs", "0002_jobcoverimage"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="JobLocation",
+            fields=[
+                (
+                    "job",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="location",
+                        serialize=False,
+                        to="users.job",
+                    ),
+                ),
+                ("latitude", models.FloatField()),
+                ("longitude", models.FloatField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="joblocation",
+            index=models.Index(
+                fields=["latitude", "longitude"], name="job_location_lat_lng_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,86 @@
+import math
+
+import django.db.models.deletion
+from django.db import migrations
+from django.db import models
+
+
+BASE_ZOOM = 20
+MAX_LATITUDE = 85.05112878
+
+
+def set_location_cells(apps, schema_editor):
+    JobLocation = apps.get_model("jobs", "JobLocation")
+    scale = 1 << BASE_ZOOM
+    locations = list(JobLocation.objects.all())
+    for location in locations:
+        latitude = math.radians(
+            max(-MAX_LATITUDE, min(MAX_LATITUDE, location.latitude))
+        )
+        x = int((location.longitude + 180) / 360 * scale)
+        y = int((1 - math.asinh(math.tan(latitude)) / math.pi) / 2 * scale)
+        location.cell_x = min(max(x, 0), scale - 1)
+        location.cell_y = min(max(y, 0), scale - 1)
+    JobLocation.objects.bulk_update(locations, ["cell_x", "cell_y"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "__first__"),
+        ("jobs", "0003_joblocation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="joblocation",
+            name="cell_x",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="joblocation",
+            name="cell_y",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="joblocation",
+            index=models.Index(fields=["cell_x", "cell_y"], name="job_location_cell_idx"),
+        ),
+        migrations.RunPython(set_location_cells, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name="JobCluster",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("zoom", models.PositiveSmallIntegerField()),
+                ("cell_x", models.IntegerField()),
+                ("cell_y", models.IntegerField()),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("latitude_sum", models.FloatField(default=0)),
+                ("longitude_sum", models.FloatField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "group",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="job_clusters",
+                        to="users.group",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="jobcluster",
+            constraint=models.UniqueConstraint(
+                fields=("zoom", "cell_x", "cell_y", "group"),
+                name="unique_job_cluster",
+            ),
+        ),
+    ]
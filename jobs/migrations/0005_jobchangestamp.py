@@ -0,0 +1,41 @@
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("jobs", "0004_joblocation_cells_jobcluster"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="JobChangeStamp",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "scope",
+                    models.CharField(
+                        choices=[("group", "Group"), ("job", "Job")], max_length=10
+                    ),
+                ),
+                ("object_id", models.PositiveBigIntegerField()),
+                ("version", models.PositiveBigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="jobchangestamp",
+            constraint=models.UniqueConstraint(
+                fields=("scope", "object_id"), name="unique_job_change_stamp"
+            ),
+        ),
+    ]
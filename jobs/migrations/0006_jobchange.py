@@ -0,0 +1,38 @@
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("jobs", "0005_jobchangestamp"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="JobChange",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("job_id", models.PositiveBigIntegerField(db_index=True)),
+                ("group_id", models.PositiveBigIntegerField()),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("created", "Created"),
+                            ("updated", "Updated"),
+                            ("closed", "Closed"),
+                            ("deleted", "Deleted"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("status", models.CharField(blank=True, max_length=50)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="jobchange",
+            index=models.Index(fields=["group_id", "id"], name="job_change_group_idx"),
+        ),
+    ]
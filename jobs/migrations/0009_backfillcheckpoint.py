@@ -0,0 +1,40 @@
+from django.db import migrations
+from django.db import models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("jobs", "0008_jobassignment"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BackfillCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100)),
+                ("start_id", models.PositiveBigIntegerField()),
+                ("end_id", models.PositiveBigIntegerField()),
+                ("last_id", models.PositiveBigIntegerField(blank=True, null=True)),
+                ("processed", models.PositiveBigIntegerField(default=0)),
+                ("created", models.PositiveBigIntegerField(default=0)),
+                ("completed_at", models.DateTimeField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="backfillcheckpoint",
+            constraint=models.UniqueConstraint(
+                fields=("name", "start_id"), name="unique_backfill_checkpoint"
+            ),
+        ),
+    ]
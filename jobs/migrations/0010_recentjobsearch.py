@@ -0,0 +1,86 @@
+import django.db.models.deletion
+from django.db import migrations
+from django.db import models
+
+
+RECENT_SEARCH_LIMIT = 15
+
+
+def copy_recent_searches(apps, schema_editor):
+    RecentSearchJob = apps.get_model("users", "RecentSearchJob")
+    RecentJobSearch = apps.get_model("jobs", "RecentJobSearch")
+    searches = {}
+    for user_id, transfer_job_id, created_at in (
+        RecentSearchJob.objects.exclude(created_by=None)
+        .order_by("created_by_id", "-created_at")
+        .values_list("created_by_id", "job_id", "created_at")
+    ):
+        user_searches = searches.setdefault(user_id, [])
+        if len(user_searches) < RECENT_SEARCH_LIMIT:
+            user_searches.append((transfer_job_id, created_at))
+
+    slots = []
+    for user_id, user_searches in searches.items():
+        user_searches += [(None, None)] * (RECENT_SEARCH_LIMIT - len(user_searches))
+        slots += [
+            RecentJobSearch(
+                user_id=user_id,
+                slot=slot,
+                transfer_job_id=transfer_job_id,
+                searched_at=searched_at,
+            )
+            for slot, (transfer_job_id, searched_at) in enumerate(user_searches)
+        ]
+    RecentJobSearch.objects.bulk_create(slots, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "__first__"),
+        ("jobs", "0009_backfillcheckpoint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RecentJobSearch",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("slot", models.PositiveSmallIntegerField()),
+                ("searched_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "transfer_job",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="users.transferjob",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="recent_job_searches",
+                        to="users.user",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="recentjobsearch",
+            constraint=models.UniqueConstraint(
+                fields=("user", "slot"), name="unique_recent_job_search_slot"
+            ),
+        ),
+        migrations.RunPython(copy_recent_searches, migrations.RunPython.noop),
+    ]
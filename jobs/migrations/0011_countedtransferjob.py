@@ -0,0 +1,64 @@
+from django.db import migrations
+from django.db import models
+from django.db.models import Count
+
+
+COUNTED_FIELDS = ["job_id", "group_id", "status", "is_parent_group"]
+
+
+def count_active_transfer_jobs(apps, schema_editor):
+    TransferJob = apps.get_model("users", "TransferJob")
+    JobStatusCounter = apps.get_model("jobs", "JobStatusCounter")
+    CountedTransferJob = apps.get_model("jobs", "CountedTransferJob")
+    active = TransferJob.objects.filter(is_active=True)
+
+    JobStatusCounter.objects.all().delete()
+    JobStatusCounter.objects.bulk_create(
+        [
+            JobStatusCounter(
+                group_id=total["group_id"],
+                status=total["status"],
+                is_parent_group=total["is_parent_group"],
+                count=total["total"],
+            )
+            for total in active.values("group_id", "status", "is_parent_group")
+            .annotate(total=Count("id"))
+            .order_by()
+        ],
+        batch_size=1000,
+    )
+    CountedTransferJob.objects.bulk_create(
+        (
+            CountedTransferJob(
+                transfer_job_id=transfer["id"],
+                **{field: transfer[field] for field in COUNTED_FIELDS},
+            )
+            for transfer in active.values("id", *COUNTED_FIELDS).iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "__first__"),
+        ("jobs", "0010_recentjobsearch"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CountedTransferJob",
+            fields=[
+                (
+                    "transfer_job_id",
+                    models.PositiveBigIntegerField(primary_key=True, serialize=False),
+                ),
+                ("job_id", models.PositiveBigIntegerField(db_index=True)),
+                ("group_id", models.PositiveBigIntegerField()),
+                ("status", models.CharField(max_length=50)),
+                ("is_parent_group", models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.RunPython(count_active_transfer_jobs, migrations.RunPython.noop),
+    ]
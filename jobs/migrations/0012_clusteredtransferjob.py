@@ -0,0 +1,97 @@
+from collections import defaultdict
+
+from django.db import migrations
+from django.db import models
+from django.db.models import F
+
+
+BASE_ZOOM = 20
+CLUSTER_ZOOMS = range(16)
+CLUSTER_GRID_OFFSET = 2
+CLUSTER_STATUSES = ["Open", "Transfer"]
+CLUSTERED_FIELDS = ["job_id", "group_id", "cell_x", "cell_y", "latitude", "longitude"]
+
+
+def cluster_active_transfer_jobs(apps, schema_editor):
+    TransferJob = apps.get_model("users", "TransferJob")
+    JobCluster = apps.get_model("jobs", "JobCluster")
+    ClusteredTransferJob = apps.get_model("jobs", "ClusteredTransferJob")
+    shown = TransferJob.objects.filter(
+        is_active=True, status__in=CLUSTER_STATUSES, job__location__isnull=False
+    ).values(
+        "id",
+        "job_id",
+        "group_id",
+        cell_x=F("job__location__cell_x"),
+        cell_y=F("job__location__cell_y"),
+        latitude=F("job__location__latitude"),
+        longitude=F("job__location__longitude"),
+    )
+
+    totals = defaultdict(lambda: [0, 0.0, 0.0])
+    clustered = []
+    for transfer in shown.iterator(chunk_size=2000):
+        clustered.append(
+            ClusteredTransferJob(
+                transfer_job_id=transfer["id"],
+                **{field: transfer[field] for field in CLUSTERED_FIELDS},
+            )
+        )
+        for zoom in CLUSTER_ZOOMS:
+            size = 1 << (BASE_ZOOM - zoom - CLUSTER_GRID_OFFSET)
+            key = (
+                transfer["group_id"],
+                zoom,
+                transfer["cell_x"] // size,
+                transfer["cell_y"] // size,
+            )
+            totals[key][0] += 1
+            totals[key][1] += transfer["latitude"]
+            totals[key][2] += transfer["longitude"]
+
+    JobCluster.objects.all().delete()
+    JobCluster.objects.bulk_create(
+        [
+            JobCluster(
+                group_id=group_id,
+                zoom=zoom,
+                cell_x=x,
+                cell_y=y,
+                count=count,
+                latitude_sum=latitude_sum,
+                longitude_sum=longitude_sum,
+            )
+            for (group_id, zoom, x, y), (count, latitude_sum, longitude_sum) in (
+                totals.items()
+            )
+        ],
+        batch_size=1000,
+    )
+    ClusteredTransferJob.objects.bulk_create(clustered, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "__first__"),
+        ("jobs", "0011_countedtransferjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ClusteredTransferJob",
+            fields=[
+                (
+                    "transfer_job_id",
+                    models.PositiveBigIntegerField(primary_key=True, serialize=False),
+                ),
+                ("job_id", models.PositiveBigIntegerField(db_index=True)),
+                ("group_id", models.PositiveBigIntegerField()),
+                ("cell_x", models.IntegerField()),
+                ("cell_y", models.IntegerField()),
+                ("latitude", models.FloatField()),
+                ("longitude", models.FloatField()),
+            ],
+        ),
+        migrations.RunPython(cluster_active_transfer_jobs, migrations.RunPython.noop),
+    ]
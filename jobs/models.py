@@ -1,3 +1,326 @@
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
-# Create your models here.
+
+class JobStatusCounter(models.Model):
+    """Number of active transfer jobs per group, status and parent flag."""
+
+    group = models.ForeignKey(
+        "users.Group", on_delete=models.CASCADE, related_name="job_status_counters"
+    )
+    status = models.CharField(max_length=50)
+    is_parent_group = models.BooleanField(default=False)
+    count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["group", "status", "is_parent_group"],
+                name="unique_job_status_counter",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.group_id} {self.status} {self.count}"
+
+
+class CountedTransferJob(models.Model):
+    """
+    The counter an active transfer job is counted in.
+
+    Comparing it with the transfer job after a change gives the +1/-1 to
+    apply to the counters. Ids are kept as plain numbers so the rows of
+    deleted jobs remain until their counts are taken back.
+    """
+
+    transfer_job_id = models.PositiveBigIntegerField(primary_key=True)
+    job_id = models.PositiveBigIntegerField(db_index=True)
+    group_id = models.PositiveBigIntegerField()
+    status = models.CharField(max_length=50)
+    is_parent_group = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"{self.transfer_job_id} {self.group_id} {self.status}"
+
+
+class ClusteredTransferJob(models.Model):
+    """
+    The group and location an active transfer job is clustered at.
+
+    Comparing it with the transfer job after a change gives the deltas to
+    apply to the clusters. Ids are kept as plain numbers so the rows of
+    deleted jobs remain until they are taken out of their clusters.
+    """
+
+    transfer_job_id = models.PositiveBigIntegerField(primary_key=True)
+    job_id = models.PositiveBigIntegerField(db_index=True)
+    group_id = models.PositiveBigIntegerField()
+    cell_x = models.IntegerField()
+    cell_y = models.IntegerField()
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+
+    def __str__(self):
+        return f"{self.transfer_job_id} {self.group_id} {self.cell_x}/{self.cell_y}"
+
+
+class JobCoverImage(models.Model):
+    """First displayable image of a job, shown on list, dashboard and map cards."""
+
+    job = models.OneToOneField(
+        "users.Job",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="cover_image",
+    )
+    job_image = models.ForeignKey(
+        "users.JobImage", on_delete=models.CASCADE, related_name="+"
+    )
+    image = models.CharField(max_length=255)
+
+    def __str__(self):
+        return self.image
+
+    @property
+    def url(self):
+        return default_storage.url(self.image)
+
+
+class JobLocation(models.Model):
+    """Numeric, indexed copy of a job's coordinates for map and nearby queries."""
+
+    job = models.OneToOneField(
+        "users.Job",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="location",
+    )
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    # Web Mercator tile of the job at jobs.clusters.BASE_ZOOM.
+    cell_x = models.IntegerField(default=0)
+    cell_y = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["latitude", "longitude"], name="job_location_lat_lng_idx"
+            ),
+            models.Index(fields=["cell_x", "cell_y"], name="job_location_cell_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.latitude},{self.longitude}"
+
+
+class JobCluster(models.Model):
+    """
+    Active open/transfer jobs of a group falling in one map tile at one zoom.
+
+    The centroid is kept as coordinate sums so clusters of several groups
+    can be merged by adding them up.
+    """
+
+    group = models.ForeignKey(
+        "users.Group", on_delete=models.CASCADE, related_name="job_clusters"
+    )
+    zoom = models.PositiveSmallIntegerField()
+    cell_x = models.IntegerField()
+    cell_y = models.IntegerField()
+    count = models.PositiveIntegerField(default=0)
+    latitude_sum = models.FloatField(default=0)
+    longitude_sum = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["zoom", "cell_x", "cell_y", "group"],
+                name="unique_job_cluster",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.group_id} {self.zoom}/{self.cell_x}/{self.cell_y} {self.count}"
+
+
+class JobChangeStamp(models.Model):
+    """Version of the jobs of a group, or of one job, bumped on every change."""
+
+    GROUP = "group"
+    JOB = "job"
+    SCOPE_CHOICES = [(GROUP, "Group"), (JOB, "Job")]
+
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["scope", "object_id"], name="unique_job_change_stamp"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.object_id} v{self.version}"
+
+
+class JobChange(models.Model):
+    """
+    Append only feed of job changes per group, read by delta sync clients.
+
+    Jobs are referenced by id only, so the entries of deleted jobs remain.
+    """
+
+    CREATED = "created"
+    UPDATED = "updated"
+    CLOSED = "closed"
+    DELETED = "deleted"
+    KIND_CHOICES = [
+        (CREATED, "Created"),
+        (UPDATED, "Updated"),
+        (CLOSED, "Closed"),
+        (DELETED, "Deleted"),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    job_id = models.PositiveBigIntegerField(db_index=True)
+    group_id = models.PositiveBigIntegerField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    status = models.CharField(max_length=50, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["group_id", "id"], name="job_change_group_idx")]
+
+    def __str__(self):
+        return f"{self.id} {self.kind} {self.job_id}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Response of a request sent with an Idempotency-Key header.
+
+    Retries with the same key are answered from here instead of running
+    the view again. status_code stays null while the first request runs.
+    """
+
+    user = models.ForeignKey(
+        "users.User", on_delete=models.CASCADE, related_name="idempotency_keys"
+    )
+    scope = models.CharField(max_length=50)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "scope", "key"], name="unique_idempotency_key"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["created_at"], name="idempotency_key_created_idx")
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.scope} {self.key}"
+
+
+class JobAssignment(models.Model):
+    """
+    Active and main group transfer jobs of a job, kept by record_job_changes.
+
+    Lets the current assignment of a job be read with a join instead of
+    scanning its transfer jobs for is_active or is_parent_group.
+    """
+
+    job = models.OneToOneField(
+        "users.Job",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="assignment",
+    )
+    active_transfer = models.ForeignKey(
+        "users.TransferJob",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="active_assignments",
+    )
+    parent_transfer = models.ForeignKey(
+        "users.TransferJob",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="parent_assignments",
+    )
+
+    def __str__(self):
+        return f"{self.job_id} {self.active_transfer_id} {self.parent_transfer_id}"
+
+
+class BackfillCheckpoint(models.Model):
+    """
+    Progress of a backfill over one primary key range, for resuming it.
+
+    last_id is the last key processed; the range is done once completed_at
+    is set.
+    """
+
+    name = models.CharField(max_length=100)
+    start_id = models.PositiveBigIntegerField()
+    end_id = models.PositiveBigIntegerField()
+    last_id = models.PositiveBigIntegerField(null=True, blank=True)
+    processed = models.PositiveBigIntegerField(default=0)
+    created = models.PositiveBigIntegerField(default=0)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["name", "start_id"], name="unique_backfill_checkpoint"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.name} {self.start_id}-{self.end_id} at {self.last_id}"
+
+
+class RecentJobSearch(models.Model):
+    """
+    One slot of a user's ring of recently searched jobs.
+
+    Every user has a fixed number of slots, reused from the oldest one, so
+    recording a search updates a row instead of inserting and trimming.
+    """
+
+    user = models.ForeignKey(
+        "users.User", on_delete=models.CASCADE, related_name="recent_job_searches"
+    )
+    slot = models.PositiveSmallIntegerField()
+    transfer_job = models.ForeignKey(
+        "users.TransferJob",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    searched_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "slot"], name="unique_recent_job_search_slot"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.slot} {self.transfer_job_id}"
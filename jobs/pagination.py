@@ -0,0 +1,277 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import F
+from django.db.models import Q
+from django.http import QueryDict
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+APPROXIMATE_COUNT_CAP = 1000
+
+
+def get_ordering_fields(queryset, default="-created_at"):
+    """
+    Return the (field, descending) pairs of the ordering of a queryset.
+
+    The id is appended when the ordering does not end with it, so the
+    position of every row is unique.
+    """
+    ordering = queryset.query.order_by or queryset.model._meta.ordering or [default]
+    if not all(isinstance(order, str) and order != "?" for order in ordering):
+        ordering = [default]
+    fields = []
+    for order in ordering:
+        field = order.lstrip("-")
+        if field == "pk":
+            field = "id"
+        if field not in [name for name, _ in fields]:
+            fields.append((field, order.startswith("-")))
+    if "id" not in [name for name, _ in fields]:
+        fields.append(("id", fields[-1][1]))
+    return fields
+
+
+def encode_cursor(values, backwards=False):
+    values = [
+        value.isoformat() if hasattr(value, "isoformat") else value for value in values
+    ]
+    position = {"v": values}
+    if backwards:
+        position["r"] = 1
+    payload = json.dumps(position, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor, size=None):
+    """Return the (values, backwards) of a cursor, ValueError if invalid."""
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(cursor + padding))
+        values = position["v"]
+        backwards = bool(position.get("r"))
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or not values or None in values[-1:]:
+        raise ValueError("Invalid cursor")
+    if size is not None and len(values) != size:
+        raise ValueError("Invalid cursor")
+    return values, backwards
+
+
+def get_position(row, fields):
+    values = []
+    for field, _ in fields:
+        if isinstance(row, dict):
+            values.append(row.get(field))
+            continue
+        value = row
+        for attr in field.split("__"):
+            value = getattr(value, attr, None)
+            if value is None:
+                break
+        values.append(value)
+    return values
+
+
+def field_after(field, value, descending, backwards):
+    """
+    Rows whose field comes strictly after (or before when going backwards) value.
+
+    Null values are displayed last, so moving forward from a non null value
+    also reaches the null rows while moving backwards never does.
+    """
+    op = "lt" if descending != backwards else "gt"
+    if value is None:
+        return Q(**{f"{field}__isnull": False}) if backwards else None
+    condition = Q(**{f"{field}__{op}": value})
+    if not backwards:
+        condition |= Q(**{f"{field}__isnull": True})
+    return condition
+
+
+def position_filter(fields, values, backwards):
+    """
+    Rows strictly after (or before when going backwards) the cursor position.
+
+    The position is compared field by field: a row comes after it when it
+    equals the first fields and comes after on the next one.
+    """
+    condition = Q(pk__in=[])
+    equal = Q()
+    for (field, descending), value in zip(fields, values):
+        after = field_after(field, value, descending, backwards)
+        if after is not None:
+            condition |= equal & after
+        if value is None:
+            equal &= Q(**{f"{field}__isnull": True})
+        else:
+            equal &= Q(**{field: value})
+    return condition
+
+
+def keyset_ordering(fields, backwards):
+    nulls = {"nulls_first": True} if backwards else {"nulls_last": True}
+    return [
+        F(field).desc(**nulls) if descending != backwards else F(field).asc(**nulls)
+        for field, descending in fields
+    ]
+
+
+class KeysetPage:
+    """
+    One page of a keyset paginated queryset.
+
+    Iterates like a list of rows and carries the cursors of its neighbours,
+    so templates can regroup it and link to the next and previous pages.
+    """
+
+    def __init__(self, rows, next_cursor=None, previous_cursor=None, request=None):
+        self.object_list = rows
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.request = request
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def get_url(self, cursor):
+        params = self.request.GET.copy() if self.request else QueryDict(mutable=True)
+        params.pop("page", None)
+        params["cursor"] = cursor
+        return "?" + params.urlencode()
+
+    @property
+    def next_url(self):
+        return self.get_url(self.next_cursor) if self.next_cursor else None
+
+    @property
+    def previous_url(self):
+        return self.get_url(self.previous_cursor) if self.previous_cursor else None
+
+
+def paginate_keyset(queryset, cursor=None, page_size=20, request=None):
+    """
+    Return a KeysetPage of queryset starting after cursor.
+
+    The queryset keeps its own ordering, with the id appended as a tie
+    breaker, so every page is a single indexed range scan of page_size + 1
+    rows no matter how deep the client has scrolled. Raises ValueError for
+    a cursor that is invalid or does not fit the ordering.
+    """
+    fields = get_ordering_fields(queryset)
+    backwards = False
+    try:
+        if cursor:
+            values, backwards = decode_cursor(cursor, size=len(fields))
+            queryset = queryset.filter(position_filter(fields, values, backwards))
+        queryset = queryset.order_by(*keyset_ordering(fields, backwards))
+        rows = list(queryset[: page_size + 1])
+    except ValidationError:
+        raise ValueError("Invalid cursor")
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+
+    next_cursor = previous_cursor = None
+    if rows:
+        if has_more or backwards:
+            next_cursor = encode_cursor(get_position(rows[-1], fields))
+        if cursor and (has_more or not backwards):
+            previous_cursor = encode_cursor(
+                get_position(rows[0], fields), backwards=True
+            )
+    return KeysetPage(rows, next_cursor, previous_cursor, request=request)
+
+
+def approximate_count(queryset, cap=APPROXIMATE_COUNT_CAP):
+    """
+    Cheap estimate of the number of rows of a queryset.
+
+    PostgreSQL answers from the planner estimate without touching the rows,
+    other databases count at most cap + 1 rows.
+    """
+    queryset = queryset.order_by()
+    connection = connections[queryset.db]
+    if connection.vendor == "postgresql":
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    return queryset[: cap + 1].count()
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on the ordering of the view's queryset.
+
+    Pass ?with_total=true to also receive an approximate count.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    total_query_param = "with_total"
+    max_page_size = 100
+
+    def get_page_size(self, request):
+        page_size = api_settings.PAGE_SIZE or 10
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, page_size))
+        except ValueError:
+            pass
+        return max(1, min(page_size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        cursor = request.query_params.get(self.cursor_query_param)
+        try:
+            self.page = paginate_keyset(queryset, cursor, self.get_page_size(request))
+        except ValueError:
+            raise NotFound("Invalid cursor")
+        self.total = None
+        if request.query_params.get(self.total_query_param) == "true":
+            self.total = approximate_count(queryset)
+        return list(self.page)
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        response = {
+            "next": self.get_link(self.page.next_cursor),
+            "previous": self.get_link(self.page.previous_cursor),
+            "results": data,
+        }
+        if self.total is not None:
+            response["count"] = self.total
+            response["count_is_approximate"] = True
+        return Response(response)
@@ -0,0 +1,124 @@
+from collections import defaultdict
+
+from django.core.files.storage import default_storage
+from django.http import HttpResponse
+from django.http import JsonResponse
+
+from jobs.covers import cover_image_filter
+from jobs.locations import parse_coordinate
+from users.models.job import JobImage
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+COMPACT_FORMAT = "compact"
+MSGPACK_FORMAT = "msgpack"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+COORDINATE_SCALE = 10**6
+
+
+def delta_encode(values):
+    """
+    Replace each value by its difference with the previous non null one.
+
+    Neighbouring jobs have close ids, dates and coordinates, so the deltas
+    are short numbers that also repeat a lot, which gzip compresses well.
+    """
+    encoded = []
+    previous = 0
+    for value in values:
+        if value is None:
+            encoded.append(None)
+            continue
+        encoded.append(value - previous)
+        previous = value
+    return encoded
+
+
+def delta_decode(values):
+    decoded = []
+    previous = 0
+    for value in values:
+        if value is None:
+            decoded.append(None)
+            continue
+        previous += value
+        decoded.append(previous)
+    return decoded
+
+
+def scale_coordinate(value, limit):
+    value = parse_coordinate(value, limit)
+    return None if value is None else round(value * COORDINATE_SCALE)
+
+
+def get_job_images(job_ids):
+    """Return the displayable image paths of each job, in upload order."""
+    images = defaultdict(list)
+    for job_id, image in (
+        JobImage.objects.filter(cover_image_filter(), job_id__in=job_ids)
+        .order_by("id")
+        .values_list("job_id", "image")
+    ):
+        images[job_id].append(image)
+    return images
+
+
+def encode_map_jobs(jobs, images=None):
+    """
+    Columnar payload of the map jobs returned by get_jobs_for_group.
+
+    Every field is one array in the jobs order instead of one object per
+    job. Ids, dates and coordinates (integers in millionths of a degree)
+    are delta encoded, statuses are indexes into a table, and the image
+    paths of each job are grouped under it, relative to media_url.
+    """
+    jobs = list(jobs)
+    images = images or {}
+    statuses = []
+    status_indexes = {}
+    for job in jobs:
+        if job["status"] not in status_indexes:
+            status_indexes[job["status"]] = len(statuses)
+            statuses.append(job["status"])
+
+    return {
+        "format": COMPACT_FORMAT,
+        "version": 1,
+        "count": len(jobs),
+        "scale": COORDINATE_SCALE,
+        "media_url": default_storage.url(""),
+        "statuses": statuses,
+        "id": delta_encode([job["id"] for job in jobs]),
+        "job": delta_encode([job["job__id"] for job in jobs]),
+        "lat": delta_encode([scale_coordinate(job["job__latitude"], 90) for job in jobs]),
+        "lng": delta_encode([scale_coordinate(job["job__longitude"], 180) for job in jobs]),
+        "created_at": delta_encode(
+            [int(job["created_at"].timestamp()) for job in jobs]
+        ),
+        "status": [status_indexes[job["status"]] for job in jobs],
+        "priority": [1 if job["job__priority"] else 0 for job in jobs],
+        "address": [job["job__address"] or "" for job in jobs],
+        "description": [job["job__description"] or "" for job in jobs],
+        "images": [images.get(job["job__id"], []) for job in jobs],
+    }
+
+
+def wants_msgpack(request, format=None):
+    accept = request.META.get("HTTP_ACCEPT", "")
+    return msgpack is not None and (
+        format == MSGPACK_FORMAT or MSGPACK_CONTENT_TYPE in accept
+    )
+
+
+def compact_response(request, payload, format=None):
+    """Return payload as MessagePack when asked for and available, else JSON."""
+    if wants_msgpack(request, format):
+        return HttpResponse(
+            msgpack.packb(payload, use_bin_type=True),
+            content_type=MSGPACK_CONTENT_TYPE,
+        )
+    return JsonResponse(payload)
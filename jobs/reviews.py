@@ -0,0 +1,65 @@
+from django.db import transaction
+from django.utils import timezone
+
+from jobs.changes import record_job_changes
+from jobs.transitions import log_transition
+from users.models.job import TransferJob
+
+
+MAX_BULK_REVIEW_JOBS = 500
+
+
+def parse_review_state(value):
+    """Return the bool of a review state, given as a bool or as "true"/"false"."""
+    state = str(value).lower()
+    if state not in ("true", "false"):
+        raise ValueError("סטטוס בדיקה לא חוקי")
+    return state == "true"
+
+
+def parse_reviews(rows):
+    """
+    Return {transfer job id: reviewed} of [{"id", "is_reviewed"}] rows.
+
+    Raises ValueError on a missing id or an invalid state.
+    """
+    reviews = {}
+    for row in rows or []:
+        try:
+            transfer_job_id = int(row["id"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("מזהה משימה לא חוקי")
+        reviews[transfer_job_id] = parse_review_state(row.get("is_reviewed"))
+    return reviews
+
+
+@transaction.atomic
+def review_transfer_jobs(user, reviews):
+    """
+    Set is_reviewed of the transfer jobs, reviews mapping their id to a state.
+
+    Runs one UPDATE per state, whatever the number of jobs. Only the rows
+    whose state changes are updated and logged. Return their ids.
+    """
+    now = timezone.now()
+    rows = (
+        TransferJob.objects.select_for_update()
+        .filter(id__in=reviews)
+        .values_list("id", "job_id", "is_reviewed")
+    )
+    changed = {
+        id: job_id
+        for id, job_id, is_reviewed in rows
+        if is_reviewed != reviews[id]
+    }
+    for state in (True, False):
+        ids = [id for id in changed if reviews[id] == state]
+        if ids:
+            TransferJob.objects.filter(id__in=ids).update(
+                is_reviewed=state, updated_by=user, updated_at=now
+            )
+    job_ids = set(changed.values())
+    if job_ids:
+        log_transition(user, job_ids, "Update", now)
+        record_job_changes(job_ids)
+    return list(changed)
@@ -0,0 +1,193 @@
+import time
+from functools import lru_cache
+
+import numpy as np
+
+from jobs.locations import EARTH_RADIUS
+from jobs.locations import parse_coordinate
+from users.models.job import TransferJob
+
+
+MAX_ROUTE_STOPS = 300
+# 2-opt stops improving the route once this many seconds are spent.
+TWO_OPT_TIME_LIMIT = 0.5
+
+
+def haversine_matrix(points, others):
+    """Haversine distances in meters from every point to every other, in radians."""
+    latitudes, longitudes = points[:, 0:1], points[:, 1:2]
+    other_latitudes, other_longitudes = others[:, 0], others[:, 1]
+    half_chord = (
+        np.sin((other_latitudes - latitudes) / 2) ** 2
+        + np.cos(latitudes)
+        * np.cos(other_latitudes)
+        * np.sin((other_longitudes - longitudes) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(half_chord, 0, 1)))
+
+
+@lru_cache(maxsize=32)
+def distance_matrix(stops):
+    """
+    Distances in meters between every pair of (id, lat, lng) stops sorted by id.
+
+    Keyed on the stops alone, so replanning the same jobs from another start
+    or in another order reuses the matrix.
+    """
+    points = np.radians(np.array([stop[1:] for stop in stops], dtype=float))
+    matrix = haversine_matrix(points, points)
+    matrix.setflags(write=False)
+    return matrix
+
+
+def get_route_matrix(stops, start=None):
+    """
+    Distance matrix of the (id, lat, lng) stops in their order.
+
+    The start position, when given, is prepended as row and column 0; only
+    its distances are computed per request.
+    """
+    keys = sorted(stops)
+    positions = {key[0]: position for position, key in enumerate(keys)}
+    order = [positions[stop[0]] for stop in stops]
+    matrix = distance_matrix(tuple(keys))[np.ix_(order, order)]
+    if start is None:
+        return matrix
+    distances = haversine_matrix(
+        np.radians(np.array([start], dtype=float)),
+        np.radians(np.array([stop[1:] for stop in stops], dtype=float)),
+    )[0]
+    size = len(stops) + 1
+    route_matrix = np.zeros((size, size))
+    route_matrix[0, 1:] = route_matrix[1:, 0] = distances
+    route_matrix[1:, 1:] = matrix
+    return route_matrix
+
+
+def nearest_neighbour(matrix):
+    """Visit order starting at stop 0 and always going to the closest unvisited stop."""
+    size = len(matrix)
+    visited = np.zeros(size, dtype=bool)
+    route = [0]
+    visited[0] = True
+    for _ in range(size - 1):
+        distances = np.where(visited, np.inf, matrix[route[-1]])
+        stop = int(np.argmin(distances))
+        route.append(stop)
+        visited[stop] = True
+    return route
+
+
+def two_opt(route, matrix, time_limit=TWO_OPT_TIME_LIMIT):
+    """
+    Reverse route segments while it shortens the route, the first stop staying first.
+
+    The route is open (it does not come back to its start), so reversing
+    the tail only changes the edge entering it. For each segment start, the
+    gain of every segment end is computed at once.
+    """
+    route = np.array(route)
+    size = len(route)
+    deadline = time.monotonic() + time_limit
+    improved = True
+    while improved and time.monotonic() < deadline:
+        improved = False
+        for i in range(1, size - 1):
+            before, first = route[i - 1], route[i]
+            lasts = route[i + 1 :]
+            afters = np.append(route[i + 2 :], -1)
+            has_after = afters >= 0
+            afters = np.where(has_after, afters, 0)
+            gains = (
+                matrix[before, lasts]
+                - matrix[before, first]
+                + np.where(
+                    has_after, matrix[first, afters] - matrix[lasts, afters], 0
+                )
+            )
+            best = int(np.argmin(gains))
+            if gains[best] < -1e-6:
+                end = i + 1 + best
+                route[i : end + 1] = route[i : end + 1][::-1].copy()
+                improved = True
+    return route.tolist()
+
+
+def get_route_stops(user, job_ids):
+    """Active transfer jobs of the user's groups with a known location."""
+    jobs = TransferJob.objects.filter(
+        id__in=job_ids,
+        is_active=True,
+        group__is_archive=False,
+        job__location__isnull=False,
+    )
+    if not user.is_superuser:
+        jobs = jobs.filter(group__member=user.id)
+    stops = {
+        job["id"]: job
+        for job in jobs.values(
+            "id",
+            "job_id",
+            "job__address",
+            "job__location__latitude",
+            "job__location__longitude",
+        ).distinct()
+    }
+    return [stops[job_id] for job_id in job_ids if job_id in stops]
+
+
+def plan_route(user, job_ids, latitude=None, longitude=None):
+    """
+    Return the visit order of the jobs minimising the total distance.
+
+    The route starts from the given position when there is one, otherwise
+    from the first job. Jobs the user cannot see or without a location are
+    listed as skipped.
+    """
+    stops = get_route_stops(user, job_ids[:MAX_ROUTE_STOPS])
+    latitude = parse_coordinate(latitude, 90)
+    longitude = parse_coordinate(longitude, 180)
+    has_start = latitude is not None and longitude is not None
+
+    route = list(range(len(stops) + has_start))
+    matrix = None
+    if len(route) > 1:
+        matrix = get_route_matrix(
+            [
+                (
+                    stop["id"],
+                    stop["job__location__latitude"],
+                    stop["job__location__longitude"],
+                )
+                for stop in stops
+            ],
+            (latitude, longitude) if has_start else None,
+        )
+        route = two_opt(nearest_neighbour(matrix), matrix)
+
+    ordered = []
+    total_distance = 0
+    for position, index in enumerate(route):
+        distance = float(matrix[route[position - 1], index]) if position else 0
+        total_distance += distance
+        if has_start and index == 0:
+            continue
+        stop = stops[index - 1 if has_start else index]
+        ordered.append(
+            {
+                "id": stop["id"],
+                "job": stop["job_id"],
+                "address": stop["job__address"],
+                "lat": stop["job__location__latitude"],
+                "lng": stop["job__location__longitude"],
+                "distance": round(distance, 1),
+            }
+        )
+
+    routed = {stop["id"] for stop in stops}
+    return {
+        "order": [stop["id"] for stop in ordered],
+        "stops": ordered,
+        "total_distance": round(total_distance, 1),
+        "skipped": [job_id for job_id in job_ids if job_id not in routed],
+    }
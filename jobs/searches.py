@@ -0,0 +1,68 @@
+from django.db.models import Case
+from django.db.models import F
+from django.db.models import IntegerField
+from django.db.models import Q
+from django.db.models import Subquery
+from django.db.models import Value
+from django.db.models import When
+from django.utils import timezone
+
+from jobs.models import RecentJobSearch
+from users.models.job import JobStatus
+
+
+RECENT_SEARCH_LIMIT = 15
+
+
+def record_recent_search(user, transfer_job_id):
+    """
+    Put a searched transfer job at the top of the user's recent searches
+    and return its slot.
+
+    The slot already holding the job is reused, otherwise the empty or the
+    oldest one, with a single UPDATE. The user's slots are only inserted on
+    their first search, after which the UPDATE runs again, so the search is
+    kept when a concurrent first search inserted them.
+    """
+    now = timezone.now()
+    slots = RecentJobSearch.objects.filter(user=user)
+    target_slot = (
+        slots.order_by(
+            Case(
+                When(transfer_job_id=transfer_job_id, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            ),
+            F("searched_at").asc(nulls_first=True),
+        ).values("slot")[:1]
+    )
+    update = slots.filter(slot=Subquery(target_slot))
+    if not update.update(transfer_job_id=transfer_job_id, searched_at=now):
+        RecentJobSearch.objects.bulk_create(
+            [
+                RecentJobSearch(user=user, slot=slot)
+                for slot in range(RECENT_SEARCH_LIMIT)
+            ],
+            ignore_conflicts=True,
+        )
+        update.update(transfer_job_id=transfer_job_id, searched_at=now)
+    return (
+        slots.select_related("transfer_job__job")
+        .filter(transfer_job_id=transfer_job_id)
+        .order_by("-searched_at")
+        .first()
+    )
+
+
+def get_recent_searches(user):
+    """The user's recent searches of open jobs in non archived groups, newest first."""
+    return (
+        RecentJobSearch.objects.filter(user=user, transfer_job__isnull=False)
+        .exclude(
+            Q(transfer_job__group__is_archive=True)
+            | Q(transfer_job__status=JobStatus.CLOSE.value)
+            | Q(transfer_job__job__status=JobStatus.CLOSE.value)
+        )
+        .select_related("transfer_job__job")
+        .order_by("-searched_at")
+    )
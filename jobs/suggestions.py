@@ -0,0 +1,245 @@
+import bisect
+import heapq
+import threading
+import time
+from collections import defaultdict
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Max
+from django.db.models import Min
+
+from jobs.models import JobChange
+from users.models.group import Group
+from users.models.job import TransferJob
+
+
+SUGGESTION_INDEX_TTL = getattr(settings, "JOB_SUGGESTION_INDEX_TTL", 60)
+SUGGESTION_LIMIT = 10
+MAX_SUGGESTION_LIMIT = 50
+MIN_TOKEN_LENGTH = 2
+# Past this many feed entries since the last refresh, the index is rebuilt.
+SUGGESTION_CHANGE_LIMIT = 5000
+
+
+def normalize(value):
+    return " ".join(str(value or "").lower().split())
+
+
+def parse_suggestion_limit(value):
+    """Return the limit query parameter between 1 and MAX_SUGGESTION_LIMIT."""
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return SUGGESTION_LIMIT
+    return max(1, min(limit, MAX_SUGGESTION_LIMIT))
+
+
+class JobSuggestionIndex:
+    """
+    Sorted prefix indexes over job ids and addresses of active jobs, one per group.
+
+    Every job contributes its job id, its full address and each word of the
+    address as keys, so a keystroke is one bisect into the sorted list of
+    each group of the user instead of an icontains scan over the jobs table,
+    and the jobs of other groups are never walked. The index lives in process
+    memory. Only the first lookup of a process waits for it to be built; once
+    it is older than SUGGESTION_INDEX_TTL seconds, the next lookup replaces
+    the keys of the jobs changed since, read from the JobChange feed. It is
+    only rebuilt, by one background thread, when the feed no longer reaches
+    back to its last change.
+    """
+
+    def __init__(self, ttl=SUGGESTION_INDEX_TTL):
+        self.ttl = ttl
+        # {group id: (sorted (token, transfer job id) keys, their entries)}
+        self.groups = {}
+        # {job id: {(group id, key)}}, to drop the keys of a changed job.
+        self.job_keys = {}
+        self.change_id = None
+        self.built_at = None
+        self.lock = threading.Lock()
+
+    def is_stale(self):
+        return self.built_at is None or time.monotonic() - self.built_at > self.ttl
+
+    def invalidate(self):
+        self.built_at = None
+
+    def read_jobs(self, transfer_jobs):
+        """Return the {group id: [(key, entry)]} and {job id: keys} of transfer jobs."""
+        groups = defaultdict(list)
+        job_keys = defaultdict(set)
+        for job in transfer_jobs.values(
+            "id", "group_id", "status", "job__id", "job__job_id", "job__address"
+        ).iterator(chunk_size=2000):
+            entry = {
+                "id": job["id"],
+                "job": job["job__id"],
+                "job_id": job["job__job_id"],
+                "address": job["job__address"],
+                "status": job["status"],
+                "group_id": job["group_id"],
+            }
+            tokens = {normalize(job["job__job_id"]), normalize(job["job__address"])}
+            tokens.update(normalize(job["job__address"]).split())
+            for token in tokens:
+                if len(token) >= MIN_TOKEN_LENGTH:
+                    key = (token, job["id"])
+                    groups[job["group_id"]].append((key, entry))
+                    job_keys[job["job__id"]].add((job["group_id"], key))
+        for items in groups.values():
+            items.sort(key=itemgetter(0))
+        return groups, job_keys
+
+    def build(self):
+        # Read first, so changes committed during the build are applied again.
+        change_id = JobChange.objects.aggregate(last=Max("id"))["last"] or 0
+        groups, job_keys = self.read_jobs(TransferJob.objects.filter(is_active=True))
+        self.groups = {
+            group_id: (list(map(itemgetter(0), items)), list(map(itemgetter(1), items)))
+            for group_id, items in groups.items()
+        }
+        self.job_keys = dict(job_keys)
+        self.change_id = change_id
+        self.built_at = time.monotonic()
+
+    def apply_changes(self):
+        """
+        Replace the keys of the jobs changed since the last build or refresh.
+
+        Only the groups of those jobs get new lists, swapped in whole so
+        concurrent lookups keep reading consistent ones. Return False when
+        the feed no longer reaches back to the last change, or holds more
+        changes than a rebuild costs.
+        """
+        first = JobChange.objects.aggregate(first=Min("id"))["first"]
+        if first is not None and self.change_id < first - 1:
+            return False
+        changes = list(
+            JobChange.objects.filter(id__gt=self.change_id)
+            .order_by("id")
+            .values_list("id", "job_id")[: SUGGESTION_CHANGE_LIMIT + 1]
+        )
+        if len(changes) > SUGGESTION_CHANGE_LIMIT:
+            return False
+        if changes:
+            job_ids = {job_id for _, job_id in changes}
+            added, job_keys = self.read_jobs(
+                TransferJob.objects.filter(is_active=True, job_id__in=job_ids)
+            )
+            removed = defaultdict(set)
+            for job_id in job_ids:
+                for group_id, key in self.job_keys.pop(job_id, ()):
+                    removed[group_id].add(key)
+
+            groups = dict(self.groups)
+            for group_id in set(removed) | set(added):
+                keys, entries = groups.get(group_id, ([], []))
+                kept = [
+                    (key, entry)
+                    for key, entry in zip(keys, entries)
+                    if key not in removed[group_id]
+                ]
+                items = list(heapq.merge(kept, added[group_id], key=itemgetter(0)))
+                groups[group_id] = (
+                    list(map(itemgetter(0), items)),
+                    list(map(itemgetter(1), items)),
+                )
+            self.groups = groups
+            self.job_keys.update(job_keys)
+            self.change_id = changes[-1][0]
+        self.built_at = time.monotonic()
+        return True
+
+    def rebuild_in_background(self):
+        try:
+            self.build()
+        finally:
+            self.lock.release()
+            connection.close()
+
+    def refresh(self):
+        if not self.is_stale():
+            return
+        if self.built_at is None:
+            with self.lock:
+                if self.built_at is None:
+                    self.build()
+            return
+        if not self.lock.acquire(blocking=False):
+            return
+        try:
+            refreshed = self.apply_changes()
+        except BaseException:
+            self.lock.release()
+            raise
+        if refreshed:
+            self.lock.release()
+        else:
+            threading.Thread(target=self.rebuild_in_background, daemon=True).start()
+
+    def search(self, prefix, group_ids=None, limit=SUGGESTION_LIMIT):
+        """
+        Return the entries of the groups whose keys start with prefix.
+
+        Each group is searched with one bisect and gives at most limit
+        jobs, which are then merged in key order. group_ids=None searches
+        every group.
+        """
+        prefix = normalize(prefix)
+        if len(prefix) < MIN_TOKEN_LENGTH:
+            return []
+        self.refresh()
+
+        groups = self.groups
+        if group_ids is None:
+            group_ids = groups.keys()
+        matches = []
+        for group_id in group_ids:
+            keys, entries = groups.get(group_id, ((), ()))
+            position = bisect.bisect_left(keys, (prefix,))
+            seen = set()
+            while (
+                position < len(keys)
+                and len(seen) < limit
+                and keys[position][0].startswith(prefix)
+            ):
+                if entries[position]["id"] not in seen:
+                    seen.add(entries[position]["id"])
+                    matches.append((keys[position], entries[position]))
+                position += 1
+
+        results = []
+        seen = set()
+        for _, entry in sorted(matches, key=itemgetter(0)):
+            if entry["id"] in seen:
+                continue
+            seen.add(entry["id"])
+            results.append(entry)
+            if len(results) >= limit:
+                break
+        return results
+
+
+job_suggestion_index = JobSuggestionIndex()
+
+
+def get_user_group_ids(user):
+    """Return the non archived group ids of the user, None for superusers."""
+    if user.is_superuser:
+        return None
+    return set(
+        Group.objects.filter(member=user.id)
+        .exclude(is_archive=True)
+        .values_list("id", flat=True)
+    )
+
+
+def get_job_suggestions(user, prefix, limit=SUGGESTION_LIMIT):
+    """Suggestions of the user's non archived groups, every one for superusers."""
+    group_ids = get_user_group_ids(user)
+    if group_ids is None:
+        group_ids = Group.objects.exclude(is_archive=True).values_list("id", flat=True)
+    return job_suggestion_index.search(prefix, group_ids=group_ids, limit=limit)
@@ -1,3 +1,2041 @@
+import datetime
+import decimal
+import io
+import json
+import unittest
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test import SimpleTestCase
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from rest_framework import status as return_status
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.test import force_authenticate
+from rest_framework.views import APIView
+
+from jobs.apis.views import JobCreateView
+from jobs.assignments import get_active_transfer
+from jobs.assignments import get_parent_transfer
+from jobs.assignments import refresh_job_assignments
+from jobs.backfills import Backfill
+from jobs.batch import FAILED
+from jobs.batch import OK
+from jobs.batch import apply_operations
+from jobs.batch import group_operations
+from jobs.batch import parse_operations
+from jobs.changes import CursorExpired
+from jobs.changes import bump_change_stamps
+from jobs.changes import conditional_job_view
+from jobs.changes import get_etag
+from jobs.changes import get_job_changes
+from jobs.changes import get_sync_heads
+from jobs.changes import group_scope_from_query
+from jobs.changes import record_job_changes
+from jobs.closing import close_jobs
+from jobs.closing import get_close_job_bills
+from jobs.closing import parse_bill_quantities
+from jobs.clusters import CLUSTER_ZOOMS
+from jobs.clusters import get_clusters
+from jobs.clusters import rebuild_group_clusters
+from jobs.clusters import update_job_clusters
+from jobs.counters import apply_counter_deltas
+from jobs.counters import get_job_counts
+from jobs.counters import refresh_group_counters
+from jobs.counters import update_job_counters
+from jobs.covers import delete_job_images
+from jobs.covers import refresh_cover_images
+from jobs.creation import create_job
+from jobs.duplicates import address_similarity
+from jobs.duplicates import find_duplicate_candidates
+from jobs.duplicates import normalize_address
+from jobs.events import get_job_event_batch
+from jobs.idempotency import IDEMPOTENCY_KEY_TTL
+from jobs.idempotency import IDEMPOTENCY_LOCK_TIMEOUT
+from jobs.idempotency import claim_idempotency_key
+from jobs.idempotency import idempotent
+from jobs.idempotency import mark_committed
+from jobs.imports import ImportFileError
+from jobs.imports import import_jobs
+from jobs.imports import openpyxl
+from jobs.locations import get_map_data
+from jobs.locations import get_map_markers
+from jobs.locations import get_nearby_jobs
+from jobs.locations import parse_bbox
+from jobs.locations import parse_nearby_params
+from jobs.locations import parse_zoom
+from jobs.locations import refresh_job_locations
+from jobs.models import BackfillCheckpoint
+from jobs.models import ClusteredTransferJob
+from jobs.models import CountedTransferJob
+from jobs.models import IdempotencyKey
+from jobs.models import JobAssignment
+from jobs.models import JobChange
+from jobs.models import JobChangeStamp
+from jobs.models import JobCluster
+from jobs.models import JobCoverImage
+from jobs.models import JobLocation
+from jobs.models import JobStatusCounter
+from jobs.models import RecentJobSearch
+from jobs.pagination import KeysetPagination
+from jobs.pagination import decode_cursor
+from jobs.pagination import encode_cursor
+from jobs.pagination import paginate_keyset
+from jobs.payloads import MSGPACK_CONTENT_TYPE
+from jobs.payloads import compact_response
+from jobs.payloads import delta_decode
+from jobs.payloads import delta_encode
+from jobs.payloads import encode_map_jobs
+from jobs.payloads import get_job_images
+from jobs.payloads import msgpack
+from jobs.reviews import parse_review_state
+from jobs.reviews import parse_reviews
+from jobs.reviews import review_transfer_jobs
+from jobs.routes import distance_matrix
+from jobs.routes import get_route_matrix
+from jobs.routes import nearest_neighbour
+from jobs.routes import plan_route
+from jobs.routes import two_opt
+from jobs.searches import RECENT_SEARCH_LIMIT
+from jobs.searches import get_recent_searches
+from jobs.searches import record_recent_search
+from jobs.suggestions import JobSuggestionIndex
+from jobs.suggestions import MAX_SUGGESTION_LIMIT
+from jobs.suggestions import SUGGESTION_LIMIT
+from jobs.suggestions import get_job_suggestions
+from jobs.suggestions import parse_suggestion_limit
+from jobs.transfers import notify_transferred_jobs
+from jobs.transfers import transfer_jobs
+from jobs.transitions import CLOSE
+from jobs.transitions import DUPLICATE
+from jobs.transitions import InvalidTransition
+from jobs.transitions import OPEN
+from jobs.transitions import PARTIAL
+from jobs.transitions import RETURN
+from jobs.transitions import TRANSFER
+from jobs.transitions import check_transition
+from jobs.transitions import close_transfer_jobs
+from jobs.transitions import get_update_values
+from jobs.transitions import return_transfer_job
+from jobs.transitions import set_transfer_job_status
+from jobs.transitions import transfer_to_group
+from jobs.utils import parse_job_ids
+from users.models import UserRoleChoices
+from users.models.group import Group
+from users.models.job import CloseJobBill
+from users.models.job import Job
+from users.models.job import JobImage
+from users.models.job import JobLog
+from users.models.job import JobNote
+from users.models.job import TransferJob
+from users.models.notification import Notification
+from users.models.user import User
+from users.models.user import UserRole
+
+
+class JobTestCase(TestCase):
+    """
+    Users, groups and open jobs in a main group, for the job engine tests.
+
+    user is a superuser, member a plain member of the main group and outsider
+    a user of no group.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            email="inspector@example.com", user_name="inspector", is_superuser=True
+        )
+        cls.member = User.objects.create(email="member@example.com", user_name="member")
+        cls.outsider = User.objects.create(
+            email="outsider@example.com", user_name="outsider"
+        )
+        cls.group = Group.objects.create(name="main")
+        cls.other_group = Group.objects.create(name="other")
+        cls.group.member.add(cls.member)
+
+    def create_job(self, address="הרצל 12", group=None, status=OPEN):
+        job = Job.objects.create(
+            address=address,
+            status=status,
+            created_by=self.user,
+            updated_by=self.user,
+        )
+        return TransferJob.objects.create(
+            job=job,
+            group=group or self.group,
+            status=status,
+            is_parent_group=True,
+            is_active=True,
+            created_by=self.user,
+            updated_by=self.user,
+        )
+
+    def locate(self, transfer_job, latitude, longitude):
+        Job.objects.filter(id=transfer_job.job_id).update(
+            latitude=latitude, longitude=longitude
+        )
+        return refresh_job_locations([transfer_job.job_id])
+
+
+class TransitionTests(JobTestCase):
+    def test_check_transition_rejects_a_second_close(self):
+        check_transition(CLOSE, CLOSE, allow_same=True)
+        with self.assertRaises(InvalidTransition) as raised:
+            check_transition(CLOSE, CLOSE)
+        self.assertEqual(raised.exception.current, CLOSE)
+        self.assertEqual(raised.exception.detail, "המשימה הזו כבר סגורה")
+
+    def test_check_transition_rejects_a_second_return(self):
+        with self.assertRaises(InvalidTransition):
+            check_transition(RETURN, RETURN)
+
+    def test_check_transition_follows_the_allowed_edges(self):
+        check_transition(OPEN, TRANSFER)
+        check_transition(RETURN, OPEN)
+        for current, target in [
+            (CLOSE, OPEN),
+            (CLOSE, TRANSFER),
+            (DUPLICATE, TRANSFER),
+            (RETURN, PARTIAL),
+            (PARTIAL, PARTIAL),
+        ]:
+            with self.assertRaises(InvalidTransition):
+                check_transition(current, target)
+
+    def get_statements(self, queries):
+        return [
+            query["sql"]
+            for query in queries
+            if not query["sql"].startswith(("SAVEPOINT", "RELEASE SAVEPOINT"))
+        ]
+
+    def test_close_keeps_the_main_group_row_active(self):
+        transfer_job = self.create_job()
+        transferred = transfer_to_group(
+            self.user, [transfer_job.job_id], self.other_group.id
+        )[0]
+
+        close_transfer_jobs(self.user, [transfer_job.job_id])
+
+        transfer_job.refresh_from_db()
+        transferred.refresh_from_db()
+        self.assertEqual((transfer_job.status, transfer_job.is_active), (CLOSE, True))
+        self.assertEqual((transferred.status, transferred.is_active), (CLOSE, False))
+        job = Job.objects.get(id=transfer_job.job_id)
+        self.assertEqual((job.status, job.closed_by), (CLOSE, self.user))
+        self.assertTrue(
+            JobLog.objects.filter(job_id=job.id, status="Close").exists()
+        )
+
+    def test_close_updates_a_closed_job_only_when_asked(self):
+        transfer_job = self.create_job()
+        close_transfer_jobs(self.user, [transfer_job.job_id])
+        closed_at = Job.objects.get(id=transfer_job.job_id).closed_at
+
+        with self.assertRaises(InvalidTransition):
+            close_transfer_jobs(self.user, [transfer_job.job_id])
+        close_transfer_jobs(
+            self.user, [transfer_job.job_id], update=True, further_billing=True
+        )
+
+        job = Job.objects.get(id=transfer_job.job_id)
+        self.assertEqual(job.closed_at, closed_at)
+        self.assertTrue(job.further_billing)
+
+    def test_close_closes_nothing_when_one_job_is_closed(self):
+        open_job = self.create_job()
+        closed_job = self.create_job("ביאליק 3")
+        close_transfer_jobs(self.user, [closed_job.job_id])
+
+        with self.assertRaises(InvalidTransition):
+            close_transfer_jobs(self.user, [open_job.job_id, closed_job.job_id])
+
+        open_job.refresh_from_db()
+        self.assertEqual(open_job.status, OPEN)
+        self.assertEqual(Job.objects.get(id=open_job.job_id).status, OPEN)
+
+    def test_the_status_of_the_job_that_cannot_move_is_reported(self):
+        open_job = self.create_job()
+        duplicate = self.create_job("ביאליק 3", status=DUPLICATE)
+
+        with self.assertRaises(InvalidTransition) as raised:
+            transfer_to_group(
+                self.user, [open_job.job_id, duplicate.job_id], self.other_group.id
+            )
+
+        self.assertEqual(raised.exception.current, DUPLICATE)
+        self.assertEqual(Job.objects.get(id=open_job.job_id).status, OPEN)
+        self.assertFalse(TransferJob.objects.filter(group=self.other_group).exists())
+
+    def test_a_close_runs_three_statements(self):
+        transfer_job = self.create_job()
+        transfer_to_group(self.user, [transfer_job.job_id], self.other_group.id)
+
+        with CaptureQueriesContext(connection) as queries:
+            close_transfer_jobs(self.user, [transfer_job.job_id])
+
+        self.assertEqual(len(self.get_statements(queries)), 3)
+
+    def test_the_changes_of_an_update_ride_along_the_transition(self):
+        transfer_job = self.create_job()
+        transferred = transfer_to_group(
+            self.user, [transfer_job.job_id], self.other_group.id
+        )[0]
+        job = Job.objects.get(id=transfer_job.job_id)
+        job.address = "הרצל 14"
+        transferred.further_inspection = True
+        transferred.updated_by = self.member
+
+        with CaptureQueriesContext(connection) as queries:
+            set_transfer_job_status(
+                self.user,
+                transferred,
+                OPEN,
+                job_values=get_update_values(job, ["address"]),
+                transfer_job_values=get_update_values(
+                    transferred,
+                    ["further_inspection", "updated_by"],
+                    row_id=transferred.id,
+                ),
+            )
+
+        self.assertEqual(len(self.get_statements(queries)), 3)
+        self.assertEqual(Job.objects.get(id=job.id).address, "הרצל 14")
+        transfer_job.refresh_from_db()
+        transferred.refresh_from_db()
+        self.assertEqual(
+            (transferred.further_inspection, transferred.updated_by), (True, self.member)
+        )
+        self.assertEqual(
+            (transfer_job.status, transfer_job.updated_by), (PARTIAL, self.user)
+        )
+
+    def test_a_closed_job_is_not_transferred(self):
+        transfer_job = self.create_job()
+        close_transfer_jobs(self.user, [transfer_job.job_id])
+
+        with self.assertRaises(InvalidTransition) as raised:
+            transfer_to_group(self.user, [transfer_job.job_id], self.other_group.id)
+
+        self.assertEqual(raised.exception.current, CLOSE)
+        self.assertFalse(TransferJob.objects.filter(group=self.other_group).exists())
+
+    def test_close_of_an_unknown_job_raises(self):
+        with self.assertRaises(InvalidTransition) as raised:
+            close_transfer_jobs(self.user, [0])
+        self.assertIsNone(raised.exception.current)
+
+    def test_transfer_moves_the_job_and_reopens_a_known_group(self):
+        transfer_job = self.create_job()
+        transferred = transfer_to_group(
+            self.user, [transfer_job.job_id], self.other_group.id
+        )[0]
+        transfer_job.refresh_from_db()
+        self.assertEqual((transfer_job.status, transfer_job.is_active), (TRANSFER, False))
+        self.assertEqual((transferred.status, transferred.is_active), (OPEN, True))
+        self.assertEqual(Job.objects.get(id=transfer_job.job_id).status, TRANSFER)
+
+        reopened = transfer_to_group(self.user, [transfer_job.job_id], self.group.id)
+
+        self.assertEqual([row.id for row in reopened], [transfer_job.id])
+        transfer_job.refresh_from_db()
+        transferred.refresh_from_db()
+        self.assertEqual((transfer_job.status, transfer_job.is_active), (OPEN, True))
+        self.assertFalse(transferred.is_active)
+        self.assertEqual(
+            TransferJob.objects.filter(job_id=transfer_job.job_id).count(), 2
+        )
+
+    def test_return_activates_the_main_group_row(self):
+        transfer_job = self.create_job()
+        transferred = transfer_to_group(
+            self.user, [transfer_job.job_id], self.other_group.id
+        )[0]
+
+        return_transfer_job(self.user, transferred)
+
+        transfer_job.refresh_from_db()
+        transferred.refresh_from_db()
+        self.assertEqual((transfer_job.status, transfer_job.is_active), (RETURN, True))
+        self.assertEqual((transferred.status, transferred.is_active), (OPEN, False))
+        self.assertEqual(Job.objects.get(id=transfer_job.job_id).status, RETURN)
+
+    def test_a_transition_raced_by_another_one_raises(self):
+        transfer_job = self.create_job()
+        stale = TransferJob.objects.get(id=transfer_job.id)
+        TransferJob.objects.filter(id=transfer_job.id).update(status=RETURN)
+
+        with self.assertRaises(InvalidTransition) as raised:
+            return_transfer_job(self.user, stale)
+
+        self.assertIsNone(raised.exception.current)
+        self.assertEqual(raised.exception.detail, "סטטוס המשימה השתנה, נא לרענן")
+        self.assertEqual(Job.objects.get(id=transfer_job.job_id).status, OPEN)
+        self.assertFalse(JobLog.objects.filter(status="Return").exists())
+
+    def test_status_of_an_inactive_row_becomes_partial(self):
+        transfer_job = self.create_job()
+        transfer_to_group(self.user, [transfer_job.job_id], self.other_group.id)
+        transfer_job.refresh_from_db()
+
+        set_transfer_job_status(self.user, transfer_job, OPEN, update_job=False)
+
+        transfer_job.refresh_from_db()
+        self.assertEqual(transfer_job.status, PARTIAL)
+        self.assertEqual(Job.objects.get(id=transfer_job.job_id).status, TRANSFER)
+
+
+class BulkCloseTests(JobTestCase):
+    def test_parse_bill_quantities_drops_zero_rows(self):
+        quantities = parse_bill_quantities(
+            [{"bill": "1", "measurement": "2.5"}, {"bill": 2, "measurement": 0}]
+        )
+        self.assertEqual(quantities, {1: decimal.Decimal("2.5")})
+
+    def test_parse_bill_quantities_rejects_invalid_rows(self):
+        for row in (
+            {"bill": 1},
+            {"bill": "x", "measurement": 1},
+            {"bill": 1, "measurement": "-1"},
+            {"bill": 1, "measurement": "NaN"},
+        ):
+            with self.subTest(row=row), self.assertRaises(ValueError):
+                parse_bill_quantities([row])
+
+    def test_unknown_bills_are_listed(self):
+        with self.assertRaisesMessage(ValueError, "0"):
+            get_close_job_bills(
+                self.user, [self.create_job()], {0: decimal.Decimal(1)}, {}
+            )
+
+    def test_a_job_is_billed_once_whatever_its_closed_transfer_jobs(self):
+        transfer_job = self.create_job()
+        transferred = transfer_to_group(
+            self.user, [transfer_job.job_id], self.other_group.id
+        )[0]
+        other = self.create_job("ביאליק 3")
+        bill = mock.Mock(type_counting="unit", jumping_ration=1, type="work", image=None)
+        bill.name = "bill "
+
+        with mock.patch("jobs.closing.Bill.objects.in_bulk", return_value={1: bill}):
+            close_job_bills = get_close_job_bills(
+                self.user,
+                [transferred, transfer_job, other],
+                {1: decimal.Decimal(1)},
+                {transfer_job.id: {1: decimal.Decimal(3)}},
+            )
+
+        self.assertEqual(
+            [(row.job_id, row.measurement, row.name) for row in close_job_bills],
+            [(transferred.id, 3, "bill"), (other.id, 1, "bill")],
+        )
+
+    def test_close_jobs_closes_every_job(self):
+        transfer_jobs = [self.create_job(), self.create_job("ביאליק 3")]
+
+        close_jobs(self.user, transfer_jobs, [], further_billing=True)
+
+        for transfer_job in transfer_jobs:
+            transfer_job.refresh_from_db()
+            self.assertEqual(transfer_job.status, CLOSE)
+            self.assertTrue(transfer_job.further_billing)
+
+    def test_close_jobs_closes_nothing_when_one_job_is_closed(self):
+        open_job = self.create_job()
+        closed_job = self.create_job("ביאליק 3")
+        close_transfer_jobs(self.user, [closed_job.job_id])
+        close_job_bills = [
+            CloseJobBill(
+                name="bill",
+                job_id=open_job.id,
+                measurement=decimal.Decimal(1),
+                created_by=self.user,
+                updated_by=self.user,
+            )
+        ]
+
+        with self.assertRaises(InvalidTransition):
+            close_jobs(self.user, [open_job, closed_job], close_job_bills)
+
+        open_job.refresh_from_db()
+        self.assertEqual(open_job.status, OPEN)
+        self.assertFalse(CloseJobBill.objects.exists())
+
+
+class BulkReviewTests(JobTestCase):
+    def test_parse_review_state(self):
+        self.assertTrue(parse_review_state(True))
+        self.assertFalse(parse_review_state("False"))
+        with self.assertRaises(ValueError):
+            parse_review_state("yes")
+
+    def test_parse_reviews_rejects_a_missing_id(self):
+        self.assertEqual(
+            parse_reviews([{"id": "3", "is_reviewed": "true"}]), {3: True}
+        )
+        with self.assertRaises(ValueError):
+            parse_reviews([{"is_reviewed": True}])
+
+    def test_only_changed_rows_are_updated_and_logged(self):
+        reviewed = self.create_job()
+        TransferJob.objects.filter(id=reviewed.id).update(is_reviewed=True)
+        unreviewed = self.create_job("ביאליק 3")
+
+        changed = review_transfer_jobs(
+            self.user, {reviewed.id: True, unreviewed.id: True}
+        )
+
+        self.assertEqual(changed, [unreviewed.id])
+        unreviewed.refresh_from_db()
+        self.assertTrue(unreviewed.is_reviewed)
+        self.assertEqual(
+            list(
+                JobLog.objects.filter(status="Update").values_list("job_id", flat=True)
+            ),
+            [unreviewed.job_id],
+        )
+
+    def test_reviews_can_be_toggled_back(self):
+        transfer_job = self.create_job()
+        review_transfer_jobs(self.user, {transfer_job.id: True})
+
+        self.assertEqual(
+            review_transfer_jobs(self.user, {transfer_job.id: False}),
+            [transfer_job.id],
+        )
+        transfer_job.refresh_from_db()
+        self.assertFalse(transfer_job.is_reviewed)
+
+    def test_unknown_jobs_are_ignored(self):
+        self.assertEqual(review_transfer_jobs(self.user, {0: True}), [])
+
+
+class KeysetPaginationTests(JobTestCase):
+    def setUp(self):
+        self.transfer_jobs = [self.create_job(f"הרצל {number}") for number in range(5)]
+        # Equal values are told apart by the id.
+        TransferJob.objects.filter(
+            id__in=[row.id for row in self.transfer_jobs[:3]]
+        ).update(created_at=self.transfer_jobs[0].created_at)
+        self.queryset = TransferJob.objects.order_by("-created_at")
+
+    def get_all_ids(self, page_size, cursor=None):
+        ids = []
+        while True:
+            page = paginate_keyset(self.queryset, cursor, page_size)
+            ids += [row.id for row in page]
+            if not page.has_next():
+                return ids
+            cursor = page.next_cursor
+
+    def test_pages_cover_every_row_once_in_order(self):
+        expected = list(
+            self.queryset.order_by("-created_at", "-id").values_list("id", flat=True)
+        )
+        for page_size in (1, 2, 5, 10):
+            with self.subTest(page_size=page_size):
+                self.assertEqual(self.get_all_ids(page_size), expected)
+
+    def test_previous_cursor_returns_the_previous_page(self):
+        first = paginate_keyset(self.queryset, page_size=2)
+        second = paginate_keyset(self.queryset, first.next_cursor, page_size=2)
+
+        self.assertFalse(first.has_previous())
+        back = paginate_keyset(self.queryset, second.previous_cursor, page_size=2)
+
+        self.assertEqual([row.id for row in back], [row.id for row in first])
+        self.assertEqual(back.next_cursor, first.next_cursor)
+
+    def test_rows_added_while_paging_do_not_shift_the_pages(self):
+        first = paginate_keyset(self.queryset, page_size=2)
+        self.create_job("ביאליק 3")
+
+        second = paginate_keyset(self.queryset, first.next_cursor, page_size=2)
+
+        seen = [row.id for row in first] + [row.id for row in second]
+        self.assertEqual(len(set(seen)), 4)
+        self.assertTrue(set(seen) <= {row.id for row in self.transfer_jobs})
+
+    def test_every_ordering_field_is_part_of_the_position(self):
+        Job.objects.filter(
+            id__in=[row.job_id for row in self.transfer_jobs[1:4]]
+        ).update(address="ביאליק 3")
+        self.queryset = TransferJob.objects.order_by("job__address", "-created_at")
+        expected = list(
+            self.queryset.order_by("job__address", "-created_at", "id").values_list(
+                "id", flat=True
+            )
+        )
+        for page_size in (1, 2, 3):
+            with self.subTest(page_size=page_size):
+                self.assertEqual(self.get_all_ids(page_size), expected)
+
+    def test_cursor_round_trip_and_invalid_cursor(self):
+        self.assertEqual(
+            decode_cursor(encode_cursor(["a", 3], backwards=True)), (["a", 3], True)
+        )
+        invalid = ("", "not a cursor", encode_cursor([]), encode_cursor(["a", None]))
+        for cursor in invalid:
+            with self.subTest(cursor=cursor), self.assertRaises(ValueError):
+                decode_cursor(cursor)
+        with self.assertRaises(ValueError):
+            decode_cursor(encode_cursor(["a", 3]), size=3)
+
+    def test_tampered_cursors_are_invalid(self):
+        for cursor in (encode_cursor(["not a date", 1]), encode_cursor(["a", "x"])):
+            with self.subTest(cursor=cursor), self.assertRaises(ValueError):
+                paginate_keyset(self.queryset, cursor)
+
+        request = Request(APIRequestFactory().get("/", {"cursor": cursor}))
+        with self.assertRaises(NotFound):
+            KeysetPagination().paginate_queryset(self.queryset, request)
+
+
+class JobCounterTests(JobTestCase):
+    def get_counts(self):
+        counters = JobStatusCounter.objects.filter(count__gt=0).values_list(
+            "group_id", "status", "is_parent_group", "count"
+        )
+        return {
+            (group_id, status, is_parent_group): count
+            for group_id, status, is_parent_group, count in counters
+        }
+
+    def test_counts_follow_the_active_transfer_jobs(self):
+        transfer_job = self.create_job()
+        update_job_counters([transfer_job.job_id])
+        self.assertEqual(self.get_counts(), {(self.group.id, OPEN, True): 1})
+
+        transfer_to_group(self.user, [transfer_job.job_id], self.other_group.id)
+        update_job_counters([transfer_job.job_id])
+
+        self.assertEqual(self.get_counts(), {(self.other_group.id, OPEN, False): 1})
+        self.assertEqual(get_job_counts(id=self.other_group.id)["Open"], 1)
+
+    def test_counting_twice_changes_nothing(self):
+        transfer_job = self.create_job()
+        update_job_counters([transfer_job.job_id])
+        update_job_counters([transfer_job.job_id])
+        self.assertEqual(self.get_counts(), {(self.group.id, OPEN, True): 1})
+
+    def test_deleted_jobs_are_taken_out(self):
+        transfer_job = self.create_job()
+        update_job_counters([transfer_job.job_id])
+
+        Job.objects.filter(id=transfer_job.job_id).delete()
+        update_job_counters([transfer_job.job_id])
+
+        self.assertEqual(self.get_counts(), {})
+        self.assertFalse(CountedTransferJob.objects.exists())
+
+    def test_counters_never_go_below_zero(self):
+        key = (self.group.id, OPEN, True)
+        apply_counter_deltas({key: -1})
+        self.assertFalse(JobStatusCounter.objects.exists())
+
+        apply_counter_deltas({key: 1})
+        apply_counter_deltas({key: -2})
+        self.assertEqual(JobStatusCounter.objects.get().count, 0)
+
+    def test_refresh_recounts_drifted_counters(self):
+        transfer_jobs = [self.create_job(), self.create_job("ביאליק 3")]
+        update_job_counters([transfer_jobs[0].job_id])
+        JobStatusCounter.objects.update(count=7)
+
+        refresh_group_counters([self.group.id])
+
+        self.assertEqual(self.get_counts(), {(self.group.id, OPEN, True): 2})
+        self.assertEqual(CountedTransferJob.objects.count(), 2)
+        update_job_counters([row.job_id for row in transfer_jobs])
+        self.assertEqual(self.get_counts(), {(self.group.id, OPEN, True): 2})
+
+
+class IdempotentView(APIView):
+    calls = 0
+    status_code = return_status.HTTP_201_CREATED
+    committed = False
+    error = None
+
+    @method_decorator(idempotent("test"))
+    def post(self, request, *args, **kwargs):
+        IdempotentView.calls += 1
+        if self.committed:
+            mark_committed(request)
+        if self.error:
+            raise self.error
+        return Response({"calls": IdempotentView.calls}, status=self.status_code)
+
+
+class IdempotencyTests(JobTestCase):
+    def setUp(self):
+        IdempotentView.calls = 0
+        IdempotentView.status_code = return_status.HTTP_201_CREATED
+        IdempotentView.committed = False
+        IdempotentView.error = None
+
+    def post(self, data=None, key="key"):
+        headers = {"HTTP_IDEMPOTENCY_KEY": key} if key is not None else {}
+        request = APIRequestFactory().post(
+            "/jobs/", data or {"address": "הרצל 12"}, format="json", **headers
+        )
+        force_authenticate(request, user=self.user)
+        return IdempotentView.as_view()(request)
+
+    def test_a_retry_is_replayed_without_running_the_view(self):
+        first = self.post()
+        retry = self.post()
+
+        self.assertEqual(IdempotentView.calls, 1)
+        self.assertEqual((retry.status_code, retry.data), (201, first.data))
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+
+    def test_requests_without_a_key_always_run(self):
+        self.post(key=None)
+        self.post(key=None)
+        self.assertEqual(IdempotentView.calls, 2)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_a_key_reused_for_another_request_is_refused(self):
+        self.post()
+        response = self.post({"address": "ביאליק 3"})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(IdempotentView.calls, 1)
+
+    def test_a_key_still_running_is_refused(self):
+        self.post()
+        IdempotencyKey.objects.update(status_code=None)
+        self.assertEqual(self.post().status_code, 409)
+
+    def test_server_errors_are_not_stored(self):
+        IdempotentView.status_code = return_status.HTTP_503_SERVICE_UNAVAILABLE
+        self.post()
+        IdempotentView.status_code = return_status.HTTP_201_CREATED
+
+        self.assertEqual(self.post().status_code, 201)
+        self.assertEqual(IdempotentView.calls, 2)
+
+    def test_failures_after_a_commit_keep_the_key(self):
+        IdempotentView.committed = True
+        IdempotentView.status_code = return_status.HTTP_503_SERVICE_UNAVAILABLE
+        self.post()
+        self.assertEqual(self.post().status_code, 503)
+
+        IdempotentView.error = RuntimeError("notifications are down")
+        with self.assertRaises(RuntimeError):
+            self.post(key="other")
+        retry = self.post(key="other")
+
+        self.assertEqual(IdempotentView.calls, 2)
+        self.assertEqual(retry.status_code, 500)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+
+    def test_a_long_key_is_refused(self):
+        self.assertEqual(self.post(key="k" * 256).status_code, 400)
+
+    def test_expired_and_dead_keys_are_taken_over(self):
+        record, claimed = claim_idempotency_key(self.user, "test", "key", "a")
+        self.assertTrue(claimed)
+        self.assertFalse(claim_idempotency_key(self.user, "test", "key", "a")[1])
+
+        IdempotencyKey.objects.update(
+            created_at=timezone.now() - IDEMPOTENCY_LOCK_TIMEOUT * 2
+        )
+        record, claimed = claim_idempotency_key(self.user, "test", "key", "a")
+        self.assertTrue(claimed)
+
+        record.status_code = 201
+        record.save(update_fields=["status_code"])
+        IdempotencyKey.objects.update(
+            created_at=timezone.now() - IDEMPOTENCY_KEY_TTL * 2
+        )
+        self.assertTrue(claim_idempotency_key(self.user, "test", "key", "a")[1])
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+
+class BatchTests(JobTestCase):
+    def apply(self, operations, user=None):
+        request = APIRequestFactory().post("/jobs/batch/")
+        request.user = user or self.user
+        return apply_operations(request, parse_operations(operations), {})
+
+    def test_parse_operations_rejects_invalid_batches(self):
+        for value in (
+            "not json",
+            [],
+            [{"type": "note"}],
+            [{"id": 1, "type": "delete"}],
+            [{"id": 1, "type": "note"}, {"id": "1", "type": "note"}],
+        ):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                parse_operations(value)
+
+    def test_operations_are_grouped_per_job_in_order(self):
+        operations = parse_operations(
+            [
+                {"id": "a", "type": "create"},
+                {"id": "b", "type": "note", "job": 7},
+                {"id": "c", "type": "note", "job": "a"},
+            ]
+        )
+        groups = group_operations(operations)
+        self.assertEqual(
+            {key: [row["id"] for row in rows] for key, rows in groups.items()},
+            {("create", "a"): ["a", "c"], ("transfer", 7): ["b"]},
+        )
+
+    def test_notes_of_a_job_are_added_once_applied(self):
+        transfer_job = self.create_job()
+
+        results, notifications = self.apply(
+            [
+                {"id": 1, "type": "note", "job": transfer_job.id, "notes": ["a"]},
+                {"id": 2, "type": "note", "job": transfer_job.id, "notes": ["b"]},
+            ]
+        )
+
+        self.assertEqual([result["status"] for result in results], [OK, OK])
+        notes = JobNote.objects.filter(job_id=transfer_job.job_id)
+        self.assertEqual(sorted(notes.values_list("note", flat=True)), ["a", "b"])
+        self.assertEqual(notifications, [])
+
+    def test_a_failed_operation_rolls_back_its_job_only(self):
+        failing = self.create_job()
+        applied = self.create_job("ביאליק 3")
+
+        results, _ = self.apply(
+            [
+                {"id": 1, "type": "note", "job": failing.id, "notes": ["a"]},
+                {"id": 2, "type": "image", "job": failing.id, "images": ["missing"]},
+                {"id": 3, "type": "note", "job": applied.id, "notes": ["b"]},
+                {"id": 4, "type": "note", "job": "unknown", "notes": ["c"]},
+            ]
+        )
+
+        self.assertEqual(
+            [result["status"] for result in results], [FAILED, FAILED, OK, FAILED]
+        )
+        self.assertIn("images", results[1]["errors"])
+        self.assertEqual(
+            list(JobNote.objects.values_list("job_id", "note")), [(applied.job_id, "b")]
+        )
+
+    def test_unexpected_errors_fail_their_job_only(self):
+        failing = self.create_job()
+        applied = self.create_job("ביאליק 3")
+
+        def record(job_ids):
+            if failing.job_id in job_ids:
+                raise RuntimeError("the change feed is down")
+            record_job_changes(job_ids)
+
+        with mock.patch("jobs.batch.record_job_changes", side_effect=record):
+            results, _ = self.apply(
+                [
+                    {"id": 1, "type": "note", "job": failing.id, "notes": ["a"]},
+                    {"id": 2, "type": "note", "job": applied.id, "notes": ["b"]},
+                ]
+            )
+
+        self.assertEqual([result["status"] for result in results], [FAILED, OK])
+        self.assertIn("detail", results[0]["errors"])
+        note = JobNote.objects.get()
+        self.assertEqual((note.job_id, note.updated_by), (applied.job_id, self.user))
+
+    def test_partial_close_without_a_main_group_job_notifies_nobody(self):
+        transfer_job = self.create_job()
+        TransferJob.objects.filter(id=transfer_job.id).update(is_parent_group=False)
+
+        results, notifications = self.apply(
+            [
+                {
+                    "id": 1,
+                    "type": "partial_close",
+                    "job": transfer_job.id,
+                    "data": {"further_inspection": "true"},
+                }
+            ]
+        )
+
+        self.assertEqual(results[0]["status"], OK)
+        self.assertEqual(notifications, [])
+
+    def test_jobs_outside_the_user_groups_are_not_found(self):
+        transfer_job = self.create_job()
+        other = self.create_job(group=self.other_group)
+
+        results, _ = self.apply(
+            [
+                {"id": 1, "type": "note", "job": transfer_job.id, "notes": ["a"]},
+                {"id": 2, "type": "note", "job": other.id, "notes": ["b"]},
+            ],
+            user=self.member,
+        )
+
+        self.assertEqual(results[0]["status"], OK)
+        self.assertEqual(results[1]["status"], FAILED)
+        self.assertEqual(
+            list(JobNote.objects.values_list("job_id", "note")),
+            [(transfer_job.job_id, "a")],
+        )
+
+
+class JobImportTests(JobTestCase):
+    def csv_file(self, text, name="jobs.csv"):
+        return SimpleUploadedFile(name, text.encode("utf-8-sig"))
+
+    def test_valid_rows_are_created_and_errors_reported_by_row(self):
+        report = import_jobs(
+            self.user,
+            self.csv_file(
+                "Job_ID,Address,Latitude,Longitude,Priority\n"
+                "A1,הרצל 12,32.08,34.78,כן\n"
+                ",,,,\n"
+                "A2,,,,\n"
+                "A3,ביאליק 3,95,34.78,\n"
+                "A4,ביאליק 4,,,maybe\n"
+            ),
+            group_id=self.group.id,
+        )
+
+        self.assertEqual(
+            (report["total"], report["valid"], report["created"]), (4, 1, 1)
+        )
+        self.assertEqual(
+            [(error["row"], list(error["errors"])) for error in report["errors"]],
+            [(4, ["address"]), (5, ["location"]), (6, ["priority"])],
+        )
+        self.assertEqual(report["error_count"], 3)
+        transfer_job = TransferJob.objects.get(job__job_id="A1")
+        self.assertEqual(
+            (transfer_job.group_id, transfer_job.status, transfer_job.is_parent_group),
+            (self.group.id, OPEN, True),
+        )
+        self.assertTrue(transfer_job.job.priority)
+
+    def test_job_ids_must_be_unique_across_chunks_and_the_database(self):
+        self.create_job()
+        Job.objects.update(job_id="A1")
+
+        report = import_jobs(
+            self.user,
+            self.csv_file(
+                "job_id,address\nA1,הרצל 12\nA2,ביאליק 3\nA2,ביאליק 4\n"
+            ),
+            group_id=self.group.id,
+            chunk_size=1,
+        )
+
+        self.assertEqual(report["created"], 1)
+        self.assertEqual([error["row"] for error in report["errors"]], [2, 4])
+        self.assertEqual(Job.objects.filter(job_id="A2").count(), 1)
+
+    def test_rows_need_a_group_of_the_user(self):
+        report = import_jobs(
+            self.member,
+            self.csv_file(
+                f"address,group\nהרצל 12,{self.group.id}\n"
+                f"ביאליק 3,{self.other_group.id}\nהרצל 5,0\n"
+            ),
+        )
+        self.assertEqual(report["created"], 1)
+        self.assertEqual(
+            [(error["row"], list(error["errors"])) for error in report["errors"]],
+            [(3, ["group"]), (4, ["group"])],
+        )
+        transfer_job = TransferJob.objects.get()
+        self.assertEqual(
+            (transfer_job.group_id, transfer_job.updated_by),
+            (self.group.id, self.member),
+        )
+
+    def test_a_dry_run_creates_nothing(self):
+        report = import_jobs(
+            self.user,
+            self.csv_file("address\nהרצל 12\n"),
+            group_id=self.group.id,
+            dry_run=True,
+        )
+        self.assertEqual((report["valid"], report["created"]), (1, 0))
+        self.assertFalse(Job.objects.exists())
+
+    def test_unreadable_files_are_refused(self):
+        for file in (
+            self.csv_file("address\n", name="jobs.txt"),
+            self.csv_file("job_id\nA1\n"),
+        ):
+            with self.subTest(name=file.name), self.assertRaises(ImportFileError):
+                import_jobs(self.user, file, group_id=self.group.id)
+
+    def test_files_broken_past_the_first_chunk_create_nothing(self):
+        file = SimpleUploadedFile(
+            "jobs.csv", "address\nהרצל 12\n".encode() + b"\xff\xfe\n"
+        )
+        with self.assertRaises(ImportFileError):
+            import_jobs(self.user, file, group_id=self.group.id, chunk_size=1)
+        self.assertFalse(Job.objects.exists())
+
+    @unittest.skipIf(openpyxl is None, "openpyxl is not installed")
+    def test_broken_xlsx_files_are_refused(self):
+        with self.assertRaises(ImportFileError):
+            import_jobs(
+                self.user,
+                SimpleUploadedFile("jobs.xlsx", b"not a workbook"),
+                group_id=self.group.id,
+            )
+
+    @unittest.skipIf(openpyxl is None, "openpyxl is not installed")
+    def test_xlsx_files_are_imported(self):
+        workbook = openpyxl.Workbook()
+        workbook.active.append(["address", "job_id"])
+        workbook.active.append(["הרצל 12", 1234.0])
+        content = io.BytesIO()
+        workbook.save(content)
+
+        report = import_jobs(
+            self.user,
+            SimpleUploadedFile("jobs.xlsx", content.getvalue()),
+            group_id=self.group.id,
+        )
+
+        self.assertEqual(report["created"], 1)
+        self.assertTrue(Job.objects.filter(job_id="1234").exists())
+
+
+class NoteBackfill(Backfill):
+    """One note per job, failing on fail_job_id to interrupt the run."""
+
+    name = "test_notes"
+    fail_job_id = None
+
+    def get_queryset(self):
+        return Job.objects.all()
+
+    def build(self, jobs):
+        notes = []
+        for job in jobs:
+            if job.id == self.fail_job_id:
+                raise RuntimeError("interrupted")
+            notes.append(JobNote(job_id=job.id, note="backfill"))
+        return notes
+
+
+class BackfillTests(JobTestCase):
+    def setUp(self):
+        self.job_ids = [
+            self.create_job(f"הרצל {number}").job_id for number in range(5)
+        ]
+
+    def test_every_row_is_processed_once(self):
+        self.assertEqual(NoteBackfill(chunk_size=2).run(), (5, 5))
+        self.assertEqual(
+            sorted(JobNote.objects.values_list("job_id", flat=True)), self.job_ids
+        )
+        self.assertFalse(
+            BackfillCheckpoint.objects.filter(completed_at__isnull=True).exists()
+        )
+
+    def test_an_interrupted_run_resumes_after_the_last_chunk(self):
+        backfill = NoteBackfill(chunk_size=2)
+        backfill.fail_job_id = self.job_ids[3]
+        with self.assertRaises(RuntimeError):
+            backfill.run()
+        self.assertEqual(JobNote.objects.count(), 2)
+
+        backfill.fail_job_id = None
+        self.assertEqual(backfill.run(), (3, 3))
+
+        self.assertEqual(
+            sorted(JobNote.objects.values_list("job_id", flat=True)), self.job_ids
+        )
+        self.assertEqual(NoteBackfill().run(), (0, 0))
+
+    def test_ranges_of_an_earlier_run_are_kept(self):
+        backfill = NoteBackfill(chunk_size=10)
+        self.assertEqual(len(backfill.get_checkpoints(workers=2)), 2)
+
+        self.assertEqual(backfill.run(workers=1), (5, 5))
+        self.assertEqual(BackfillCheckpoint.objects.count(), 2)
+
+    def test_restart_runs_again(self):
+        NoteBackfill().run()
+        self.assertEqual(NoteBackfill().run(restart=True), (5, 5))
+        self.assertEqual(JobNote.objects.count(), 10)
+
+    def test_an_empty_table_does_nothing(self):
+        Job.objects.all().delete()
+        self.assertEqual(NoteBackfill().run(), (0, 0))
+        self.assertFalse(BackfillCheckpoint.objects.exists())
+
+
+class RecentSearchTests(JobTestCase):
+    def get_searched_ids(self):
+        return [search.transfer_job_id for search in get_recent_searches(self.user)]
+
+    def test_the_first_search_inserts_the_slots(self):
+        transfer_job = self.create_job()
+
+        search = record_recent_search(self.user, transfer_job.id)
+
+        self.assertEqual(search.transfer_job, transfer_job)
+        self.assertEqual(
+            RecentJobSearch.objects.filter(user=self.user).count(), RECENT_SEARCH_LIMIT
+        )
+        self.assertEqual(self.get_searched_ids(), [transfer_job.id])
+
+    def test_searching_a_job_again_moves_it_to_the_top(self):
+        first, second = self.create_job(), self.create_job("ביאליק 3")
+        record_recent_search(self.user, first.id)
+        record_recent_search(self.user, second.id)
+
+        record_recent_search(self.user, first.id)
+
+        self.assertEqual(self.get_searched_ids(), [first.id, second.id])
+
+    def test_the_oldest_search_is_replaced_once_the_ring_is_full(self):
+        transfer_jobs = [
+            self.create_job(f"הרצל {number}")
+            for number in range(RECENT_SEARCH_LIMIT + 1)
+        ]
+        for transfer_job in transfer_jobs:
+            record_recent_search(self.user, transfer_job.id)
+
+        self.assertEqual(
+            self.get_searched_ids(), [row.id for row in reversed(transfer_jobs[1:])]
+        )
+        self.assertEqual(RecentJobSearch.objects.count(), RECENT_SEARCH_LIMIT)
+
+    def test_slots_inserted_by_a_concurrent_first_search_are_used(self):
+        RecentJobSearch.objects.bulk_create(
+            [
+                RecentJobSearch(user=self.user, slot=slot)
+                for slot in range(RECENT_SEARCH_LIMIT)
+            ]
+        )
+        transfer_job = self.create_job()
+
+        record_recent_search(self.user, transfer_job.id)
+
+        self.assertEqual(self.get_searched_ids(), [transfer_job.id])
+        self.assertEqual(RecentJobSearch.objects.count(), RECENT_SEARCH_LIMIT)
+
+    def test_closed_jobs_are_not_listed(self):
+        transfer_job = self.create_job()
+        record_recent_search(self.user, transfer_job.id)
+
+        close_transfer_jobs(self.user, [transfer_job.job_id])
+
+        self.assertEqual(self.get_searched_ids(), [])
+
+
+class JobSuggestionTests(JobTestCase):
+    def setUp(self):
+        self.transfer_job = self.create_job("רחוב הרצל 12")
+        Job.objects.filter(id=self.transfer_job.job_id).update(job_id="AB123")
+        self.other = self.create_job("הרצליה 5", group=self.other_group)
+        self.index = JobSuggestionIndex()
+
+    def get_ids(self, prefix, **kwargs):
+        return [entry["id"] for entry in self.index.search(prefix, **kwargs)]
+
+    def test_prefixes_of_job_ids_and_address_words_match(self):
+        self.assertEqual(self.get_ids("ab1"), [self.transfer_job.id])
+        self.assertEqual(
+            sorted(self.get_ids("הרצל")),
+            sorted([self.transfer_job.id, self.other.id]),
+        )
+        self.assertEqual(self.get_ids("רחוב הרצל"), [self.transfer_job.id])
+
+    def test_short_prefixes_group_and_limit(self):
+        self.assertEqual(self.get_ids("ה"), [])
+        self.assertEqual(
+            self.get_ids("הרצל", group_ids={self.group.id}), [self.transfer_job.id]
+        )
+        self.assertEqual(len(self.get_ids("הרצל", limit=1)), 1)
+
+    def test_parse_suggestion_limit(self):
+        self.assertEqual(parse_suggestion_limit(None), SUGGESTION_LIMIT)
+        self.assertEqual(parse_suggestion_limit("x"), SUGGESTION_LIMIT)
+        self.assertEqual(parse_suggestion_limit("0"), 1)
+        self.assertEqual(parse_suggestion_limit("1000"), MAX_SUGGESTION_LIMIT)
+
+    def test_a_stale_index_applies_the_changed_jobs(self):
+        self.index.search("הרצל")
+        created = self.create_job("הרצל 40")
+        Job.objects.filter(id=self.other.job_id).update(address="ביאליק 3")
+        record_job_changes([created.job_id, self.other.job_id])
+        self.assertNotIn(created.id, self.get_ids("הרצל"))
+
+        self.index.built_at -= self.index.ttl + 1
+        with mock.patch("jobs.suggestions.threading.Thread") as thread:
+            self.assertEqual(
+                sorted(self.get_ids("הרצל")), sorted([self.transfer_job.id, created.id])
+            )
+        thread.assert_not_called()
+        self.assertEqual(self.get_ids("ביאליק"), [self.other.id])
+        self.assertTrue(self.index.lock.acquire(blocking=False))
+
+    def test_a_pruned_feed_rebuilds_the_index_once_in_the_background(self):
+        self.index.search("הרצל")
+        created = self.create_job("הרצל 40")
+        record_job_changes([created.job_id])
+        record_job_changes([created.job_id])
+        JobChange.objects.order_by("id").first().delete()
+        self.index.built_at -= self.index.ttl + 1
+
+        with mock.patch("jobs.suggestions.threading.Thread") as thread:
+            self.assertNotIn(created.id, self.get_ids("הרצל"))
+            self.assertNotIn(created.id, self.get_ids("הרצל"))
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once()
+
+        # The rebuild thread closes its own connection, not the test one.
+        with mock.patch("jobs.suggestions.connection"):
+            self.index.rebuild_in_background()
+        self.assertIn(created.id, self.get_ids("הרצל"))
+        self.assertTrue(self.index.lock.acquire(blocking=False))
+
+    def test_users_get_the_suggestions_of_their_groups(self):
+        with mock.patch("jobs.suggestions.job_suggestion_index", self.index):
+            self.assertEqual(get_job_suggestions(self.outsider, "הרצל"), [])
+            self.assertEqual(
+                [entry["id"] for entry in get_job_suggestions(self.member, "הרצל")],
+                [self.transfer_job.id],
+            )
+            self.other_group.is_archive = True
+            self.other_group.save()
+            self.assertEqual(
+                [entry["id"] for entry in get_job_suggestions(self.user, "הרצל")],
+                [self.transfer_job.id],
+            )
+
+
+class CoverImageTests(JobTestCase):
+    def setUp(self):
+        self.job = self.create_job().job
+
+    def add_image(self, name):
+        return JobImage.objects.create(
+            job=self.job, image=name, created_by=self.user, updated_by=self.user
+        )
+
+    def get_cover(self):
+        return JobCoverImage.objects.filter(job=self.job).first()
+
+    def test_the_first_displayable_image_is_the_cover(self):
+        self.add_image("plan.pdf")
+        image = self.add_image("front.JPG")
+        self.add_image("back.png")
+
+        refresh_cover_images([self.job.id])
+        refresh_cover_images([self.job.id])
+
+        cover = self.get_cover()
+        self.assertEqual((cover.job_image, cover.image), (image, "front.JPG"))
+        self.assertEqual(JobCoverImage.objects.count(), 1)
+
+    def test_the_cover_moves_to_the_next_image_when_deleted(self):
+        first, second = self.add_image("a.jpg"), self.add_image("b.jpeg")
+        refresh_cover_images([self.job.id])
+
+        delete_job_images([first.id])
+        self.assertEqual(self.get_cover().job_image, second)
+
+        delete_job_images([second.id])
+        self.assertIsNone(self.get_cover())
+
+    def test_jobs_without_images_have_no_cover(self):
+        self.add_image("plan.pdf")
+        refresh_cover_images([self.job.id])
+        self.assertIsNone(self.get_cover())
+        refresh_cover_images([])
+
+
+class MapJobTests(JobTestCase):
+    # Around Tel Aviv, the outside job being in Haifa.
+    BBOX = (32.0, 34.7, 32.2, 34.9)
+
+    def setUp(self):
+        self.inside = self.create_job("הרצל 12")
+        self.locate(self.inside, 32.08, 34.78)
+        self.outside = self.create_job("הנמל 1")
+        self.locate(self.outside, 32.82, 34.99)
+
+    def get_marker_ids(self, bbox=BBOX, user=None, **kwargs):
+        markers, truncated = get_map_markers(user or self.user, bbox, **kwargs)
+        return [marker["id"] for marker in markers], truncated
+
+    def test_locations_follow_the_job_coordinates(self):
+        location = JobLocation.objects.get(job_id=self.inside.job_id)
+        self.assertEqual((location.latitude, location.longitude), (32.08, 34.78))
+
+        self.locate(self.inside, 95, 34.78)
+
+        self.assertFalse(JobLocation.objects.filter(job_id=self.inside.job_id).exists())
+
+    def test_only_the_jobs_of_the_viewport_are_returned(self):
+        self.assertEqual(self.get_marker_ids(), ([self.inside.id], False))
+        self.assertEqual(self.get_marker_ids(group_id=self.other_group.id), ([], False))
+
+    def test_markers_are_truncated_at_the_limit(self):
+        self.locate(self.outside, 32.1, 34.8)
+        ids, truncated = self.get_marker_ids(limit=1)
+        self.assertEqual(len(ids), 1)
+        self.assertTrue(truncated)
+
+    def test_a_viewport_across_the_antimeridian(self):
+        self.locate(self.inside, 0, 179.5)
+        self.locate(self.outside, 0, -179.5)
+        ids, _ = self.get_marker_ids((-1, 179, 1, -179))
+        self.assertEqual(sorted(ids), sorted([self.inside.id, self.outside.id]))
+
+    def test_users_only_see_their_groups(self):
+        self.assertEqual(self.get_marker_ids(user=self.outsider), ([], False))
+        ids, _ = self.get_marker_ids(user=self.member)
+        self.assertIn(self.inside.id, ids)
+
+    def test_parse_bbox_and_zoom(self):
+        self.assertEqual(parse_bbox("1", "2", "3", "4"), (1, 2, 3, 4))
+        for bbox in (
+            ("3", "2", "1", "4"),
+            ("1", "2", "91", "4"),
+            ("1", None, "3", "4"),
+        ):
+            with self.subTest(bbox=bbox), self.assertRaises(ValueError):
+                parse_bbox(*bbox)
+        self.assertIsNone(parse_zoom(""))
+        with self.assertRaises(ValueError):
+            parse_zoom("23")
+
+    def test_markers_are_returned_past_the_cluster_zooms(self):
+        data = get_map_data(self.user, self.BBOX, zoom=18)
+        self.assertEqual([marker["id"] for marker in data["results"]], [self.inside.id])
+        self.assertEqual(data["clusters"], [])
+
+
+class JobClusterTests(JobTestCase):
+    BBOX = (31.0, 34.0, 33.5, 36.0)
+
+    def setUp(self):
+        self.transfer_jobs = [self.create_job(), self.create_job("ביאליק 3")]
+        self.locate(self.transfer_jobs[0], 32.08, 34.78)
+        self.locate(self.transfer_jobs[1], 32.09, 34.79)
+        update_job_clusters([row.job_id for row in self.transfer_jobs])
+
+    def get_counts(self, zoom):
+        return sorted(
+            cluster["count"] for cluster in get_clusters(self.BBOX, zoom)
+        )
+
+    def get_stored_clusters(self):
+        return sorted(
+            JobCluster.objects.filter(count__gt=0).values_list(
+                "group_id", "zoom", "cell_x", "cell_y", "count"
+            )
+        )
+
+    def test_close_jobs_share_a_cluster_with_their_centroid(self):
+        clusters = get_clusters(self.BBOX, 8)
+        self.assertEqual(len(clusters), 1)
+        self.assertEqual(clusters[0]["count"], 2)
+        self.assertAlmostEqual(clusters[0]["lat"], 32.085)
+        self.assertAlmostEqual(clusters[0]["lng"], 34.785)
+        self.assertEqual(
+            get_map_data(self.user, self.BBOX, zoom=8)["clusters"], clusters
+        )
+
+    def test_a_moved_job_leaves_its_previous_cluster(self):
+        moved = self.transfer_jobs[1]
+        self.locate(moved, 32.82, 34.99)
+        update_job_clusters([moved.job_id])
+
+        self.assertEqual(self.get_counts(12), [1, 1])
+        incremental = self.get_stored_clusters()
+        rebuild_group_clusters([self.group.id])
+        self.assertEqual(self.get_stored_clusters(), incremental)
+
+    def test_a_transfer_costs_fewer_statements_than_zooms(self):
+        job_id = self.transfer_jobs[0].job_id
+        TransferJob.objects.filter(job_id=job_id).update(group=self.other_group)
+        with CaptureQueriesContext(connection) as queries:
+            update_job_clusters([job_id])
+
+        self.assertLess(len(queries), len(CLUSTER_ZOOMS))
+        for group in (self.group, self.other_group):
+            clusters = get_clusters(self.BBOX, 8, {group.id})
+            self.assertEqual([cluster["count"] for cluster in clusters], [1])
+
+    def test_deleted_jobs_are_taken_out(self):
+        job_id = self.transfer_jobs[0].job_id
+        Job.objects.filter(id=job_id).delete()
+        update_job_clusters([job_id])
+
+        self.assertEqual(self.get_counts(8), [1])
+        self.assertFalse(ClusteredTransferJob.objects.filter(job_id=job_id).exists())
+
+    def test_closed_jobs_are_not_clustered(self):
+        close_transfer_jobs(self.user, [self.transfer_jobs[0].job_id])
+        update_job_clusters([self.transfer_jobs[0].job_id])
+        self.assertEqual(self.get_counts(8), [1])
+
+    def test_clusters_are_filtered_by_group(self):
+        self.assertEqual(get_clusters(self.BBOX, 8, {self.other_group.id}), [])
+
+
+class NearbyJobTests(JobTestCase):
+    def setUp(self):
+        self.near = self.create_job("הרצל 12")
+        self.locate(self.near, 32.0800, 34.7800)
+        self.nearer = self.create_job("הרצל 14")
+        self.locate(self.nearer, 32.0801, 34.7801)
+        self.far = self.create_job("ביאליק 3")
+        self.locate(self.far, 32.0900, 34.7800)
+
+    def test_jobs_within_the_radius_closest_first(self):
+        nearby = get_nearby_jobs(self.user, 32.08015, 34.78015, radius=200)
+
+        self.assertEqual(
+            [job["id"] for job in nearby], [self.nearer.id, self.near.id]
+        )
+        self.assertLess(nearby[0]["distance"], nearby[1]["distance"])
+        self.assertEqual(
+            len(get_nearby_jobs(self.user, 32.08015, 34.78015, radius=2000)), 3
+        )
+
+    def test_limit_status_and_group(self):
+        self.assertEqual(
+            len(get_nearby_jobs(self.user, 32.08, 34.78, radius=2000, limit=1)), 1
+        )
+        self.assertEqual(
+            get_nearby_jobs(self.user, 32.08, 34.78, statuses=[CLOSE]), []
+        )
+        self.assertEqual(
+            get_nearby_jobs(self.user, 32.08, 34.78, group_ids=[self.other_group.id]),
+            [],
+        )
+
+    def test_parse_nearby_params(self):
+        params = parse_nearby_params(
+            {"lat": "32.08", "lng": "34.78", "limit": "0", "groups": "1,2"}
+        )
+        self.assertEqual(
+            params,
+            {
+                "latitude": 32.08,
+                "longitude": 34.78,
+                "radius": 200,
+                "limit": 1,
+                "group_ids": [1, 2],
+            },
+        )
+        for invalid in (
+            {"lat": "32.08"},
+            {"lat": "32.08", "lng": "34.78", "radius": "0"},
+            {"lat": "32.08", "lng": "34.78", "radius": "10000"},
+            {"lat": "32.08", "lng": "34.78", "status": "Unknown"},
+            {"lat": "32.08", "lng": "34.78", "groups": "a"},
+        ):
+            with self.subTest(params=invalid), self.assertRaises(ValueError):
+                parse_nearby_params(invalid)
+
+
+class DuplicateJobTests(JobTestCase):
+    def setUp(self):
+        self.same = self.create_job("רחוב הרצל 12")
+        self.locate(self.same, 32.0800, 34.7800)
+        self.other_street = self.create_job("ביאליק 12")
+        self.locate(self.other_street, 32.0801, 34.7801)
+
+    def get_ids(self, address, **kwargs):
+        return [
+            job["id"] for job in find_duplicate_candidates(self.user, address, **kwargs)
+        ]
+
+    def test_addresses_are_compared_without_stop_words(self):
+        self.assertEqual(normalize_address("רח' הרצל, 12"), "12 הרצל")
+        self.assertEqual(address_similarity("הרצל 12", "רחוב הרצל 12"), 1)
+        self.assertEqual(address_similarity("", "הרצל 12"), 0)
+
+    def test_the_same_address_nearby_ranks_first(self):
+        candidates = find_duplicate_candidates(
+            self.user, "הרצל 12", latitude=32.0800, longitude=34.7800
+        )
+        self.assertEqual(candidates[0]["id"], self.same.id)
+        self.assertEqual(candidates[0]["score"], 1)
+
+    def test_jobs_on_the_same_street_are_found_without_coordinates(self):
+        self.assertEqual(self.get_ids("הרצל 12"), [self.same.id])
+        self.assertEqual(self.get_ids("הרצל 40"), [])
+
+    def test_the_job_itself_and_closed_jobs_are_left_out(self):
+        self.assertEqual(
+            self.get_ids("הרצל 12", exclude_job_id=self.same.job_id), []
+        )
+        close_transfer_jobs(self.user, [self.same.job_id])
+        self.assertEqual(self.get_ids("הרצל 12"), [])
+
+    def test_jobs_created_by_other_workers_are_found_at_once(self):
+        created = self.create_job("הרצל 12א")
+        self.assertIn(created.id, self.get_ids("הרצל 12"))
+
+
+class MapPayloadTests(SimpleTestCase):
+    def get_job(self, id, latitude, status="Open", **fields):
+        return {
+            "id": id,
+            "job__id": id + 100,
+            "job__latitude": latitude,
+            "job__longitude": "34.78",
+            "created_at": datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc),
+            "status": status,
+            "job__priority": False,
+            "job__address": "הרצל 12",
+            "job__description": None,
+            **fields,
+        }
+
+    def test_delta_encoding_round_trips_and_keeps_nulls(self):
+        values = [5, 7, None, 6, 6]
+        self.assertEqual(delta_encode(values), [5, 2, None, -1, 0])
+        self.assertEqual(delta_decode(delta_encode(values)), values)
+
+    def test_jobs_are_encoded_as_columns(self):
+        payload = encode_map_jobs(
+            [
+                self.get_job(10, "32.080001"),
+                self.get_job(12, "invalid", status="Transfer", job__priority=True),
+                self.get_job(13, 32.08),
+            ],
+            {110: ["a.jpg"]},
+        )
+
+        self.assertEqual(payload["count"], 3)
+        self.assertEqual(delta_decode(payload["id"]), [10, 12, 13])
+        self.assertEqual(delta_decode(payload["lat"]), [32080001, None, 32080000])
+        self.assertEqual(payload["statuses"], ["Open", "Transfer"])
+        self.assertEqual(payload["status"], [0, 1, 0])
+        self.assertEqual(payload["priority"], [0, 1, 0])
+        self.assertEqual(payload["description"], ["", "", ""])
+        self.assertEqual(payload["images"], [["a.jpg"], [], []])
+
+    def test_json_unless_msgpack_is_asked_for(self):
+        request = RequestFactory().get("/", HTTP_ACCEPT=MSGPACK_CONTENT_TYPE)
+        response = compact_response(RequestFactory().get("/"), {"count": 0})
+        self.assertEqual(response["Content-Type"], "application/json")
+        if msgpack is None:
+            response = compact_response(request, {"count": 0})
+            self.assertEqual(response["Content-Type"], "application/json")
+        else:
+            response = compact_response(request, {"count": 0})
+            self.assertEqual(msgpack.unpackb(response.content), {"count": 0})
+
+
+class JobImagePayloadTests(JobTestCase):
+    def test_displayable_images_are_grouped_per_job_in_upload_order(self):
+        job = self.create_job().job
+        for name in ("b.png", "plan.pdf", "a.jpg"):
+            JobImage.objects.create(
+                job=job, image=name, created_by=self.user, updated_by=self.user
+            )
+        self.assertEqual(get_job_images([job.id]), {job.id: ["b.png", "a.jpg"]})
+
+
+class RoutePlanTests(JobTestCase):
+    # Stops along one street, 0.001 degrees (about 110 m) apart.
+    LATITUDES = [32.080, 32.083, 32.081, 32.084, 32.082]
+
+    def setUp(self):
+        self.transfer_jobs = []
+        for number, latitude in enumerate(self.LATITUDES):
+            transfer_job = self.create_job(f"הרצל {number}")
+            self.locate(transfer_job, latitude, 34.78)
+            self.transfer_jobs.append(transfer_job)
+        self.ids_by_latitude = [
+            row.id
+            for _, row in sorted(zip(self.LATITUDES, self.transfer_jobs))
+        ]
+
+    def test_parse_job_ids(self):
+        self.assertEqual(parse_job_ids("3, 1,3,"), [3, 1])
+        self.assertEqual(parse_job_ids([2, "2"]), [2])
+        with self.assertRaises(ValueError):
+            parse_job_ids("1,a")
+
+    def test_two_opt_undoes_crossings(self):
+        matrix = get_route_matrix([(1, 0, 0), (2, 0, 2), (3, 0, 1), (4, 0, 3)])
+        self.assertEqual(two_opt([0, 2, 1, 3], matrix), [0, 2, 1, 3])
+        self.assertEqual(two_opt([0, 1, 2, 3], matrix), [0, 2, 1, 3])
+        self.assertEqual(nearest_neighbour(matrix), [0, 2, 1, 3])
+
+    def test_the_route_follows_the_street_from_the_start(self):
+        route = plan_route(
+            self.user,
+            [row.id for row in self.transfer_jobs],
+            latitude=32.079,
+            longitude=34.78,
+        )
+
+        self.assertEqual(route["order"], self.ids_by_latitude)
+        self.assertAlmostEqual(
+            route["total_distance"],
+            sum(stop["distance"] for stop in route["stops"]),
+            places=0,
+        )
+        self.assertEqual(route["skipped"], [])
+
+    def test_the_matrix_is_reused_from_another_start_and_order(self):
+        job_ids = [row.id for row in self.transfer_jobs]
+        distance_matrix.cache_clear()
+
+        first = plan_route(self.user, job_ids, latitude=32.079, longitude=34.78)
+        second = plan_route(self.user, job_ids[::-1], latitude=32.085, longitude=34.78)
+
+        self.assertEqual(distance_matrix.cache_info().hits, 1)
+        self.assertEqual(first["order"], self.ids_by_latitude)
+        self.assertEqual(second["order"], self.ids_by_latitude[::-1])
+
+    def test_unknown_and_unlocated_jobs_are_skipped(self):
+        unlocated = self.create_job("ביאליק 3")
+
+        route = plan_route(self.user, [self.transfer_jobs[0].id, unlocated.id, 0])
+
+        self.assertEqual(route["order"], [self.transfer_jobs[0].id])
+        self.assertEqual(route["total_distance"], 0)
+        self.assertEqual(route["skipped"], [unlocated.id, 0])
+
+
+@conditional_job_view(group_scope_from_query)
+def conditional_view(request):
+    return HttpResponse("jobs")
+
+
+class ConditionalGetTests(JobTestCase):
+    def setUp(self):
+        self.transfer_job = self.create_job()
+        record_job_changes([self.transfer_job.job_id])
+
+    def get(self, user=None, **headers):
+        request = RequestFactory().get("/jobs/", **headers)
+        request.user = user or self.member
+        return conditional_view(request)
+
+    def test_unchanged_jobs_are_not_sent_again(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Last-Modified", response)
+
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+    def test_a_job_change_changes_the_etag(self):
+        etag = self.get()["ETag"]
+
+        record_job_changes([self.transfer_job.job_id])
+
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_changes_of_other_groups_keep_the_etag(self):
+        etag = self.get()["ETag"]
+        superuser_etag = self.get(self.user)["ETag"]
+        archived = Group.objects.create(name="archived", is_archive=True)
+
+        record_job_changes([self.create_job(group=archived).job_id])
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(
+            self.get(self.user, HTTP_IF_NONE_MATCH=superuser_etag).status_code, 304
+        )
+
+        record_job_changes([self.create_job(group=self.other_group).job_id])
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(
+            self.get(self.user, HTTP_IF_NONE_MATCH=superuser_etag).status_code, 200
+        )
+
+    def test_etags_cover_the_user_and_the_stamps_asked_for(self):
+        request = RequestFactory().get("/jobs/")
+        request.user = self.user
+        group_etag = get_etag(request, JobChangeStamp.GROUP, [self.group.id])
+        other_etag = get_etag(request, JobChangeStamp.GROUP, [self.other_group.id])
+
+        self.assertNotEqual(group_etag, other_etag)
+        request.user = self.member
+        self.assertNotEqual(
+            get_etag(request, JobChangeStamp.GROUP, [self.group.id]), group_etag
+        )
+
+    def test_first_bumps_of_an_object_are_all_counted(self):
+        now = timezone.now()
+        bump_change_stamps(JobChangeStamp.JOB, [0], now)
+        bump_change_stamps(JobChangeStamp.JOB, [0, 0], now)
+        self.assertEqual(
+            JobChangeStamp.objects.get(scope=JobChangeStamp.JOB, object_id=0).version, 2
+        )
+
+
+class DeltaSyncTests(JobTestCase):
+    def setUp(self):
+        self.since = get_sync_heads(self.user)
+        self.transfer_job = self.create_job()
+        record_job_changes([self.transfer_job.job_id])
+
+    def get_kinds(self, since=None, user=None, **kwargs):
+        changes = get_job_changes(user or self.user, since or self.since, **kwargs)
+        return [(change["job_id"], change["kind"]) for change in changes["changes"]]
+
+    def test_changes_after_the_cursor_are_returned(self):
+        job_id = self.transfer_job.job_id
+        self.assertEqual(self.get_kinds(), [(job_id, JobChange.CREATED)])
+
+        cursor = get_job_changes(self.user, self.since)["cursor"]
+        record_job_changes([job_id])
+        self.assertEqual(self.get_kinds(cursor), [(job_id, JobChange.UPDATED)])
+
+    def test_changes_of_a_job_are_collapsed_into_the_latest(self):
+        close_transfer_jobs(self.user, [self.transfer_job.job_id])
+        record_job_changes([self.transfer_job.job_id])
+
+        self.assertEqual(
+            self.get_kinds(), [(self.transfer_job.job_id, JobChange.CLOSED)]
+        )
+
+    def test_deleted_jobs_are_reported_in_their_groups(self):
+        job_id = self.transfer_job.job_id
+        Job.objects.filter(id=job_id).delete()
+        record_job_changes(group_ids=[self.group.id], deleted_job_ids=[job_id])
+        self.assertEqual(self.get_kinds()[-1], (job_id, JobChange.DELETED))
+
+    def test_pages_follow_has_more(self):
+        record_job_changes([self.create_job("ביאליק 3").job_id])
+
+        page = get_job_changes(self.user, self.since, limit=1)
+
+        self.assertTrue(page["has_more"])
+        self.assertEqual(len(page["changes"]), 1)
+        self.assertEqual(len(get_job_changes(self.user, page["cursor"])["changes"]), 1)
+
+    def test_notifications_of_the_user_are_returned(self):
+        notification = Notification.objects.create(
+            sender=self.user,
+            receiver=self.user,
+            message="משימה זו נסגרה",
+            job=self.transfer_job,
+            notification_type="Close",
+        )
+        changes = get_job_changes(self.user, self.since)
+        self.assertEqual(changes["notifications"], [notification])
+
+    def test_users_only_get_the_changes_of_their_groups(self):
+        self.assertEqual(self.get_kinds(user=self.outsider), [])
+        self.assertEqual(
+            self.get_kinds(user=self.member),
+            [(self.transfer_job.job_id, JobChange.CREATED)],
+        )
+
+    def test_expired_and_invalid_cursors_raise(self):
+        record_job_changes([self.transfer_job.job_id])
+        JobChange.objects.order_by("id").first().delete()
+        with self.assertRaises(CursorExpired):
+            get_job_changes(self.user, self.since)
+        with self.assertRaises(ValueError):
+            get_job_changes(self.user, "not-a-cursor")
+
+
+class JobEventTests(JobTestCase):
+    def setUp(self):
+        self.cursor = get_job_event_batch(self.user)["cursor"]
+        self.transfer_job = self.create_job()
+
+    def test_without_a_cursor_only_the_current_one_is_returned(self):
+        record_job_changes([self.transfer_job.job_id])
+        batch = get_job_event_batch(self.user)
+        self.assertEqual((batch["events"], batch["has_more"]), ([], False))
+        self.assertNotEqual(batch["cursor"], self.cursor)
+
+    def test_job_changes_become_events(self):
+        close_transfer_jobs(self.user, [self.transfer_job.job_id])
+        record_job_changes([self.transfer_job.job_id])
+
+        batch = get_job_event_batch(self.user, self.cursor)
+
+        self.assertEqual(
+            batch["events"],
+            [
+                {
+                    "event": "job",
+                    "data": {
+                        "id": self.transfer_job.id,
+                        "job": self.transfer_job.job_id,
+                        "group": self.group.id,
+                        "kind": JobChange.CLOSED,
+                        "status": CLOSE,
+                        "is_active": True,
+                        "address": "הרצל 12",
+                    },
+                }
+            ],
+        )
+        self.assertEqual(get_job_event_batch(self.user, batch["cursor"])["events"], [])
+
+    def test_deleted_jobs_are_inactive(self):
+        job_id = self.transfer_job.job_id
+        record_job_changes([job_id])
+        Job.objects.filter(id=job_id).delete()
+        record_job_changes(group_ids=[self.group.id], deleted_job_ids=[job_id])
+
+        events = get_job_event_batch(self.user, self.cursor)["events"]
+
+        self.assertEqual(events[-1]["data"]["kind"], JobChange.DELETED)
+        self.assertFalse(events[-1]["data"]["is_active"])
+
+    def test_notifications_become_events(self):
+        Notification.objects.create(
+            sender=self.user,
+            receiver=self.user,
+            message="משימה זו נסגרה",
+            job=self.transfer_job,
+            notification_type="Close",
+        )
+        events = get_job_event_batch(self.user, self.cursor)["events"]
+        self.assertEqual(
+            [event["data"]["type"] for event in events], ["Close"]
+        )
+
+    def test_an_invalid_cursor_starts_over(self):
+        record_job_changes([self.transfer_job.job_id])
+        batch = get_job_event_batch(self.user, "invalid")
+        self.assertEqual(batch["events"], [])
+        self.assertEqual(batch["cursor"], get_sync_heads(self.user))
+
+
+class JobUpdateTests(JobTestCase):
+    def setUp(self):
+        self.transfer_job = self.create_job()
+        self.note = JobNote.objects.create(
+            job=self.transfer_job.job, note="ישן", created_by=self.user
+        )
+
+    def patch(self, data, pk=None):
+        request = APIRequestFactory().patch(
+            f"/jobs/{pk or self.transfer_job.id}/",
+            {
+                "address": "הרצל 14",
+                "latitude": "32.08",
+                "longitude": "34.78",
+                "group": self.group.id,
+                **data,
+            },
+            format="multipart",
+        )
+        force_authenticate(request, user=self.user)
+        return JobCreateView.as_view({"patch": "partial_update"})(
+            request, pk=pk or self.transfer_job.id
+        )
+
+    def test_an_update_writes_the_job_notes_and_log(self):
+        response = self.patch(
+            {
+                "status": OPEN,
+                "notes": ["א", "ב"],
+                "updated_notes": json.dumps({self.note.id: "חדש"}),
+            }
+        )
+
+        self.assertEqual(response.status_code, 201)
+        job = Job.objects.get(id=self.transfer_job.job_id)
+        self.assertEqual((job.address, job.status), ("הרצל 14", OPEN))
+        notes = JobNote.objects.filter(job=job).values_list("note", flat=True)
+        self.assertEqual(sorted(notes), sorted(["חדש", "א", "ב"]))
+        self.assertTrue(JobLog.objects.filter(job=job, status="Update").exists())
+        self.assertTrue(JobLocation.objects.filter(job=job).exists())
+
+    def test_a_close_closes_the_job_once(self):
+        self.assertEqual(self.patch({"status": CLOSE}).status_code, 201)
+        self.transfer_job.refresh_from_db()
+        self.assertEqual(self.transfer_job.status, CLOSE)
+
+        response = self.patch({"status": CLOSE, "notes": ["שוב"]})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {"detail": "המשימה הזו כבר סגורה"})
+        self.assertFalse(JobNote.objects.filter(note="שוב").exists())
+
+    def test_a_closed_job_is_updated_with_close_update(self):
+        self.patch({"status": CLOSE})
+
+        response = self.patch(
+            {"status": CLOSE, "close-update": "true", "notes": ["עדכון"]}
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(JobNote.objects.filter(note="עדכון").exists())
+        self.assertEqual(JobLog.objects.filter(status="Close").count(), 2)
+
+    def test_an_unknown_job_is_not_found(self):
+        self.assertEqual(self.patch({"status": OPEN}, pk=0).status_code, 400)
+
+
+class JobTransferTests(JobTestCase):
+    def setUp(self):
+        self.transfer_jobs = [self.create_job(), self.create_job("ביאליק 3")]
+
+    def test_every_job_is_transferred_at_once(self):
+        transferred = transfer_jobs(
+            self.user, self.transfer_jobs, self.other_group.id
+        )
+
+        self.assertEqual(
+            sorted(row.job_id for row in transferred),
+            sorted(row.job_id for row in self.transfer_jobs),
+        )
+        for row in transferred:
+            self.assertEqual(
+                (row.group_id, row.status, row.is_active),
+                (self.other_group.id, OPEN, True),
+            )
+        self.assertEqual(
+            set(JobChange.objects.values_list("group_id", flat=True)),
+            {self.group.id, self.other_group.id},
+        )
+
+    def test_the_statements_do_not_grow_with_the_jobs(self):
+        with CaptureQueriesContext(connection) as one_job:
+            transfer_to_group(
+                self.user, [self.transfer_jobs[0].job_id], self.other_group.id
+            )
+        more_jobs = [
+            self.create_job(f"הרצל {number}").job_id for number in range(5)
+        ]
+        with CaptureQueriesContext(connection) as many_jobs:
+            transfer_to_group(self.user, more_jobs, self.other_group.id)
+        self.assertEqual(len(many_jobs), len(one_job))
+
+    def test_a_failed_transfer_transfers_nothing(self):
+        with self.assertRaises(ValueError):
+            transfer_jobs(self.user, self.transfer_jobs, "not a group")
+        self.assertFalse(TransferJob.objects.filter(group=self.other_group).exists())
+
+    def test_group_managers_are_notified_once_committed(self):
+        manager = User.objects.create(
+            email="manager@example.com",
+            role=UserRole.objects.create(title=UserRoleChoices.GROUP_MANAGER.value),
+        )
+        self.other_group.member.add(manager, self.user)
+        transferred = transfer_jobs(self.user, self.transfer_jobs, self.other_group.id)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            notify_transferred_jobs(self.user, self.other_group.id, transferred)
+
+        self.assertEqual(
+            sorted(Notification.objects.values_list("receiver_id", "job_id")),
+            sorted((manager.id, row.id) for row in transferred),
+        )
+        self.assertEqual(
+            Notification.objects.first().message, "2 משימות הועברו על ידי @inspector"
+        )
+        self.assertEqual(len(callbacks), 1)
+
+
+class JobAssignmentTests(JobTestCase):
+    def setUp(self):
+        self.transfer_job = self.create_job()
+        self.job_id = self.transfer_job.job_id
+
+    def get_assignment(self):
+        return JobAssignment.objects.get(job_id=self.job_id)
+
+    def test_assignments_follow_the_transfers(self):
+        refresh_job_assignments([self.job_id])
+        assignment = self.get_assignment()
+        self.assertEqual(assignment.active_transfer, self.transfer_job)
+        self.assertEqual(assignment.parent_transfer, self.transfer_job)
+
+        transferred = transfer_jobs(
+            self.user, [self.transfer_job], self.other_group.id
+        )[0]
+
+        assignment = self.get_assignment()
+        self.assertEqual(assignment.active_transfer, transferred)
+        self.assertEqual(assignment.parent_transfer, self.transfer_job)
+
+    def test_jobs_without_transfers_are_dropped(self):
+        refresh_job_assignments([self.job_id])
+        TransferJob.objects.filter(job_id=self.job_id).delete()
+
+        refresh_job_assignments([self.job_id])
+
+        self.assertFalse(JobAssignment.objects.filter(job_id=self.job_id).exists())
+
+    def test_pointers_are_read_from_a_selected_assignment(self):
+        refresh_job_assignments([self.job_id])
+        job = Job.objects.select_related(
+            "assignment__active_transfer", "assignment__parent_transfer"
+        ).get(id=self.job_id)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_active_transfer(job), self.transfer_job)
+            self.assertEqual(get_parent_transfer(job), self.transfer_job)
+
+    def test_jobs_not_assigned_yet_fall_back_to_their_transfers(self):
+        job = Job.objects.get(id=self.job_id)
+        self.assertEqual(get_active_transfer(job), self.transfer_job)
+        self.assertEqual(get_parent_transfer(job), self.transfer_job)
+
+
+class JobCreationTests(JobTestCase):
+    def create(self, **kwargs):
+        return create_job(
+            self.user,
+            {
+                "address": "הרצל 12",
+                "latitude": 32.08,
+                "longitude": 34.78,
+                "created_by": self.user,
+                "updated_by": self.user,
+            },
+            self.group,
+            **kwargs,
+        )
+
+    def test_the_job_and_everything_derived_are_created_together(self):
+        transfer_job = self.create(images=["front.jpg"], notes=["הערה"])
+
+        job = transfer_job.job
+        self.assertEqual(job.status, OPEN)
+        self.assertEqual(
+            (transfer_job.group, transfer_job.status, transfer_job.is_parent_group),
+            (self.group, OPEN, True),
+        )
+        self.assertTrue(transfer_job.is_active)
+        self.assertEqual(JobNote.objects.get(job=job).updated_by, self.user)
+        self.assertEqual(JobCoverImage.objects.get(job=job).image, "front.jpg")
+        self.assertTrue(JobLocation.objects.filter(job=job).exists())
+        self.assertTrue(JobLog.objects.filter(job=job, status="Create").exists())
+        self.assertEqual(
+            JobAssignment.objects.get(job=job).active_transfer, transfer_job
+        )
+        self.assertEqual(
+            JobStatusCounter.objects.get(group=self.group, status=OPEN).count, 1
+        )
+        changes = JobChange.objects.filter(job_id=job.id)
+        self.assertEqual(
+            list(changes.values_list("kind", flat=True)), [JobChange.CREATED]
+        )
+
+    def test_a_failed_step_creates_nothing(self):
+        with mock.patch.object(
+            JobLog.objects, "create", side_effect=RuntimeError("log failed")
+        ), self.assertRaises(RuntimeError):
+            self.create(notes=["הערה"])
 
-# Create your tests here.
+        self.assertFalse(Job.objects.exists())
+        self.assertFalse(JobNote.objects.exists())
+        self.assertFalse(JobChange.objects.exists())
@@ -0,0 +1,79 @@
+from django.db import transaction
+
+from jobs.changes import record_job_changes
+from jobs.transitions import transfer_to_group
+from jobs.utils import push_notification
+from users.models import UserRoleChoices
+from users.models.group import Group
+from users.models.job import JobStatus
+from users.models.notification import Notification
+
+
+def transfer_jobs(user, jobs, group_id):
+    """
+    Transfer the jobs of the given transfer jobs to a group, all at once,
+    and return the transfer jobs now active in the group.
+    """
+    jobs = list(jobs)
+    job_ids = {job.job_id for job in jobs}
+    with transaction.atomic():
+        transferred = transfer_to_group(user, job_ids, group_id)
+        record_job_changes(job_ids, {job.group_id for job in jobs})
+    return transferred
+
+
+def notify_transferred_jobs(user, group_id, transfer_jobs):
+    """
+    Tell the group managers and admins of a group about jobs transferred to it.
+
+    One notification row per member and job, in one insert, and a single
+    push to all the members once the transfer is committed.
+    """
+    receivers = list(
+        Group.objects.get(id=group_id)
+        .member.filter(
+            role__title__in=[
+                UserRoleChoices.GROUP_MANAGER.value,
+                UserRoleChoices.ADMIN.value,
+            ]
+        )
+        .exclude(id=user.id)
+        .values_list("id", flat=True)
+    )
+    if not receivers or not transfer_jobs:
+        return
+
+    user_name = user.user_name or user.email.partition("@")[0]
+    if len(transfer_jobs) == 1:
+        body = f"משימה זו הועברה על ידי @{user_name}"
+    else:
+        body = f"{len(transfer_jobs)} משימות הועברו על ידי @{user_name}"
+    Notification.objects.bulk_create(
+        [
+            Notification(
+                sender_id=user.id,
+                receiver_id=receiver_id,
+                message=body,
+                updated_by_id=user.id,
+                created_by_id=user.id,
+                job_id=transfer_job.id,
+                notification_type="Transfer",
+            )
+            for transfer_job in transfer_jobs
+            for receiver_id in receivers
+        ]
+    )
+    transaction.on_commit(
+        lambda: push_notification(
+            notification_data={
+                "sender_id": user.id,
+                "title": body,
+                "body": body,
+                "created_by": user.id,
+                "job_id": transfer_jobs[0].id,
+                "status": JobStatus.TRANSFER.value,
+                "notification_type": "Transfer",
+            },
+            user=receivers,
+        )
+    )
@@ -0,0 +1,419 @@
+from django.db import transaction
+from django.db.models import Case
+from django.db.models import DateTimeField
+from django.db.models import F
+from django.db.models import Q
+from django.db.models import Value
+from django.db.models import When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from users.models.job import Job
+from users.models.job import JobLog
+from users.models.job import JobStatus
+from users.models.job import TransferJob
+
+
+OPEN = JobStatus.OPEN.value
+TRANSFER = JobStatus.TRANSFER.value
+RETURN = JobStatus.RETURN.value
+PARTIAL = JobStatus.PARTIAL.value
+CLOSE = JobStatus.CLOSE.value
+DUPLICATE = JobStatus.DUPLICATE.value
+WRONG_INFORMATION = JobStatus.WRONG_INFORMATION.value
+
+# Statuses a job can move to, per status. Transitions to the same status
+# pass allow_same: a closed job is only closed again to update its close,
+# and a returned job is never returned again.
+TRANSITIONS = {
+    OPEN: {TRANSFER, RETURN, PARTIAL, CLOSE, DUPLICATE, WRONG_INFORMATION},
+    TRANSFER: {OPEN, RETURN, PARTIAL, CLOSE, DUPLICATE, WRONG_INFORMATION},
+    RETURN: {OPEN, TRANSFER, CLOSE, DUPLICATE, WRONG_INFORMATION},
+    PARTIAL: {OPEN, TRANSFER, RETURN, CLOSE},
+    DUPLICATE: {OPEN, RETURN, CLOSE},
+    WRONG_INFORMATION: {OPEN, RETURN, CLOSE},
+    CLOSE: set(),
+}
+
+# The JobLog field holding the user, per log status.
+LOG_USER_FIELDS = {
+    "Create": "created_by",
+    "Update": "updated_by",
+    "Transfer": "transferred_by",
+    "Return": "returned_by",
+    "Close": "closed_by",
+    "Partial": "partially_closed_by",
+}
+
+# Fields a job update saves, statuses being left to the transitions.
+JOB_UPDATE_FIELDS = [
+    "job_id",
+    "address",
+    "address_information",
+    "description",
+    "latitude",
+    "longitude",
+    "priority",
+    "further_inspection",
+    "further_billing",
+    "closed_by",
+    "updated_by",
+    "updated_at",
+]
+TRANSFER_JOB_UPDATE_FIELDS = [
+    "group",
+    "closed_by",
+    "further_inspection",
+    "further_billing",
+    "updated_by",
+    "updated_at",
+]
+
+
+class InvalidTransition(Exception):
+    """A transition not allowed from the current status, or raced by another one."""
+
+    def __init__(self, target, current=None):
+        self.target = target
+        self.current = current
+        super().__init__(f"{current} -> {target}")
+
+    @property
+    def detail(self):
+        if self.current is None:
+            # {"detail": "The job status has changed, please refresh"}
+            return "סטטוס המשימה השתנה, נא לרענן"
+        if self.current == CLOSE:
+            # {"detail": "This Job already closed."}
+            return "המשימה הזו כבר סגורה"
+        # {"detail": "A job in the {current} phase cannot move to {target}"}
+        return f"לא ניתן להעביר משימה בשלב {self.current} לשלב {self.target}"
+
+
+def get_source_statuses(target, allow_same=False):
+    """Statuses allowed to move to target, target itself too with allow_same."""
+    statuses = {
+        status for status, targets in TRANSITIONS.items() if target in targets
+    }
+    if allow_same:
+        statuses.add(target)
+    return statuses
+
+
+def check_transition(current, target, allow_same=False):
+    if current in TRANSITIONS and current not in get_source_statuses(
+        target, allow_same
+    ):
+        raise InvalidTransition(target, current)
+
+
+def guarded_update(queryset, target, allow_same=False, **values):
+    """
+    UPDATE the rows of queryset whose status may move to target.
+
+    The status condition is part of the statement, so a concurrent
+    transition committed first makes it match nothing instead of being
+    overwritten; InvalidTransition is raised then.
+    """
+    updated = queryset.filter(
+        status__in=get_source_statuses(target, allow_same)
+    ).update(**values)
+    if not updated:
+        raise InvalidTransition(target)
+    return updated
+
+
+def guarded_job_update(job_ids, target, allow_same=False, **values):
+    """
+    UPDATE the jobs, all of which must have a status that may move to target.
+
+    As with guarded_update the condition is part of the statement, and the
+    job rows it locks order concurrent transitions of the same jobs. When a
+    job cannot move, InvalidTransition is raised with its actual status and
+    the caller's transaction is expected to roll the others back.
+    """
+    sources = get_source_statuses(target, allow_same)
+    updated = Job.objects.filter(id__in=job_ids, status__in=sources).update(**values)
+    if updated < len(job_ids):
+        current = (
+            Job.objects.filter(id__in=job_ids)
+            .exclude(status__in=sources)
+            .values_list("status", flat=True)
+            .first()
+        )
+        raise InvalidTransition(target, current)
+
+
+def get_update_values(instance, fields, row_id=None):
+    """
+    UPDATE values of the given fields of a model instance.
+
+    With row_id only the row of that id takes them, the other rows keeping
+    theirs, so the changes of one transfer job can ride along in a
+    transition updating several of them.
+    """
+    values = {}
+    for name in fields:
+        field = instance._meta.get_field(name)
+        value = getattr(instance, field.attname)
+        if row_id is None:
+            values[field.attname] = value
+            continue
+        output_field = field.target_field if field.is_relation else field
+        values[field.attname] = Case(
+            When(id=row_id, then=Value(value, output_field=output_field)),
+            default=F(field.attname),
+            output_field=output_field,
+        )
+    return values
+
+
+def log_transition(user, job_ids, log_status, now):
+    JobLog.objects.bulk_create(
+        [
+            JobLog(
+                job_id=job_id,
+                status=log_status,
+                created_at=now,
+                **{LOG_USER_FIELDS[log_status]: user},
+            )
+            for job_id in job_ids
+        ]
+    )
+
+
+@transaction.atomic
+def close_transfer_jobs(
+    user,
+    job_ids,
+    update=False,
+    further_billing=None,
+    log_status="Close",
+    job_values=None,
+    transfer_job_values=None,
+):
+    """
+    Close every transfer job of the jobs, the main group one staying active.
+
+    update allows closing again already closed jobs, to update their close.
+    job_values and transfer_job_values are other changes written by the
+    same statements. Raises InvalidTransition, closing nothing, when a job
+    cannot be closed.
+    """
+    job_ids = set(job_ids)
+    now = timezone.now()
+    values = {
+        **(transfer_job_values or {}),
+        "status": CLOSE,
+        "is_active": F("is_parent_group"),
+        "updated_at": now,
+    }
+    job_values = {
+        **(job_values or {}),
+        "status": CLOSE,
+        "closed_by": user,
+        "closed_at": Coalesce(
+            F("closed_at"), Value(now, output_field=DateTimeField())
+        ),
+        "updated_at": now,
+    }
+    if further_billing is not None:
+        values["further_billing"] = Case(
+            When(is_parent_group=True, then=Value(further_billing)),
+            default=F("further_billing"),
+        )
+        job_values["further_billing"] = further_billing
+
+    guarded_job_update(job_ids, CLOSE, update, **job_values)
+    TransferJob.objects.filter(job_id__in=job_ids).update(**values)
+    log_transition(user, job_ids, log_status, now)
+
+
+@transaction.atomic
+def partially_close_transfer_job(
+    user, transfer_job, further_billing=None, job_values=None, transfer_job_values=None
+):
+    """
+    Partially close a transfer job, and the inactive transfer jobs of its job.
+
+    The job status follows when the transfer job is the main group one.
+    job_values and transfer_job_values are other changes written by the
+    same statements.
+    """
+    check_transition(transfer_job.status, PARTIAL, allow_same=True)
+    now = timezone.now()
+    values = {**(transfer_job_values or {}), "status": PARTIAL, "updated_at": now}
+    job_values = {**(job_values or {}), "closed_by": user, "updated_at": now}
+    if further_billing is not None:
+        values["further_billing"] = Case(
+            When(id=transfer_job.id, then=Value(further_billing)),
+            default=F("further_billing"),
+        )
+        job_values["further_billing"] = further_billing
+    if transfer_job.is_parent_group:
+        job_values["status"] = PARTIAL
+
+    guarded_update(
+        TransferJob.objects.filter(job_id=transfer_job.job_id).filter(
+            Q(id=transfer_job.id) | Q(is_active=False)
+        ),
+        PARTIAL,
+        allow_same=True,
+        **values,
+    )
+    Job.objects.filter(id=transfer_job.job_id).update(**job_values)
+    log_transition(user, [transfer_job.job_id], "Partial", now)
+
+
+@transaction.atomic
+def set_transfer_job_status(
+    user,
+    transfer_job,
+    status,
+    log_status="Update",
+    update_job=None,
+    job_values=None,
+    transfer_job_values=None,
+):
+    """
+    Move a transfer job to a status, as a job update does.
+
+    An inactive transfer job, and its inactive siblings, are marked partially
+    closed instead. The job status follows when update_job is set, by default
+    when the transfer job is the main group one. job_values and
+    transfer_job_values are other changes written by the same statements.
+    """
+    check_transition(transfer_job.status, status, allow_same=True)
+    if update_job is None:
+        update_job = transfer_job.is_parent_group
+    now = timezone.now()
+    job_values = dict(job_values or {})
+    if update_job:
+        job_values["status"] = status
+    guarded_update(
+        TransferJob.objects.filter(job_id=transfer_job.job_id).filter(
+            Q(id=transfer_job.id) | Q(is_active=False)
+        ),
+        status,
+        allow_same=True,
+        **{
+            **(transfer_job_values or {}),
+            "status": Case(
+                When(id=transfer_job.id, is_active=True, then=Value(status)),
+                default=Value(PARTIAL),
+            ),
+            "updated_at": now,
+        },
+    )
+    if job_values:
+        Job.objects.filter(id=transfer_job.job_id).update(
+            **{**job_values, "updated_at": now}
+        )
+    if log_status:
+        log_transition(user, [transfer_job.job_id], log_status, now)
+
+
+@transaction.atomic
+def transfer_to_group(user, job_ids, group_id, **fields):
+    """
+    Transfer jobs to a group and return their transfer jobs now active there.
+
+    A job already transferred to the group gets its row there reopened and
+    all its other rows deactivated. Otherwise its active rows are
+    deactivated and a new open row, with fields, is added in the group.
+    Runs a fixed number of statements whatever the number of jobs, and
+    raises InvalidTransition, transferring nothing, when a job cannot move.
+    """
+    group_id = int(group_id)
+    job_ids = set(job_ids)
+    now = timezone.now()
+    reopened = dict(
+        TransferJob.objects.filter(job_id__in=job_ids, group_id=group_id).values_list(
+            "job_id", "id"
+        )
+    )
+    moved = job_ids - set(reopened)
+
+    guarded_job_update(
+        job_ids,
+        TRANSFER,
+        allow_same=True,
+        status=Case(When(id__in=moved, then=Value(TRANSFER)), default=F("status")),
+        updated_at=now,
+    )
+
+    TransferJob.objects.filter(
+        Q(job_id__in=reopened) | Q(job_id__in=moved, is_active=True)
+    ).update(
+        status=Case(
+            When(id__in=reopened.values(), then=Value(OPEN)), default=Value(TRANSFER)
+        ),
+        is_active=Case(
+            When(id__in=reopened.values(), then=Value(True)), default=Value(False)
+        ),
+        updated_at=now,
+    )
+    created = TransferJob.objects.bulk_create(
+        [
+            TransferJob(
+                job_id=job_id,
+                group_id=group_id,
+                status=OPEN,
+                is_active=True,
+                created_by=user,
+                updated_by=user,
+                **fields,
+            )
+            for job_id in moved
+        ]
+    )
+    log_transition(user, job_ids, "Transfer", now)
+    return list(TransferJob.objects.filter(id__in=reopened.values())) + created
+
+
+@transaction.atomic
+def return_transfer_job(user, transfer_job, deactivate_all=False):
+    """
+    Return a job to its main group: the main group row becomes the active,
+    returned one, and the given row, or all the rows, are deactivated.
+    """
+    check_transition(transfer_job.status, RETURN)
+    now = timezone.now()
+    rows = TransferJob.objects.filter(job_id=transfer_job.job_id)
+    if not deactivate_all:
+        rows = rows.filter(Q(id=transfer_job.id) | Q(is_parent_group=True))
+    guarded_update(
+        TransferJob.objects.filter(id=transfer_job.id), RETURN, updated_at=now
+    )
+    rows.update(
+        status=Case(
+            When(is_parent_group=True, then=Value(RETURN)), default=F("status")
+        ),
+        is_active=F("is_parent_group"),
+        updated_at=now,
+    )
+    Job.objects.filter(id=transfer_job.job_id).update(status=RETURN, updated_at=now)
+    log_transition(user, [transfer_job.job_id], "Return", now)
+
+
+@transaction.atomic
+def reopen_returned_job(user, transfer_job, group_id):
+    """
+    Reopen a returned job once its information is fixed: the returned row
+    is opened and deactivated, and the rows of the group that returned it
+    are active again.
+    """
+    check_transition(transfer_job.status, OPEN, allow_same=True)
+    now = timezone.now()
+    guarded_update(
+        TransferJob.objects.filter(job_id=transfer_job.job_id).filter(
+            Q(id=transfer_job.id) | Q(group_id=group_id)
+        ),
+        OPEN,
+        allow_same=True,
+        status=Case(When(id=transfer_job.id, then=Value(OPEN)), default=F("status")),
+        is_active=Case(When(group_id=group_id, then=Value(True)), default=Value(False)),
+        updated_at=now,
+    )
+    Job.objects.filter(id=transfer_job.job_id).update(status=OPEN, updated_at=now)
+    log_transition(user, [transfer_job.job_id], "Update", now)
@@ -27,6 +27,11 @@ from jobs.views import JobListDetails
 from jobs.views import generatejoblistpdf
 from jobs.views import get_jobs_for_group
 from jobs.views import get_return_job_notes
+from jobs.views import import_job_file
+from jobs.views import job_events
+from jobs.views import job_suggestions
+from jobs.views import map_markers
+from jobs.views import plan_job_route
 
 app_name = "jobs"
 urlpatterns = [
@@ -83,6 +88,11 @@ urlpatterns = [
     path("job_approved/", JobApprovedView, name="job-approved"),
     path("delete_job/<int:pk>/", DeleteOpenCloseJob.as_view(), name="delete-job"),
     path("jobs_list/", JobList.as_view(), name="jobs-list"),
+    path("job_suggestions/", job_suggestions, name="job-suggestions"),
+    path("events/", job_events, name="job-events"),
+    path("map_markers/", map_markers, name="map-markers"),
+    path("plan_route/", plan_job_route, name="plan-route"),
+    path("import_jobs/", import_job_file, name="import-jobs"),
     path(
         "return_job_notes/<int:pk>/", ReturnJobNotes.as_view(), name="return-job-notes"
     ),
@@ -45,3 +45,16 @@ def push_notification(request=None, notification_data=None, user=None):
             print(f"Push notification success: {response.content}")
             response_data.append(json.loads(response.content.decode()))
         return response_data
+
+
+def parse_job_ids(value):
+    """Return the ids of a list or of a comma separated string of ids."""
+    if isinstance(value, str):
+        value = value.split(",")
+    return list(dict.fromkeys(int(job_id) for job_id in value or [] if str(job_id).strip()))
+
+
+def has_role(user, *roles):
+    """Whether the user is a superuser or has one of the given role titles."""
+    role = getattr(user, "role", None)
+    return user.is_superuser or getattr(role, "title", None) in roles
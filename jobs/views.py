@@ -10,27 +10,21 @@ from itertools import chain
 
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import EmptyPage
-from django.core.paginator import PageNotAnInteger
-from django.core.paginator import Paginator
+from django.core.files.storage import default_storage
 from django.db import IntegrityError
 from django.db import transaction
-from django.db.models import Case
-from django.db.models import CharField
 from django.db.models import Count
 from django.db.models import F
 from django.db.models import FloatField
-from django.db.models import OuterRef
 from django.db.models import Q
 from django.db.models import Subquery
 from django.db.models import Sum
-from django.db.models import Value
-from django.db.models import When
 from django.db.models.functions import Coalesce
 from django.forms.models import model_to_dict
 from django.forms.models import modelform_factory
 from django.http import FileResponse
 from django.http import HttpResponse
+from django.http import HttpResponseNotModified
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
 from django.template.loader import get_template
@@ -43,14 +37,54 @@ from django.views.generic import DeleteView
 from django.views.generic import ListView
 from django.views.generic import TemplateView
 from django.views.generic import UpdateView
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_POST
 from django.views.generic import View
 from weasyprint import HTML
 
 from bills.forms import CloseBillForm
+from jobs.assignments import get_active_transfer
+from jobs.assignments import get_parent_transfer
+from jobs.changes import conditional_job_view
+from jobs.changes import group_scope_from_name
+from jobs.changes import record_job_changes
+from jobs.counters import get_job_counts
+from jobs.counters import get_job_group_ids
+from jobs.covers import delete_job_images
+from jobs.covers import refresh_cover_images
+from jobs.creation import create_job
+from jobs.duplicates import find_duplicate_candidates
+from jobs.events import get_job_event_batch
 from jobs.forms import CreateJobForm
 from jobs.forms import ReturnJobForm
 from jobs.forms import ReturnJobNotesForm
 from jobs.forms import TransferJobForm
+from jobs.imports import ImportFileError
+from jobs.imports import import_jobs
+from jobs.locations import get_map_data
+from jobs.locations import parse_bbox
+from jobs.locations import parse_zoom
+from jobs.locations import refresh_job_locations
+from jobs.pagination import paginate_keyset
+from jobs.payloads import COMPACT_FORMAT
+from jobs.payloads import MSGPACK_FORMAT
+from jobs.payloads import compact_response
+from jobs.payloads import encode_map_jobs
+from jobs.payloads import get_job_images
+from jobs.reviews import parse_review_state
+from jobs.reviews import review_transfer_jobs
+from jobs.routes import plan_route
+from jobs.suggestions import get_job_suggestions
+from jobs.suggestions import parse_suggestion_limit
+from jobs.transfers import notify_transferred_jobs
+from jobs.transfers import transfer_jobs
+from jobs.transitions import JOB_UPDATE_FIELDS
+from jobs.transitions import TRANSFER_JOB_UPDATE_FIELDS
+from jobs.transitions import InvalidTransition
+from jobs.transitions import close_transfer_jobs
+from jobs.transitions import partially_close_transfer_job
+from jobs.utils import has_role
+from jobs.utils import parse_job_ids
 from users.models import UserRoleChoices
 from users.models.bill import Bill
 from users.models.bill import BillType
@@ -147,32 +181,19 @@ def NotificationList(self):
     return notifications
 
 
-def first_image_subquery(job_field):
-    allowed_extensions = ["jpg", "jpeg", "png"]
-    return (
-        JobImage.objects.filter(job=OuterRef(job_field))
-        .annotate(
-            file_extension=Case(
-                *[
-                    When(
-                        image__iendswith=ext, then=Value(ext, output_field=CharField())
-                    )
-                    for ext in allowed_extensions
-                ],
-                default=Value(None, output_field=CharField()),
-            )
+def get_keyset_page(request, queryset, page_size):
+    try:
+        return paginate_keyset(
+            queryset, request.GET.get("cursor"), page_size, request=request
         )
-        .filter(file_extension__isnull=False)
-        .order_by("id")
-        .values("image")[:1]
-    )
+    except ValueError:
+        return paginate_keyset(queryset, None, page_size, request=request)
 
 
 # List for Job Module
 @method_decorator(login_required, name="dispatch")
 class JobListView(ListView):
     model = TransferJob
-    allowed_extensions = ["jpg", "jpeg", "png"]
     template_name = "job.html"
     success_url = reverse_lazy("jobs:job-list")
 
@@ -180,7 +201,7 @@ class JobListView(ListView):
 
         current_user = self.request.user
         queryset = TransferJob.objects.exclude(group__is_archive=True).select_related(
-            "job", "group"
+            "job", "group", "job__cover_image"
         )
 
         search = self.request.GET.get("search")
@@ -204,18 +225,6 @@ class JobListView(ListView):
         queryset = self.object_list
         current_user = self.request.user
 
-        # Optimize: Create search suggestions from fresh queryset (not paginated)
-        # This reduces the IN clause size significantly
-        # Limit to prevent loading all jobs into memory
-        search_job_suggestions = (
-            TransferJob.objects.exclude(group__is_archive=True)
-            .filter(is_active=True)
-            .select_related("job", "group")
-            .prefetch_related("job__job_image")[
-                :100
-            ]  # Limit to first 100 suggestions for performance
-        )
-
         group = self.request.GET.get("group")
         if group:
             if not current_user.is_superuser:
@@ -245,7 +254,6 @@ class JobListView(ListView):
         job_type = self.request.GET.get("job", "Open")
         (from_date, to_date) = get_query_params(self.request.GET)
         group = self.request.GET.get("group")
-        page_number = self.request.GET.get("page")
 
         queryset_time = time.time()
         print("queryset: {}".format(queryset_time - context_time))
@@ -312,26 +320,25 @@ class JobListView(ListView):
         queryset = queryset.prefetch_related("job__job_image")
 
         # Pagination
-        paginator = Paginator(queryset, 20)
-        context["paginator"] = paginator
-        context["jobs"] = paginator.get_page(page_number)
-
-        try:
-            context["page_range"] = paginator.page(page_number)
-        except PageNotAnInteger:
-            context["page_range"] = paginator.page(1)
-        except EmptyPage:
-            context["page_range"] = paginator.page(paginator.num_pages)
+        context["jobs"] = get_keyset_page(self.request, queryset, 20)
 
         # Job Count by status
-        job_counts = filter_query.filter(is_active=True).aggregate(
-            Open=Count("status", Q(status=JobStatus.OPEN.value)),
-            Partial=Count("status", Q(status=JobStatus.PARTIAL.value)),
-            Return=Count(
-                "status", Q(status=JobStatus.RETURN.value, is_parent_group=True)
-            ),
-            Transfer=Count("status", Q(status=JobStatus.TRANSFER.value)),
-        )
+        if filter_group and not self.request.GET.get("search") and not (
+            from_date and to_date
+        ):
+            group_filter = {"name": filter_group}
+            if previous_group_id:
+                group_filter["id"] = previous_group_id
+            job_counts = get_job_counts(**group_filter)
+        else:
+            job_counts = filter_query.filter(is_active=True).aggregate(
+                Open=Count("status", Q(status=JobStatus.OPEN.value)),
+                Partial=Count("status", Q(status=JobStatus.PARTIAL.value)),
+                Return=Count(
+                    "status", Q(status=JobStatus.RETURN.value, is_parent_group=True)
+                ),
+                Transfer=Count("status", Q(status=JobStatus.TRANSFER.value)),
+            )
 
         job_counts_time = time.time()
         print("job_counts: {}".format(job_counts_time - job_type_time))
@@ -370,7 +377,6 @@ class JobListView(ListView):
         print(
             "NotificationList: {}".format(NotificationList_time - sign_bills_list_time)
         )
-        context["search_job_suggestions"] = search_job_suggestions
 
         return_jobs = ReturnJob.objects
         if not current_user.is_superuser:
@@ -378,14 +384,10 @@ class JobListView(ListView):
                 job__is_active=True, return_to=current_user.id
             )
         context["return_jobs"] = (
-            return_jobs.prefetch_related(
-                "job__job__job_image", "duplicate__job__job_image"
-            )
-            .annotate(first_job_image=Subquery(first_image_subquery("job__job")))
+            return_jobs.select_related("job__job", "duplicate__job")
             .annotate(
-                first_duplicate_job_image=Subquery(
-                    first_image_subquery("duplicate__job")
-                )
+                first_job_image=F("job__job__cover_image__image"),
+                first_duplicate_job_image=F("duplicate__job__cover_image__image"),
             )
             .order_by("-created_at")
         )
@@ -452,7 +454,6 @@ class AddNewJobListView(ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         (from_date, to_date) = get_query_params(self.request.GET)
-        page_number = self.request.GET.get("page")
         current_user = self.request.user
         context["group_list"] = (
             Group.objects.filter(member=current_user.id).exclude(is_archive=True)
@@ -470,17 +471,8 @@ class AddNewJobListView(ListView):
         context["sign_bills_list"] = sign_bills_list(self)
         context["google_api_key"] = settings.GOOGLE_API_KEY
 
-        paginator = Paginator(self.get_queryset(), 10)
-        context["paginator"] = paginator
-        context["new_jobs"] = paginator.get_page(page_number)
+        context["new_jobs"] = get_keyset_page(self.request, self.get_queryset(), 10)
         context["notification"] = NotificationList(self)
-
-        try:
-            context["page_range"] = paginator.page(page_number)
-        except PageNotAnInteger:
-            context["page_range"] = paginator.page(1)
-        except EmptyPage:
-            context["page_range"] = paginator.page(paginator.num_pages)
         return context
 
 
@@ -511,8 +503,6 @@ class JobCreateView(CreateView):
             notes.append(note)
 
         group_id = request.POST.get("group")
-        further_inspection = request.POST.get("further_inspection") == "on"
-        is_lock_closed = request.POST.get("is_lock_closed") == "on"
         inspector = (
             Group.objects.filter(id=group_id)
             .exclude(is_archive=True)
@@ -526,51 +516,34 @@ class JobCreateView(CreateView):
 
         if not form.is_valid():
             return JsonResponse({"error": form.errors if form.errors else None})
-
-        job = form.save()
-        if images:
-            for image in images:
-                JobImage.objects.create(
-                    job=job,
-                    image=image,
-                    created_by=user,
-                    updated_by=user,
-                )
-
-        if attachmentes:
-            for attachment in attachmentes:
-                JobAttachment.objects.create(
-                    job=job,
-                    attachment=attachment,
-                    created_by=user,
-                    updated_by=user,
-                )
-        if notes:
-            for note in notes:
-                JobNote.objects.create(
-                    job=job,
-                    note=note,
-                    created_by=user,
-                    updated_by=user,
-                )
-
-        job.created_by = user
-        job.status = JobStatus.OPEN.value
-        job.save()
-
-        transfer_job_obj = TransferJob.objects.create(
-            status=JobStatus.OPEN.value,
-            is_active=True,
-            is_parent_group=True,
-            created_by=user,
-            group_id=group_id,
-            job_id=job.id,
-            further_inspection=further_inspection,
-            is_lock_closed=is_lock_closed,
+        group = (
+            Group.objects.filter(id=group_id).first()
+            if str(group_id).isdigit()
+            else None
         )
-        job_log = JobLog.objects.create(
-            job=job, created_by=request.user, status="Create", created_at=timezone.now()
+        if not group:
+            # {"error": {"group": "Group not found"}}
+            return JsonResponse({"error": {"group": "קבוצה לא נמצאה"}})
+
+        many_to_many = {field.name for field in Job._meta.many_to_many}
+        transfer_job_obj = create_job(
+            user,
+            {
+                **{
+                    name: value
+                    for name, value in form.cleaned_data.items()
+                    if name not in many_to_many
+                },
+                "created_by": user,
+            },
+            group,
+            images=images,
+            attachments=attachmentes,
+            notes=notes,
+            forms=form.cleaned_data.get("form") or (),
+            bills=form.cleaned_data.get("bill") or (),
         )
+        job = transfer_job_obj.job
         # Send notification on Create Job if priority is on
         if "priority" in request.POST:
             members = (
@@ -585,7 +558,15 @@ class JobCreateView(CreateView):
                 job_id=transfer_job_obj.id,
                 members=members,
             )
-        return JsonResponse({"create_job_status": "success"})
+        duplicate_candidates = find_duplicate_candidates(
+            user, job.address, job.latitude, job.longitude, exclude_job_id=job.id
+        )
+        return JsonResponse(
+            {
+                "create_job_status": "success",
+                "duplicate_candidates": duplicate_candidates,
+            }
+        )
 
 
 # job detail view
@@ -597,7 +578,13 @@ class JobDetailView(TemplateView):
 
     def get_context_data(self, **kwargs):
         pk = kwargs.get("pk")
-        job_obj = get_object_or_404(TransferJob, id=pk)
+        job_obj = get_object_or_404(
+            TransferJob.objects.select_related(
+                "job__assignment__active_transfer__group",
+                "job__assignment__parent_transfer__group",
+            ),
+            id=pk,
+        )
 
         job_groups = (
             TransferJob.objects.filter(id=job_obj.id).order_by("-created_at").first()
@@ -635,13 +622,11 @@ class JobDetailView(TemplateView):
                 job_id__in=TransferJob.objects.filter(job_id=job_obj.job_id)
             ),
             transferred_group=transferred_groups,
-            current_group=transferred_groups.filter(is_active=True).first(),
+            current_group=get_active_transfer(job_obj.job),
             google_api_key=settings.GOOGLE_API_KEY,
             roles=UserRole.objects.all(),
             permissions=Group.objects.all(),
-            main_group=TransferJob.objects.filter(
-                job_id=job_obj.job_id, is_parent_group=True
-            ).first(),
+            main_group=get_parent_transfer(job_obj.job),
             notification=NotificationList(self),
         )
         return context
@@ -651,25 +636,7 @@ class JobDetailView(TemplateView):
 @method_decorator(login_required, name="dispatch")
 class ReturnJobListView(ListView):
     model = ReturnJob
-    allowed_extensions = ["jpg", "jpeg", "png"]
     template_name = "return_job.html"
-    first_job_image_subquery = (
-        JobImage.objects.filter(job=OuterRef("job__job"))
-        .annotate(
-            file_extension=Case(
-                *[
-                    When(
-                        image__iendswith=ext, then=Value(ext, output_field=CharField())
-                    )
-                    for ext in allowed_extensions
-                ],
-                default=Value(None, output_field=CharField()),
-            )
-        )
-        .filter(file_extension__isnull=False)
-        .order_by("id")
-        .values("image")[:1]
-    )
     queryset = (
         ReturnJob.objects.exclude(
             job__in=TransferJob.objects.filter(group__is_archive=True).values_list(
@@ -678,7 +645,7 @@ class ReturnJobListView(ListView):
         )
         .select_related("job__job", "duplicate__job")
         .prefetch_related("job__job__job_image", "duplicate__job__job_image")
-        .annotate(first_job_image=Subquery(first_job_image_subquery))
+        .annotate(first_job_image=F("job__job__cover_image__image"))
     )
     success_url = reverse_lazy("jobs:return-job-list")
 
@@ -706,7 +673,6 @@ class ReturnJobListView(ListView):
         date_list = date_range.split() if date_range else None
         from_date = date_list[0] if date_list else None
         to_date = date_list[2] if date_list and len(date_list) > 2 else from_date
-        page_number = self.request.GET.get("page")
         current_user = self.request.user
 
         if date_range:
@@ -746,16 +712,7 @@ class ReturnJobListView(ListView):
                 ).order_by("-created_at")
             )
 
-        paginator = Paginator(return_job, 10)
-        context["paginator"] = paginator
-        context["return_jobs"] = paginator.get_page(page_number)
-
-        try:
-            context["page_range"] = paginator.page(page_number)
-        except PageNotAnInteger:
-            context["page_range"] = paginator.page(1)
-        except EmptyPage:
-            context["page_range"] = paginator.page(paginator.num_pages)
+        context["return_jobs"] = get_keyset_page(self.request, return_job, 10)
 
         context["from_date"] = from_date
         context["to_date"] = to_date
@@ -805,12 +762,10 @@ class EditJobDetail(ListView):
             if job_id == None:
                 return JsonResponse({"error": "This job is not available"})
             module_job_status = job_id.status
-            job = TransferJob.objects.filter(
-                job_id=job_id.job_id, is_parent_group=True
-            ).first()
+            job = get_parent_transfer(job_id.job)
         else:
             job = self.queryset.filter(id=id).first()
-        group = TransferJob.objects.filter(job__id=job.job.id, is_active=True).last()
+        group = get_active_transfer(job.job)
         forms = job.group.form.all()
         is_sign_bill = list(is_sign(self, job_id=job.id))
         jobs = (
@@ -818,7 +773,7 @@ class EditJobDetail(ListView):
             .prefetch_related("job__job_image")
             .values_list("id", flat=True)
         )
-        main_group = TransferJob.objects.get(job_id=job.job.id, is_parent_group=True)
+        main_group = get_parent_transfer(job.job)
         close_bills = CloseJobBill.objects.filter(job_id__in=Subquery(jobs)).values()
 
         image_with_id = [
@@ -1146,6 +1101,7 @@ class ReturnJobCreateView(CreateView):
                 False if transfer_job.is_parent_group != True else True
             )
             transfer_job.save()
+            record_job_changes([transfer_job.job_id])
             job_log = JobLog.objects.create(
                 job=transfer_job.job,
                 returned_by=current_user,
@@ -1208,8 +1164,14 @@ class ReturnJobUpdateView(UpdateView):
             duplicate_obj.delete()
 
             # delete transfer job
+            deleted_group_ids = get_job_group_ids([transfer_job_obj.job_id])
             transfer_job_obj.delete()
             transfer_job_obj.job.delete()
+            record_job_changes(
+                [original_job.job_id],
+                deleted_group_ids,
+                deleted_job_ids=[transfer_job_obj.job_id],
+            )
 
             return JsonResponse({"status": _("successfully Deleted")})
 
@@ -1224,6 +1186,7 @@ class ReturnJobUpdateView(UpdateView):
                 latitude=form_data["latitude"],
                 longitude=form_data["longitude"],
             )
+            refresh_job_locations([form_data["transfer_job_id"]])
 
             # Update TransferJob Object
             main_group_job = TransferJob.objects.filter(
@@ -1251,6 +1214,7 @@ class ReturnJobUpdateView(UpdateView):
                 True if "further_inspection" in form_data else False
             )
             transfer_obj.save()
+            record_job_changes([transfer_obj.job_id])
 
             # Bulk create attechment
             if files_data:
@@ -1285,6 +1249,7 @@ class ReturnJobUpdateView(UpdateView):
                         )
                 JobAttachment.objects.bulk_create(attechment_obj)
                 JobImage.objects.bulk_create(image_obj)
+                refresh_cover_images({image.job_id for image in image_obj})
 
             delete_image_id = form_data.get("image_delete")
             delete_docs_id = form_data.get("docs_delete")
@@ -1316,6 +1281,7 @@ class ReturnJobUpdateView(UpdateView):
             transfer_obj.is_active = True
             transfer_obj.save()
             transfer_obj.job.save()
+            record_job_changes([transfer_obj.job_id])
             ReturnJob.objects.get(id=form_data["id"]).delete()
             return JsonResponse({"status": _("successfully Updated")})
 
@@ -1327,6 +1293,13 @@ class ReturnJobDeleteView(DeleteView):
     template_name = "return_job.html"
     success_url = reverse_lazy("jobs:return-job-list")
 
+    def form_valid(self, form):
+        deleted_job_id = self.object.id
+        deleted_group_ids = get_job_group_ids([deleted_job_id])
+        response = super().form_valid(form)
+        record_job_changes(group_ids=deleted_group_ids, deleted_job_ids=[deleted_job_id])
+        return response
+
 
 # Jobs for Map Module
 @method_decorator(login_required, name="dispatch")
@@ -1378,7 +1351,7 @@ class RecentSearchJob(ListView):
 
         job_list = queryset.order_by("-created_at")
         context["job_list"] = job_list.annotate(
-            job_image=Subquery(first_image_subquery("job"))
+            job_image=F("job__cover_image__image")
         ).prefetch_related("job", "job__job_image")
 
         context["notification"] = NotificationList(self)
@@ -1394,6 +1367,8 @@ class RecentSearchJob(ListView):
 
 
 # Group wise Jobs for Map Module
+# Post format=compact (or msgpack) for the columnar payload of jobs.payloads.
+@gzip_page
 def get_jobs_for_group(request, group_id):
     user = request.user
     if group_id:
@@ -1409,6 +1384,7 @@ def get_jobs_for_group(request, group_id):
         "job__longitude",
         "job__description",
         "job__priority",
+        "job__cover_image__image",
     ]
     # Get the sorting order from the request data
     sort_order = request.POST.get("sort_order")
@@ -1421,30 +1397,107 @@ def get_jobs_for_group(request, group_id):
             is_active=True,
             status__in=[JobStatus.OPEN.value, JobStatus.TRANSFER.value],
         )
-        jobs_images = JobImage.objects.all().values(
-            "job__id",
-            "image",
-        )
     else:
         jobs = TransferJob.objects.order_by(order).filter(
             group=group_id,
             is_active=True,
             status__in=[JobStatus.OPEN.value, JobStatus.TRANSFER.value],
         )
-        jobs_images = JobImage.objects.filter(job__assign_job__group=group_id).values(
-            "job__id",
-            "image",
-        )
 
     if not user.is_superuser:
         jobs = jobs.filter(group__member=user.id)
 
     jobs = jobs.values(*job_values)
+    payload_format = request.POST.get("format")
+    if payload_format in (COMPACT_FORMAT, MSGPACK_FORMAT):
+        jobs = list(jobs)
+        images = get_job_images({job["job__id"] for job in jobs})
+        return compact_response(request, encode_map_jobs(jobs, images), payload_format)
     job_list = [job for job in jobs]
-    response = {"job_list": job_list, "job_images": list(jobs_images)}
+    response = {"job_list": job_list}
     return JsonResponse(response, safe=False)
 
 
+# Viewport markers for Map Module
+@login_required
+def map_markers(request):
+    try:
+        bbox = parse_bbox(
+            request.GET.get("south"),
+            request.GET.get("west"),
+            request.GET.get("north"),
+            request.GET.get("east"),
+        )
+        zoom = parse_zoom(request.GET.get("zoom"))
+        group_id = int(request.GET["group_id"]) if request.GET.get("group_id") else None
+    except ValueError:
+        return JsonResponse({"error": "תיבת גבולות לא חוקית"}, status=400)
+    map_data = get_map_data(request.user, bbox, zoom, group_id)
+    map_data["job_list"] = map_data.pop("results")
+    return JsonResponse(map_data)
+
+
+# Visit order of the selected jobs for Map Module
+@login_required
+def plan_job_route(request):
+    try:
+        job_ids = parse_job_ids(request.POST.getlist("jobs"))
+    except ValueError:
+        job_ids = []
+    if not job_ids:
+        return JsonResponse({"error": "נא לבחור משימות"}, status=400)
+    route = plan_route(
+        request.user, job_ids, request.POST.get("lat"), request.POST.get("lng")
+    )
+    return JsonResponse(route)
+
+
+# Bulk job import from CSV/XLSX for Add New Job Module
+@login_required
+@require_POST
+def import_job_file(request):
+    if not has_role(
+        request.user,
+        UserRoleChoices.INSPECTOR.value,
+        UserRoleChoices.ADMIN.value,
+        UserRoleChoices.GROUP_MANAGER.value,
+    ):
+        # {"error": "You do not have permission to perform this action"}
+        return JsonResponse({"error": "אין לך הרשאה לבצע פעולה זו"}, status=403)
+    file = request.FILES.get("file")
+    if not file:
+        return JsonResponse({"error": {"file": "יש להעלות קובץ"}}, status=400)
+    try:
+        report = import_jobs(
+            request.user,
+            file,
+            group_id=request.POST.get("group"),
+            dry_run=request.POST.get("dry_run") in ["true", "on"],
+        )
+    except ImportFileError as error:
+        return JsonResponse({"error": {"file": str(error)}}, status=400)
+    return JsonResponse(report)
+
+
+# Live job changes for Job, Dashboard and Map Modules
+@login_required
+def job_events(request):
+    since = request.GET.get("since")
+    batch = get_job_event_batch(request.user, since)
+    if since and batch["cursor"] == since:
+        return HttpResponseNotModified()
+    return JsonResponse(batch)
+
+
+# Search suggestions for Job Module
+@login_required
+def job_suggestions(request):
+    search = request.GET.get("search", "")
+    limit = parse_suggestion_limit(request.GET.get("limit"))
+    suggestions = get_job_suggestions(request.user, search, limit=limit)
+    return JsonResponse({"suggestions": suggestions})
+
+
 # Create PDF for ReportGenerator Module
 @method_decorator(login_required, name="dispatch")
 class GeneratePdf(View):
@@ -2083,6 +2136,7 @@ class TransferJobView(CreateView):
             TransferJob.objects.filter(group=data["group"], job=job.job_id).update(
                 status=JobStatus.OPEN.value, is_active=True
             )
+            record_job_changes([job.job_id])
             job_log = JobLog.objects.create(
                 job=job.job,
                 transferred_by=current_user,
@@ -2109,6 +2163,7 @@ class TransferJobView(CreateView):
         form = self.form_class(data)
         if form.is_valid():
             form = form.save()
+            record_job_changes([form.job_id])
 
             job = Job.objects.get(id=form.job_id)
             job.updated_by = current_user
@@ -2238,6 +2293,7 @@ class JobCloseView(UpdateView):
         job_all_groups = TransferJob.objects.filter(
             job_id=transfer_job.job_id
         ).values_list("group_id", flat=True)
+        previous_group_ids = set(job_all_groups)
         job = main_group_job.job
 
         # Bulk Create JobImage object
@@ -2288,6 +2344,7 @@ class JobCloseView(UpdateView):
                     updated_by=user,
                     close_job_image=close_job_image,
                 )
+            refresh_cover_images([job.id])
 
         if attachments:
             for attachment in attachments:
@@ -2360,6 +2417,8 @@ class JobCloseView(UpdateView):
 
             if delete_docs_id or delete_image_id:
                 delete_attachment(delete_docs_id, delete_image_id)
+            refresh_job_locations([transfer_job.job_id])
+            record_job_changes([transfer_job.job_id], previous_group_ids)
             return JsonResponse({"job_update_status": "success"})
 
         if status in [
@@ -2368,6 +2427,9 @@ class JobCloseView(UpdateView):
             JobStatus.PARTIAL.label,
             JobStatus.PARTIAL.value,
         ]:
+            closing_again = (
+                job.status == JobStatus.CLOSE.value and status == JobStatus.CLOSE.value
+            )
             # Create close job bills lists
             for bill_string_dict in form_data:
                 # convert string dict into dict
@@ -2430,7 +2492,7 @@ class JobCloseView(UpdateView):
                     True if data.get("further_inspection") == "on" else False
                 )
                 transfer_job.updated_by = user
-                transfer_job.save()
+                transfer_job.save(update_fields=TRANSFER_JOB_UPDATE_FIELDS)
 
                 job.priority = True if data.get("priority") == "on" else False
                 job.further_inspection = (
@@ -2442,30 +2504,8 @@ class JobCloseView(UpdateView):
                 job.updated_by = user
 
             job.closed_by = user
-
-            if (
-                transfer_job.job.status == JobStatus.CLOSE.value
-                and status == JobStatus.CLOSE.value
-            ):
-                job_log = JobLog.objects.create(
-                    job=job, updated_by=user, status="Update", created_at=timezone.now()
-                )
-            elif status == JobStatus.CLOSE.value:
-                job_log = JobLog.objects.create(
-                    job=transfer_job.job,
-                    closed_by=user,
-                    status="Close",
-                    created_at=timezone.now(),
-                )
-            elif status == JobStatus.PARTIAL.value:
-                job_log = JobLog.objects.create(
-                    job=transfer_job.job,
-                    partially_closed_by=user,
-                    status="Partial",
-                    created_at=timezone.now(),
-                )
             try:
-                job.save()
+                job.save(update_fields=JOB_UPDATE_FIELDS)
             except IntegrityError as e:
                 return JsonResponse(
                     {"IntegrityError": {"status": "כבר קיימת משימה עם מזהה זה"}}
@@ -2490,27 +2530,20 @@ class JobCloseView(UpdateView):
 
             # Create Close job
             if status in [JobStatus.CLOSE.label, JobStatus.CLOSE.value]:
-                # close job from all transferred group and false is_active
-                close_main_group_job = TransferJob.objects.get(
+                # close job from all transferred groups, the main group one stays active
+                try:
+                    close_transfer_jobs(
+                        user,
+                        [transfer_job.job_id],
+                        update=True,
+                        further_billing=further_billing,
+                        log_status="Update" if closing_again else "Close",
+                    )
+                except InvalidTransition as error:
+                    return JsonResponse({"error": {"status": error.detail}})
+                close_main_group_job = TransferJob.objects.select_related("group").get(
                     job_id=transfer_job.job_id, is_parent_group=True
                 )
-                all_transferred_jobs = TransferJob.objects.filter(
-                    job_id=transfer_job.job_id, is_parent_group=False
-                )
-                all_transferred_jobs.update(
-                    status=JobStatus.CLOSE.value, is_active=False
-                )
-
-                # close job from main group and true is_active
-                close_main_group_job.status = JobStatus.CLOSE.value
-                close_main_group_job.job.status = JobStatus.CLOSE.value
-                if close_main_group_job.job.closed_at == None:
-                    close_main_group_job.job.closed_at = timezone.now()
-                close_main_group_job.further_billing = further_billing
-                close_main_group_job.job.further_billing = further_billing
-                close_main_group_job.is_active = True
-                close_main_group_job.save()
-                close_main_group_job.job.save()
                 CloseJobBill.objects.bulk_update(bulk_update_list, ["measurement"])
                 CloseJobBill.objects.bulk_create(bulk_create_list)
 
@@ -2528,6 +2561,8 @@ class JobCloseView(UpdateView):
                     )
                 if delete_docs_id or delete_image_id:
                     delete_attachment(delete_docs_id, delete_image_id)
+                refresh_job_locations([transfer_job.job_id])
+                record_job_changes([transfer_job.job_id], previous_group_ids)
                 return JsonResponse(
                     {
                         "job_close_or_update_status": "success",
@@ -2538,16 +2573,18 @@ class JobCloseView(UpdateView):
             # Create Partial job
             elif status in [JobStatus.PARTIAL.label, JobStatus.PARTIAL.value]:
                 # partial close job from transferred group
-                transfer_job.status = JobStatus.PARTIAL.value
-                transfer_job.job.status = JobStatus.PARTIAL.value
-                transfer_job.further_billing = further_billing
-                transfer_job.job.further_billing = further_billing
-                transfer_job.save()
-                transfer_job.job.save()
+                try:
+                    partially_close_transfer_job(
+                        user, transfer_job, further_billing=further_billing
+                    )
+                except InvalidTransition as error:
+                    return JsonResponse({"error": {"status": error.detail}})
                 CloseJobBill.objects.bulk_update(bulk_update_list, ["measurement"])
                 CloseJobBill.objects.bulk_create(bulk_create_list)
                 if delete_docs_id or delete_image_id:
                     delete_attachment(delete_docs_id, delete_image_id)
+                refresh_job_locations([transfer_job.job_id])
+                record_job_changes([transfer_job.job_id], previous_group_ids)
                 return JsonResponse({"job_partial_close_or_update_status": "success"})
 
         # {"error": {"status": The status is invalid}}
@@ -2577,11 +2614,21 @@ def CreateNotification(self, message, notification_type, job_id, members):
     Notification.objects.bulk_create(create_list)
 
 
+@login_required
+@require_POST
 def JobApprovedView(request):
-    job_id = request.GET.get("job_id")
-    TransferJob.objects.filter(id=job_id).update(
-        is_reviewed=request.GET.get("is_reviewed")
-    )
+    if not has_role(request.user, UserRoleChoices.INSPECTOR.value):
+        # {"error": "You do not have permission to perform this action"}
+        return JsonResponse({"error": "אין לך הרשאה לבצע פעולה זו"}, status=403)
+    job_id = str(request.POST.get("job_id", ""))
+    if not job_id.isdigit():
+        # {"error": "Job not found"}
+        return JsonResponse({"error": "משימה לא נמצאה"}, status=400)
+    try:
+        is_reviewed = parse_review_state(request.POST.get("is_reviewed"))
+    except ValueError as error:
+        return JsonResponse({"error": str(error)}, status=400)
+    review_transfer_jobs(request.user, {int(job_id): is_reviewed})
     return JsonResponse({"Approved": {"status": "Job is Approved"}})
 
 
@@ -2590,6 +2637,13 @@ class DeleteOpenCloseJob(DeleteView):
     success_url = reverse_lazy("index")
     queryset = Job.objects.all()
 
+    def form_valid(self, form):
+        deleted_job_id = self.object.id
+        deleted_group_ids = get_job_group_ids([deleted_job_id])
+        response = super().form_valid(form)
+        record_job_changes(group_ids=deleted_group_ids, deleted_job_ids=[deleted_job_id])
+        return response
+
 
 def delete_attachment(delete_docs_id, delete_image_id):
     if delete_docs_id:
@@ -2598,7 +2652,7 @@ def delete_attachment(delete_docs_id, delete_image_id):
 
     if delete_image_id:
         image_id_list = [int(id) for id in delete_image_id.split(",")]
-        JobImage.objects.filter(id__in=image_id_list).delete()
+        delete_job_images(image_id_list)
 
 
 class JobListDetails(ListView):
@@ -2693,6 +2747,7 @@ class JobList(ListView):
     model = TransferJob
     queryset = TransferJob.objects.exclude(group__is_archive=False, is_active=False)
 
+    @method_decorator(conditional_job_view(group_scope_from_name))
     def get(self, request, *args, **kwargs):
         jobs_status = request.GET.get("job_status")
         from_date = request.GET.get("from_date")
@@ -2724,6 +2779,7 @@ class JobList(ListView):
             "group__name",
             "status",
             "job__priority",
+            "job__cover_image__image",
         ]
 
         if from_date != "None" and to_date != "None":
@@ -2761,11 +2817,8 @@ class JobList(ListView):
         job_list = []
         for job in jobs:
             job_id = job["job__id"]
-            job_images = JobImage.objects.filter(job__id=job_id)
-            if job_images.exists():
-                first_image = job_images.first().image.url
-            else:
-                first_image = None
+            cover_image = job["job__cover_image__image"]
+            first_image = default_storage.url(cover_image) if cover_image else None
 
             job_data = {
                 "job_id": job_id,
@@ -2791,50 +2844,15 @@ class MultipleTransferJobView(CreateView):
         jobs_list = request.GET.get("multiple_jobs")
         data = request.POST.copy()
         transfer_group = data["group"]
-        create_list = []
-
-        jobs = jobs_list.split(",")
-        jobs = TransferJob.objects.filter(id__in=jobs)
 
-        for job in jobs:
-            if TransferJob.objects.filter(group=transfer_group, job=job.job_id):
-                job_transferred_groups = TransferJob.objects.filter(job=job.job_id)
-                bulk_updated_fields = []
-                for job_transferred in job_transferred_groups:
-                    job_transferred.status = JobStatus.TRANSFER.value
-                    job_transferred.is_active = False
-                    bulk_updated_fields.append(job_transferred)
-
-                TransferJob.objects.bulk_update(
-                    bulk_updated_fields, ["status", "is_active"]
-                )
-
-                TransferJob.objects.filter(group=transfer_group, job=job.job_id).update(
-                    status=JobStatus.OPEN.value, is_active=True
-                )
-            else:
-                job.status = JobStatus.TRANSFER.value
-                job.job.status = JobStatus.TRANSFER.value
-                job.is_active = False
-                job.save()
-                job.job.save()
-
-                create_list.append(
-                    TransferJob(
-                        created_by_id=self.request.user.id,
-                        group_id=transfer_group,
-                        job_id=job.job_id,
-                        status=JobStatus.TRANSFER.value,
-                        is_active=True,
-                    )
-                )
-        job_log = JobLog.objects.create(
-            job=job.job,
-            transferred_by=self.request.user,
-            status="Transfer",
-            created_at=timezone.now(),
-        )
-        TransferJob.objects.bulk_create(create_list)
+        jobs = TransferJob.objects.filter(id__in=jobs_list.split(","))
+        try:
+            transferred = transfer_jobs(request.user, jobs, transfer_group)
+        except InvalidTransition as error:
+            return JsonResponse(
+                {"job_transfer_status": "error", "detail": error.detail}, status=400
+            )
+        notify_transferred_jobs(request.user, transfer_group, transferred)
         return JsonResponse({"job_transfer_status": "success"})
 
 